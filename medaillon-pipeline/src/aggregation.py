@@ -0,0 +1,183 @@
+import logging
+import pandas as pd
+
+
+logger = logging.getLogger(__name__)
+
+# Unterstützte Aggregationsmethoden (pandas-Reduktionen mit Cython-Implementierung)
+METHODS = ('mean', 'median', 'max', 'min', 'sum')
+
+
+class AggregationSpec:
+    """
+    Aggregationseinstellungen aus dem Abschnitt 'aggregation' der Konfiguration.
+
+    - time_window (oder windowsize): Größe der Zeitfenster, z.B. '1H' oder '4h'
+    - offset: Verschiebung der Fenstergrenzen, z.B. '1h' für Fenster 01:00-05:00, 05:00-09:00, ...
+    - method: Standardmethode für alle Spalten ohne eigenen Eintrag
+    - aggregate_functions: Methode je Konzept, z.B. min für GCS, max für Kreatinin,
+      sum für die Urinausscheidung. Einträge werden über concept_id (oder
+      concept_name bzw. column) einer Spalte zugeordnet.
+
+    sum bezieht sich auf die einzelnen Messungen: Mehrere Messungen eines
+    Konzepts mit demselben Zeitstempel werden beim Pivotieren addiert statt
+    gemittelt (siehe sum_concepts), alle übrigen Methoden arbeiten auf dem
+    Mittelwert je Zeitstempel.
+
+    Alle Spalten werden in einem gemeinsamen groupby mit den eingebauten
+    pandas-Reduktionen aggregiert (siehe aggregate()).
+    """
+
+    def __init__(self, aggregation_config):
+        """
+        Initialisiert die Einstellungen.
+
+        Args:
+            aggregation_config (dict): Abschnitt 'aggregation' der Konfiguration.
+        """
+        self.time_window = aggregation_config.get('time_window', aggregation_config.get('windowsize', '1H'))
+        offset = aggregation_config.get('offset')
+        self.offset = pd.Timedelta(pd.tseries.frequencies.to_offset(offset)) if offset else pd.Timedelta(0)
+        self.default_method = _method(aggregation_config.get('method', 'mean'))
+        self.functions = aggregation_config.get('aggregate_functions', []) or []
+
+    @property
+    def concept_ids(self):
+        """
+        concept_ids der Einträge, die nur über ihre concept_id einer Spalte zugeordnet werden können.
+        """
+        return entry_concept_ids(self.functions)
+
+    def methods(self, columns, concept_columns=None):
+        """
+        Ordnet jeder Spalte ihre Aggregationsmethode zu.
+
+        Args:
+            columns (list): Zu aggregierende Spalten.
+            concept_columns (dict, optional): concept_id -> Spaltenname (z.B. Konzeptname).
+
+        Returns:
+            dict: Spalte -> Methode.
+        """
+        methods = {col: self.default_method for col in columns}
+        for column, entry in entry_columns(self.functions, columns, concept_columns):
+            methods[column] = _method(entry.get('method', self.default_method))
+        return methods
+
+    def sum_concepts(self, columns, concept_columns=None):
+        """
+        Spalten, deren Messungen je Zeitstempel addiert statt gemittelt werden (Methode sum).
+
+        Args:
+            columns (list): Pivot-Spalten (z.B. Konzeptnamen).
+            concept_columns (dict, optional): concept_id -> Spaltenname (siehe methods()).
+
+        Returns:
+            list: Spalten mit der Methode sum.
+        """
+        return [col for col, method in self.methods(columns, concept_columns).items() if method == 'sum']
+
+    def windows(self, times):
+        """
+        Ordnet Zeitstempel ihrem Zeitfenster (Fensterbeginn) zu.
+
+        Args:
+            times (pandas.Series): Zeitstempel.
+
+        Returns:
+            pandas.Series: Beginn des jeweiligen Zeitfensters.
+        """
+        if not self.offset:
+            return times.dt.floor(self.time_window)
+        return (times - self.offset).dt.floor(self.time_window) + self.offset
+
+    def aggregate(self, data, group_cols, methods):
+        """
+        Aggregiert alle Spalten über ein gemeinsames groupby.
+
+        Die Gruppen werden einmal gebildet; je Methode werden alle Spalten mit
+        dieser Methode in einer einzigen Cython-Reduktion aggregiert (Named
+        Aggregation würde intern je Spalte reduzieren). Summen über Fenster
+        ohne Messwert ergeben wie die anderen Methoden NaN statt 0.
+
+        Args:
+            data (pandas.DataFrame): Daten mit den Gruppierungsspalten.
+            group_cols (list): Gruppierungsspalten (IDs und Zeitfenster).
+            methods (dict): Spalte -> Methode (siehe methods()).
+
+        Returns:
+            pandas.DataFrame: Aggregierte Daten, Gruppierungsspalten als Spalten.
+        """
+        grouped = data.groupby(group_cols)
+        if not methods:
+            return grouped.size().index.to_frame(index=False)
+
+        columns = {}
+        for method in dict.fromkeys(methods.values()):
+            selection = grouped[[col for col, col_method in methods.items() if col_method == method]]
+            if method == 'sum':
+                columns[method] = selection.sum(min_count=1)
+            else:
+                columns[method] = getattr(selection, method)()
+
+        aggregated = pd.concat(columns.values(), axis=1) if len(columns) > 1 else next(iter(columns.values()))
+        return aggregated[list(methods)].reset_index()
+
+
+def entry_concept_ids(entries):
+    """
+    concept_ids von Konfigurationseinträgen ohne concept_name bzw. column.
+
+    Args:
+        entries (list): Einträge je Konzept (z.B. aggregate_functions).
+
+    Returns:
+        list: Sortierte concept_ids, deren Spaltenname nachgeschlagen werden muss.
+    """
+    return sorted({int(entry['concept_id']) for entry in entries
+                   if 'concept_id' in entry and not (entry.get('column') or entry.get('concept_name'))})
+
+
+def entry_columns(entries, columns, concept_columns=None):
+    """
+    Ordnet Konfigurationseinträge je Konzept den vorhandenen Spalten zu.
+
+    Ein Eintrag wird über column, concept_name oder concept_id zugeordnet;
+    concept_ids werden über concept_columns oder (bei Pivot über concept_id)
+    direkt als Spaltenname aufgelöst. Einträge ohne passende Spalte werden
+    übergangen.
+
+    Args:
+        entries (list): Einträge je Konzept (z.B. aggregate_functions).
+        columns (list): Vorhandene Spalten.
+        concept_columns (dict, optional): concept_id -> Spaltenname (z.B. Konzeptname).
+
+    Returns:
+        list: Paare (Spalte, Eintrag) in der Reihenfolge der Einträge.
+    """
+    concept_columns = concept_columns or {}
+    columns = set(columns)
+    matches = []
+
+    for entry in entries:
+        column = entry.get('column') or entry.get('concept_name')
+        if column is None and 'concept_id' in entry:
+            concept_id = int(entry['concept_id'])
+            column = concept_columns.get(concept_id)
+            # Pivot über concept_id: Spalten heißen wie die concept_id
+            if column is None:
+                column = next((col for col in (concept_id, str(concept_id)) if col in columns), None)
+        if column in columns:
+            matches.append((column, entry))
+
+    return matches
+
+
+def _method(method):
+    """
+    Prüft eine Aggregationsmethode; unbekannte Methoden werden wie bisher durch den Mittelwert ersetzt.
+    """
+    if method in METHODS:
+        return method
+    logger.warning(f"Unbekannte Aggregationsmethode {method}, verwende Mittelwert")
+    return 'mean'
@@ -0,0 +1,263 @@
+import json
+import logging
+from collections import Counter
+from .database import DatabaseConnection
+from .pipeline import DataPipeline
+from . import instrumentation
+
+
+logger = logging.getLogger(__name__)
+
+
+class BatchRunner:
+    """
+    Führt mehrere Gold-Konfigurationen (z.B. die SOFA-Varianten) gemeinsam aus.
+
+    Jeder Pipeline-Schritt wird über seine wirksame Konfiguration identifiziert
+    (Schlüssel = Schlüssel des vorherigen Schritts + Konfigurationsabschnitt des
+    Schritts). Varianten mit identischem Präfix, z.B. gleicher Eingabetabelle,
+    Pivot- und Aggregationskonfiguration, teilen sich die Ergebnisse dieser
+    Schritte; erst ab dem ersten abweichenden Schritt wird verzweigt.
+
+    Die Schritte und ihre Parameter entsprechen DataPipeline._run_stages (z.B.
+    performance.long_format, Score-Komponenten ohne Werte als leere Spalten).
+
+    Die Eingabetabelle wird für alle Varianten mit einer einzigen Abfrage
+    geladen. Unterscheiden sich die benötigten Konzepte
+    (load.required_concepts_only), liefert die Abfrage je Konzeptfilter eine
+    boolesche Spalte, über die jede Variante genau die Zeilen ihres eigenen
+    Filters erhält. Das Ergebnis jeder Variante entspricht damit dem eines
+    einzelnen run_pipeline().
+    """
+
+    def __init__(self, config_paths, db_connection=None):
+        """
+        Initialisiert den Batch-Lauf.
+
+        Args:
+            config_paths (list): Pfade zu den Konfigurationsdateien der Varianten.
+            db_connection (DatabaseConnection, optional): Gemeinsames Datenbankverbindungsobjekt.
+                                                         Wenn None, wird eine neue Verbindung erstellt.
+        """
+        self.db = db_connection if db_connection else DatabaseConnection()
+        self.pipelines = [DataPipeline(config_path, db_connection=self.db) for config_path in config_paths]
+        self.config = {}
+        self.last_report = None
+
+        output_tables = [pipeline.get_output_table() for pipeline in self.pipelines]
+        duplicates = [table for table, count in Counter(output_tables).items() if count > 1]
+        if duplicates:
+            raise ValueError(f"Mehrere Konfigurationen schreiben in dieselbe Ausgabetabelle: {duplicates}")
+
+    @instrumentation.run('run_batch')
+    def run(self, save_to_db=True):
+        """
+        Führt alle Varianten aus; gemeinsame Schritte werden nur einmal berechnet.
+
+        Args:
+            save_to_db (bool, optional): Ob jede Variante in ihre output_table geschrieben werden soll.
+
+        Returns:
+            dict: Ausgabetabelle -> Ergebnis der Variante (pandas.DataFrame).
+        """
+        loads = self._plan_loads()
+        plans = [self._plan(pipeline, loads) for pipeline in self.pipelines]
+
+        # Verbleibende Verwendungen je Schritt, damit Zwischenergebnisse früh freigegeben werden
+        uses = Counter(key for plan in plans for key, _ in plan)
+        logger.info(f"{len(self.pipelines)} Varianten, {sum(len(plan) for plan in plans)} Schritte, "
+                    f"davon {len(uses)} verschieden")
+
+        results = {}
+        outputs = {}
+        for pipeline, plan in zip(self.pipelines, plans):
+            data = None
+            for key, step in plan:
+                if key not in results:
+                    results[key] = step(data)
+                data = results[key]
+                uses[key] -= 1
+                if uses[key] == 0:
+                    del results[key]
+
+            output_table = pipeline.get_output_table()
+            if save_to_db:
+                pipeline._save_to_database(data, table=output_table)
+            outputs[output_table] = data
+
+        return outputs
+
+    def _plan(self, pipeline, loads):
+        """
+        Erstellt die Schrittfolge einer Variante als Liste von (Schlüssel, Funktion).
+
+        Jede Funktion erhält das Ergebnis des vorherigen Schritts.
+        """
+        config = pipeline.config
+        steps = []
+        # Aggregation und Imputation im Long-Format (nicht bei SQL-Pushdown, siehe _run_stages)
+        long_format = pipeline._long_format() and not config.get('pushdown', False)
+
+        def add(name, section, function):
+            parent = steps[-1][0] if steps else ()
+            steps.append((parent + (_key(name, section),), function))
+
+        if config.get('pushdown', False):
+            query, params = pipeline._build_load_query()
+            add('pushdown', [query, params, config.get('pivot', {}), config.get('aggregation', {})],
+                lambda data: pipeline.load_aggregated_data())
+        else:
+            source, flag, columns = loads[id(pipeline)]
+            add('load', source, lambda data: self._load(source))
+            # Kompakte Datentypen ändern alle folgenden Ergebnisse und gehören daher zum Schlüssel
+            add('select', [flag, columns, config.get('performance', {}).get('compact_dtypes', False)],
+                lambda data: pipeline._compact_long(_select(data, flag, columns)))
+
+            if pipeline._physiological_limits():
+                add('limits', config.get('outlier_handling', {}), pipeline.apply_limits)
+
+            if long_format:
+                add('aggregate_long', [config.get('pivot', {}), config.get('aggregation', {})], pipeline.aggregate_long)
+                # Imputation im Long-Format, falls möglich, sonst auf dem Wide-Format
+                imputation = config.get('imputation', {}) if config.get('impute_missing_values', True) else None
+                add('long_to_wide', imputation, lambda grid: _impute_wide(pipeline, *pipeline._long_to_wide(grid)))
+            else:
+                if config.get('pivot_data', True):
+                    add('pivot', config.get('pivot', {}), pipeline.pivot_data)
+
+                if config.get('aggregate_data', True):
+                    add('aggregate', config.get('aggregation', {}), pipeline.aggregate_data)
+
+        if config.get('impute_missing_values', True) and not long_format:
+            add('impute', config.get('imputation', {}), pipeline.impute_missing_values)
+
+        if config.get('calculate_derived_parameters', True):
+            add('derived', [config.get('derived_parameters', []), config.get('performance', {}).get('use_numexpr', True)],
+                pipeline.calculate_derived_parameters)
+
+        if config.get('calculate_clinical_scores', True):
+            add('scores', config.get('clinical_scores', []),
+                lambda data: pipeline.calculate_clinical_scores(data, skip_empty_components=False))
+
+        return steps
+
+    def _plan_loads(self):
+        """
+        Fasst die Ladeabfragen aller Varianten je Eingabetabelle zu einer Abfrage zusammen.
+
+        Returns:
+            dict: id(pipeline) -> (Quelle, Name der Filterspalte oder None, zu übernehmende Spalten oder None).
+        """
+        self._load_queries = {}
+        loads = {}
+        groups = {}
+        for pipeline in self.pipelines:
+            if pipeline.config.get('pushdown', False):
+                continue
+            table = pipeline.config.get('input_table', 'standardized_parameters')
+            source = f"{self.db.get_input_schema()}.{table}"
+            groups.setdefault(source, []).append(pipeline)
+
+        for source, pipelines in groups.items():
+            columns, filters = set(), {}
+            select_all = False
+            for pipeline in pipelines:
+                projection = _projection(pipeline.config)
+                if projection is None:
+                    select_all = True
+                else:
+                    columns.update(projection)
+
+                condition, params = pipeline._concept_filter()
+                flag = None
+                if condition:
+                    filter_key = _key(condition, params)
+                    if filter_key not in filters:
+                        filters[filter_key] = (f"_filter_{len(filters)}", pipeline)
+                    flag = filters[filter_key][0]
+                loads[id(pipeline)] = (source, flag, projection)
+
+            # Varianten ohne Konzeptfilter benötigen alle Zeilen
+            unfiltered = any(loads[id(pipeline)][1] is None for pipeline in pipelines)
+
+            select = ['*'] if select_all else sorted(columns)
+            conditions, params = [], {}
+            for i, (flag, pipeline) in enumerate(filters.values()):
+                condition, filter_params = pipeline._concept_filter(prefix=f"f{i}_")
+                select.append(f"COALESCE({condition}, false) AS {flag}")
+                conditions.append(condition)
+                params.update(filter_params)
+
+            query = f"SELECT {', '.join(select)} FROM {source}"
+            if conditions and not unfiltered:
+                query += " WHERE " + " OR ".join(conditions)
+            self._load_queries[source] = (query, params)
+
+        return loads
+
+    def _load(self, source):
+        """
+        Lädt die Eingabetabelle einmal für alle Varianten.
+        """
+        query, params = self._load_queries[source]
+        return self.db.execute_query(query, params=params, sources=[source])
+
+
+def run_batch(config_paths, db_connection=None, save_to_db=True):
+    """
+    Führt mehrere Gold-Konfigurationen mit gemeinsamen Schritten aus (siehe BatchRunner).
+
+    Args:
+        config_paths (list): Pfade zu den Konfigurationsdateien.
+        db_connection (DatabaseConnection, optional): Datenbankverbindungsobjekt.
+        save_to_db (bool, optional): Ob die Ergebnisse gespeichert werden sollen.
+
+    Returns:
+        dict: Ausgabetabelle -> Ergebnis der Variante (pandas.DataFrame).
+    """
+    return BatchRunner(config_paths, db_connection=db_connection).run(save_to_db=save_to_db)
+
+
+def _projection(config):
+    """
+    Spalten, die eine Variante aus der Eingabetabelle lädt (wie in DataPipeline._build_load_query).
+
+    Returns:
+        list or None: Spaltenliste oder None für alle Spalten.
+    """
+    if not config.get('pivot_data', True):
+        return None
+    pivot_config = config.get('pivot', {})
+    outlier_config = config.get('outlier_handling')
+    return list(dict.fromkeys(
+        pivot_config.get('index_cols', ['subject_id', 'charttime'])
+        + [pivot_config.get('pivot_col', 'concept_name'), pivot_config.get('value_col', 'value')]
+        + (['concept_id'] if outlier_config and outlier_config.get('enabled', True) else [])
+    ))
+
+
+def _impute_wide(pipeline, data, imputed):
+    """
+    Imputiert das Wide-Format, falls die Imputation nicht im Long-Format ausgeführt wurde.
+    """
+    if imputed or not pipeline.config.get('impute_missing_values', True):
+        return data
+    return pipeline.impute_missing_values(data)
+
+
+def _select(data, flag, columns):
+    """
+    Wählt die Zeilen und Spalten einer Variante aus dem gemeinsamen Ladeergebnis aus.
+    """
+    if flag is not None:
+        data = data[data[flag].astype(bool)]
+    if columns is None:
+        columns = [col for col in data.columns if not col.startswith('_filter_')]
+    return data[columns].reset_index(drop=True)
+
+
+def _key(*parts):
+    """
+    Serialisiert einen Konfigurationsabschnitt als Teil eines Schrittschlüssels.
+    """
+    return json.dumps(parts, sort_keys=True, default=str)
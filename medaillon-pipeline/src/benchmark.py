@@ -0,0 +1,493 @@
+import argparse
+import copy
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from . import instrumentation
+from .database import DatabaseConnection, OfflineConnection
+from .pipeline import DataPipeline
+from .scoring import SubjectScorer
+from .synthetic import SyntheticGenerator
+
+
+# Fester Name, da das Modul auch als __main__ ausgeführt wird (python -m src.benchmark)
+logger = logging.getLogger(f"{__package__}.benchmark")
+
+# Standardgrößen (Anzahl Patienten)
+DEFAULT_SIZES = (1000, 10000, 100000)
+
+# Imputationsmethoden von impute_missing_values
+IMPUTATION_METHODS = ('locf', 'nocb', 'last', 'mean', 'median', 'zero', 'constant')
+
+# Perzentile der Latenzmessung (siehe LatencyBenchmark)
+LATENCY_PERCENTILES = (50, 90, 99)
+
+# Spalten, die die Pipeline aus standardized_parameters lädt
+LOAD_COLUMNS = ['subject_id', 'hadm_id', 'stay_id', 'charttime', 'concept_id', 'concept_name', 'value']
+
+
+class PipelineBenchmark:
+    """
+    Offline-Benchmark der Gold-Pipeline auf synthetischen Daten (siehe SyntheticGenerator).
+
+    Je Größe werden die Schritte pivot_data, aggregate_data,
+    impute_missing_values (je Methode), calculate_derived_parameters,
+    calculate_clinical_scores sowie der gesamte run_pipeline gemessen, dazu
+    die Schritte im Long-Format (aggregate_long, impute_long, build_wide) und
+    run_pipeline mit performance.long_format. Jeder Schritt erhält als
+    Eingabe das Ergebnis des vorherigen Schritts, das außerhalb der Messung
+    einmal berechnet wird. Je Schritt werden repeat
+    Durchläufe gemessen und Minimum und Median gespeichert.
+
+    Die Ergebnisse werden als JSON gespeichert und können mit compare()
+    zwischen Commits verglichen werden. Zugriffe auf die Datenbank sind
+    ausgeschlossen: Konzeptnamen stammen aus dem Generator, und die
+    Grenztabelle (outlier_handling.use_limits_table) wird nicht geladen.
+
+    Mit den Standardparametern erzeugt der Generator etwa 500 Zeilen je
+    Patient; der Spitzenbedarf an Arbeitsspeicher liegt bei etwa 2 GB je
+    10.000 Patienten.
+    """
+
+    def __init__(self, config_path=None, sizes=DEFAULT_SIZES, repeat=3, seed=0, stay_hours=48,
+                 missing_rate=0.01, methods=IMPUTATION_METHODS, log_level='WARNING'):
+        """
+        Initialisiert den Benchmark.
+
+        Args:
+            config_path (str, optional): Pfad zur Pipeline-Konfiguration. Standard: config/gold/pipeline.yaml.
+            sizes (iterable, optional): Anzahl der Patienten je Messreihe.
+            repeat (int, optional): Durchläufe je Schritt.
+            seed (int, optional): Startwert des Generators.
+            stay_hours (float, optional): Median der Aufenthaltsdauer in Stunden.
+            missing_rate (float, optional): Anteil der Messungen ohne Wert.
+            methods (iterable, optional): Gemessene Imputationsmethoden.
+            log_level (str, optional): Log-Level der Pipeline-Schritte während der Messung.
+        """
+        self.config_path = config_path
+        self.sizes = [int(size) for size in sizes]
+        self.repeat = max(1, int(repeat))
+        self.seed = seed
+        self.stay_hours = stay_hours
+        self.missing_rate = missing_rate
+        self.methods = list(methods)
+        self.log_level = log_level
+        self.results = []
+
+    def create_pipeline(self, generator):
+        """
+        Erstellt eine Pipeline ohne Datenbankzugriff.
+
+        Args:
+            generator (SyntheticGenerator): Generator der Eingabedaten.
+
+        Returns:
+            DataPipeline: Pipeline für den Benchmark.
+        """
+        pipeline = DataPipeline(self.config_path, db_connection=OfflineConnection())
+        config = copy.deepcopy(pipeline.config)
+        if 'outlier_handling' in config:
+            config['outlier_handling']['use_limits_table'] = False
+        # Laufberichte werden im Benchmark nicht gespeichert
+        config.setdefault('instrumentation', {})['report_path'] = None
+        pipeline.config = config
+        instrumentation.configure_logging({**config.get('logging', {}), 'level': self.log_level})
+
+        # Spaltennamen der Konzepte aus dem Generator statt aus der Eingabetabelle;
+        # konfigurierte, aber nicht erzeugte Konzepte gelten als nicht vorhanden
+        names = generator.concept_names
+        pipeline._concept_names.update({concept_id: names.get(concept_id)
+                                        for concept_id in pipeline._configured_concept_ids()})
+        pipeline._concept_names.update(names)
+        return pipeline
+
+    def run(self):
+        """
+        Führt den Benchmark für alle Größen aus.
+
+        Returns:
+            dict: Ergebnis (siehe to_dict()).
+        """
+        self.started_at = datetime.now()
+        self.results = []
+        for size in self.sizes:
+            self.results.extend(self.run_size(size))
+        return self.to_dict()
+
+    def run_size(self, n_subjects):
+        """
+        Misst alle Schritte für eine Anzahl Patienten.
+
+        Args:
+            n_subjects (int): Anzahl der Patienten.
+
+        Returns:
+            list: Ein Eintrag je Schritt.
+        """
+        generator = SyntheticGenerator(n_subjects, stay_hours=self.stay_hours, missing_rate=self.missing_rate,
+                                       seed=self.seed)
+        start = time.perf_counter()
+        data = generator.generate(LOAD_COLUMNS)
+        logger.info(f"{n_subjects} Patienten: {len(data)} Zeilen in {time.perf_counter() - start:.2f}s erzeugt")
+
+        pipeline = self.create_pipeline(generator)
+        results = []
+
+        def record(stage, func, rows):
+            result, timings = self._measure(func)
+            results.append({
+                'subjects': n_subjects,
+                'stage': stage,
+                'rows_in': rows,
+                'rows_out': len(result) if isinstance(result, pd.DataFrame) else None,
+                'min_s': round(min(timings), 6),
+                'median_s': round(float(np.median(timings)), 6),
+                'runs_s': [round(timing, 6) for timing in timings],
+            })
+            logger.info(f"{n_subjects} Patienten, {stage}: {min(timings):.3f}s")
+            return result
+
+        if pipeline._physiological_limits():
+            data = pipeline.apply_limits(data)
+
+        pivoted = record('pivot_data', lambda: pipeline.pivot_data(data), len(data))
+        aggregated = record('aggregate_data', lambda: pipeline.aggregate_data(pivoted), len(pivoted))
+
+        for method in self.methods:
+            record(f'impute_missing_values[{method}]',
+                   lambda: pipeline.impute_missing_values(aggregated, method=method), len(aggregated))
+        # Eingabe der folgenden Schritte wie im Pipeline-Lauf (konfigurierte Methode bzw. Stufen)
+        imputed = pipeline.impute_missing_values(aggregated)
+
+        derived = record('calculate_derived_parameters', lambda: pipeline.calculate_derived_parameters(imputed),
+                         len(imputed))
+        record('calculate_clinical_scores', lambda: pipeline.calculate_clinical_scores(derived), len(derived))
+        record('run_pipeline', lambda: pipeline.run_pipeline(data=data), len(data))
+
+        # Ausführung im Long-Format (performance.long_format)
+        grid = record('aggregate_long', lambda: pipeline.aggregate_long(data), len(data))
+        engine = pipeline._long_imputation(grid)
+        if engine is not None:
+            grid = record('impute_long', lambda: pipeline.impute_long(grid, engine), len(grid.keys))
+        record('build_wide', lambda: pipeline.build_wide(grid), len(grid.keys))
+
+        config = pipeline.config
+        pipeline.config = {**config, 'performance': {**config.get('performance', {}), 'long_format': True}}
+        try:
+            record('run_pipeline[long_format]', lambda: pipeline.run_pipeline(data=data), len(data))
+        finally:
+            pipeline.config = config
+
+        return results
+
+    def _measure(self, func):
+        """
+        Führt eine Funktion repeat-mal aus und misst die Laufzeiten.
+
+        Returns:
+            tuple: (Ergebnis des letzten Durchlaufs, Laufzeiten in Sekunden).
+        """
+        timings = []
+        result = None
+        for _ in range(self.repeat):
+            result = None
+            start = time.perf_counter()
+            result = func()
+            timings.append(time.perf_counter() - start)
+        return result, timings
+
+    def to_dict(self):
+        """
+        Gibt Umgebung, Parameter und Messwerte als dict zurück.
+
+        Returns:
+            dict: Benchmark-Ergebnis.
+        """
+        return {
+            'created_at': getattr(self, 'started_at', datetime.now()).isoformat(timespec='seconds'),
+            'commit': git_commit(),
+            'environment': _environment(),
+            'parameters': {
+                'config_path': self.config_path,
+                'sizes': self.sizes,
+                'repeat': self.repeat,
+                'seed': self.seed,
+                'stay_hours': self.stay_hours,
+                'missing_rate': self.missing_rate,
+            },
+            'peak_rss_mb': instrumentation.peak_rss_mb(),
+            'results': self.results,
+        }
+
+    def save(self, path):
+        """
+        Speichert das Ergebnis als JSON.
+
+        Args:
+            path (str): Zielpfad.
+        """
+        with open(path, 'w') as file:
+            json.dump(self.to_dict(), file, indent=2)
+
+
+class LatencyBenchmark:
+    """
+    Latenz-Benchmark der Einzelabfragen je Patient (siehe SubjectScorer).
+
+    Aus einer synthetischen Population werden samples Patienten zufällig
+    gewählt und einzeln mit score_frame() bewertet (Pipeline-Schritte ohne
+    Datenbank). Gespeichert werden die Dauer der Vorbereitung des Scorers
+    sowie Perzentile (p50, p90, p99) und Maximum der Laufzeiten je Aufruf.
+    Die ersten Aufrufe laufen ungemessen, damit einmalige Initialisierungen
+    die Perzentile nicht verfälschen.
+
+    Mit einer Datenbankverbindung wird zusätzlich score() einschließlich der
+    Abfrage über den Verbindungspool für zufällig gewählte Patienten der
+    Eingabetabelle gemessen.
+    """
+
+    def __init__(self, config_path=None, n_subjects=1000, samples=200, seed=0, stay_hours=48,
+                 missing_rate=0.01, warmup=5, db_connection=None, log_level='WARNING'):
+        """
+        Initialisiert den Benchmark.
+
+        Args:
+            config_path (str, optional): Pfad zur Pipeline-Konfiguration. Standard: config/gold/pipeline.yaml.
+            n_subjects (int, optional): Anzahl der synthetischen Patienten, aus denen gewählt wird.
+            samples (int, optional): Anzahl der gemessenen Aufrufe.
+            seed (int, optional): Startwert des Generators und der Auswahl.
+            stay_hours (float, optional): Median der Aufenthaltsdauer in Stunden.
+            missing_rate (float, optional): Anteil der Messungen ohne Wert.
+            warmup (int, optional): Ungemessene Aufrufe vor der Messung.
+            db_connection (DatabaseConnection, optional): Verbindung für die Messung von score().
+                                                         Wenn None, wird nur offline gemessen.
+            log_level (str, optional): Log-Level der Pipeline-Schritte während der Messung.
+        """
+        self.config_path = config_path
+        self.n_subjects = int(n_subjects)
+        self.samples = max(1, int(samples))
+        self.seed = seed
+        self.stay_hours = stay_hours
+        self.missing_rate = missing_rate
+        self.warmup = max(0, int(warmup))
+        self.db = db_connection
+        self.log_level = log_level
+        self.results = []
+
+    def run(self):
+        """
+        Führt die Messungen aus.
+
+        Returns:
+            dict: Ergebnis (siehe to_dict()).
+        """
+        self.started_at = datetime.now()
+        rng = np.random.default_rng(self.seed)
+
+        generator = SyntheticGenerator(self.n_subjects, stay_hours=self.stay_hours,
+                                       missing_rate=self.missing_rate, seed=self.seed)
+        data = generator.generate(LOAD_COLUMNS)
+        pipeline = PipelineBenchmark(self.config_path, log_level=self.log_level).create_pipeline(generator)
+
+        start = time.perf_counter()
+        scorer = SubjectScorer(pipeline=pipeline, pivot_values=pipeline._pivot_values_from_data(data), sample=data)
+        prepare = time.perf_counter() - start
+
+        frames = [frame.reset_index(drop=True) for _, frame in data.groupby('subject_id', sort=False)]
+        chosen = [frames[i] for i in rng.integers(len(frames), size=self.samples)]
+        self.results = [self._measure('score_frame', scorer.score_frame, chosen, prepare)]
+
+        if self.db is not None:
+            start = time.perf_counter()
+            scorer = SubjectScorer(self.config_path, db_connection=self.db)
+            prepare = time.perf_counter() - start
+
+            pipeline = scorer.pipeline
+            table = pipeline.config.get('input_table', 'standardized_parameters')
+            subject_ids = self.db.execute_query(
+                f"SELECT DISTINCT subject_id FROM {self.db.get_input_schema()}.{table}")['subject_id'].tolist()
+            chosen = [{'subject_id': int(subject_ids[i])} for i in rng.integers(len(subject_ids), size=self.samples)]
+            self.results.append(self._measure('score', lambda kwargs: scorer.score(**kwargs), chosen, prepare))
+
+        return self.to_dict()
+
+    def _measure(self, stage, func, inputs, prepare):
+        """
+        Misst func einzeln für jede Eingabe und fasst die Laufzeiten zusammen.
+
+        Returns:
+            dict: Eintrag mit Perzentilen in Millisekunden.
+        """
+        for value in inputs[:self.warmup]:
+            func(value)
+
+        timings = []
+        rows = []
+        for value in inputs:
+            start = time.perf_counter()
+            result = func(value)
+            timings.append(time.perf_counter() - start)
+            rows.append(len(result))
+
+        timings_ms = np.array(timings) * 1000
+        entry = {'stage': stage, 'samples': len(inputs), 'prepare_s': round(prepare, 6),
+                 'rows_out_median': float(np.median(rows))}
+        for percentile, value in zip(LATENCY_PERCENTILES, np.percentile(timings_ms, LATENCY_PERCENTILES)):
+            entry[f'p{percentile}_ms'] = round(float(value), 3)
+        entry['max_ms'] = round(float(timings_ms.max()), 3)
+        logger.info(f"{stage}: p50 {entry['p50_ms']:.1f} ms, p99 {entry['p99_ms']:.1f} ms")
+        return entry
+
+    def to_dict(self):
+        """
+        Gibt Umgebung, Parameter und Messwerte als dict zurück.
+
+        Returns:
+            dict: Benchmark-Ergebnis.
+        """
+        return {
+            'created_at': getattr(self, 'started_at', datetime.now()).isoformat(timespec='seconds'),
+            'commit': git_commit(),
+            'environment': _environment(),
+            'parameters': {
+                'config_path': self.config_path,
+                'n_subjects': self.n_subjects,
+                'samples': self.samples,
+                'seed': self.seed,
+                'stay_hours': self.stay_hours,
+                'missing_rate': self.missing_rate,
+            },
+            'results': self.results,
+        }
+
+    def save(self, path):
+        """
+        Speichert das Ergebnis als JSON.
+
+        Args:
+            path (str): Zielpfad.
+        """
+        with open(path, 'w') as file:
+            json.dump(self.to_dict(), file, indent=2)
+
+
+def _environment():
+    """
+    Versionen und Plattform der Messumgebung.
+    """
+    return {
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+    }
+
+
+def compare(baseline, current, threshold=1.1):
+    """
+    Vergleicht zwei Benchmark-Ergebnisse (z.B. zweier Commits) je Größe und Schritt.
+
+    Verglichen wird die minimale Laufzeit, die am wenigsten von anderen
+    Prozessen beeinflusst wird.
+
+    Args:
+        baseline (dict): Ergebnis des Referenzlaufs.
+        current (dict): Ergebnis des aktuellen Laufs.
+        threshold (float, optional): Verhältnis aktuell/Referenz, ab dem ein Schritt als langsamer gilt.
+
+    Returns:
+        pandas.DataFrame: subjects, stage, baseline_s, current_s, ratio, regression.
+    """
+    def frame(result):
+        return pd.DataFrame(result['results'], columns=['subjects', 'stage', 'min_s'])
+
+    merged = frame(baseline).merge(frame(current), on=['subjects', 'stage'], suffixes=('_baseline', '_current'))
+    merged = merged.rename(columns={'min_s_baseline': 'baseline_s', 'min_s_current': 'current_s'})
+    merged['ratio'] = (merged['current_s'] / merged['baseline_s']).round(3)
+    merged['regression'] = merged['ratio'] > threshold
+    return merged
+
+
+def git_commit():
+    """
+    Aktueller Commit des Repositorys.
+
+    Returns:
+        str or None: Commit-Hash (mit '-dirty' bei lokalen Änderungen) oder None außerhalb eines Repositorys.
+    """
+    cwd = os.path.dirname(os.path.abspath(__file__))
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=cwd, capture_output=True, text=True,
+                                check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=cwd,
+                               capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return f"{commit}-dirty" if dirty else commit
+
+
+def main(argv=None):
+    """
+    Kommandozeile: python -m src.benchmark --sizes 1000 10000 --output benchmark.json
+
+    Mit --latency wird statt des Durchsatzes die Latenz der Einzelabfragen
+    gemessen (python -m src.benchmark --latency 500 --sizes 1000).
+    """
+    parser = argparse.ArgumentParser(description="Offline-Benchmark der Gold-Pipeline auf synthetischen Daten")
+    parser.add_argument('--config', help="Pfad zur Pipeline-Konfiguration (Standard: config/gold/pipeline.yaml)")
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(DEFAULT_SIZES), help="Anzahl der Patienten")
+    parser.add_argument('--repeat', type=int, default=3, help="Durchläufe je Schritt")
+    parser.add_argument('--seed', type=int, default=0, help="Startwert des Generators")
+    parser.add_argument('--stay-hours', type=float, default=48, help="Median der Aufenthaltsdauer in Stunden")
+    parser.add_argument('--missing-rate', type=float, default=0.01, help="Anteil der Messungen ohne Wert")
+    parser.add_argument('--methods', nargs='+', default=list(IMPUTATION_METHODS), help="Imputationsmethoden")
+    parser.add_argument('--output', default='benchmark.json', help="Zielpfad der JSON-Ergebnisse")
+    parser.add_argument('--compare', help="JSON-Ergebnis eines früheren Laufs zum Vergleich")
+    parser.add_argument('--threshold', type=float, default=1.1,
+                        help="Verhältnis aktuell/Referenz, ab dem ein Schritt als langsamer gilt")
+    parser.add_argument('--latency', type=int, metavar='SAMPLES',
+                        help="Latenz von SAMPLES Einzelabfragen je Patient messen (Population: erste Größe)")
+    parser.add_argument('--database', help="database.yaml für die Latenzmessung einschließlich Abfrage")
+    args = parser.parse_args(argv)
+
+    # Pipeline-Schritte protokollieren nur Warnungen, der Benchmark seinen Fortschritt
+    logger.setLevel(logging.INFO)
+
+    if args.latency:
+        db = DatabaseConnection(args.database) if args.database else None
+        benchmark = LatencyBenchmark(args.config, n_subjects=args.sizes[0], samples=args.latency, seed=args.seed,
+                                     stay_hours=args.stay_hours, missing_rate=args.missing_rate, db_connection=db)
+        result = benchmark.run()
+        benchmark.save(args.output)
+        print(pd.DataFrame(result['results']).to_string(index=False))
+        print(f"Ergebnisse gespeichert: {args.output}")
+        return 0
+
+    benchmark = PipelineBenchmark(args.config, sizes=args.sizes, repeat=args.repeat, seed=args.seed,
+                                  stay_hours=args.stay_hours, missing_rate=args.missing_rate, methods=args.methods)
+    result = benchmark.run()
+    benchmark.save(args.output)
+
+    table = pd.DataFrame(result['results'], columns=['subjects', 'stage', 'rows_in', 'min_s', 'median_s'])
+    print(table.to_string(index=False))
+    print(f"Ergebnisse gespeichert: {args.output}")
+
+    if args.compare:
+        with open(args.compare) as file:
+            comparison = compare(json.load(file), result, threshold=args.threshold)
+        print(comparison.to_string(index=False))
+        if comparison['regression'].any():
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1 @@
+# Bronze-Ebene: Extraktion aus MIMIC-IV
@@ -11,6 +11,10 @@
 -- #
 -- # Primäre Zielgruppe: Anästhesisten und klinische Forscher
 -- # Datum: 09.05.2025
+-- #
+-- # Für den vollständigen MIMIC-IV-Datensatz steht mit
+-- # python -m src.bronze.loader eine partitionierte, parallele und
+-- # fortsetzbare Extraktion zur Verfügung (config/bronze/extraction.yaml).
 -- ############################################################
 
 -- ############################################################
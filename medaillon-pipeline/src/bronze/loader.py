@@ -0,0 +1,402 @@
+import argparse
+import contextvars
+import logging
+import os
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import pandas as pd
+import yaml
+from sqlalchemy import text
+from ..database import DatabaseConnection
+from ..instrumentation import measure
+
+
+logger = logging.getLogger(f"{__package__}.loader")
+
+# Spalten der Bronze-Tabelle (ohne id) mit ihren Datentypen
+COLUMNS = {
+    'subject_id': 'INTEGER NOT NULL',
+    'hadm_id': 'INTEGER',
+    'stay_id': 'INTEGER',
+    'charttime': 'TIMESTAMP NOT NULL',
+    'storetime': 'TIMESTAMP',
+    'itemid': 'INTEGER NOT NULL',
+    'parameter_name': 'VARCHAR(255) NOT NULL',
+    'value': 'TEXT',
+    'valuenum': 'NUMERIC',
+    'valueuom': 'VARCHAR(50)',
+    'warning': 'BOOLEAN DEFAULT FALSE',
+    'error': 'BOOLEAN DEFAULT FALSE',
+    'source_table': 'VARCHAR(50) NOT NULL',
+}
+
+# Indizierte Spalten der Bronze-Tabelle
+INDEX_COLUMNS = ['subject_id', 'itemid', 'charttime']
+
+# Extraktion je Quelltabelle (wie in create_bronze_tables.sql): Quelltabelle s,
+# Item-Definitionen d und Ausdrücke je Zielspalte, soweit sie von s.<Spalte> abweichen
+SOURCES = {
+    'chartevents': {
+        'table': 'mimiciv_icu.chartevents',
+        'items': 'mimiciv_icu.d_items',
+        'columns': {'warning': 'FALSE', 'error': 'FALSE'},
+    },
+    'labevents': {
+        'table': 'mimiciv_hosp.labevents',
+        'items': 'mimiciv_hosp.d_labitems',
+        'columns': {'stay_id': 'NULL', 'value': 'CAST(s.value AS TEXT)', 'warning': 'FALSE',
+                    'error': "(s.flag = 'abnormal')"},
+    },
+    'inputevents': {
+        'table': 'mimiciv_icu.inputevents',
+        'items': 'mimiciv_icu.d_items',
+        'columns': {'charttime': 's.starttime', 'storetime': 'NULL', 'value': 'CAST(s.amount AS TEXT)',
+                    'valuenum': 's.amount', 'valueuom': 's.amountuom', 'warning': 'FALSE',
+                    'error': "(s.statusdescription = 'Rewritten')"},
+    },
+}
+
+
+class BronzeLoader:
+    """
+    Partitionierte, parallele Extraktion der Bronze-Tabelle aus MIMIC-IV.
+
+    Ersetzt die INSERT ... SELECT-Anweisungen aus create_bronze_tables.sql:
+
+    1. Jede Quelltabelle wird in subject_id-Bereiche aufgeteilt (partitions).
+    2. Die Partitionen werden gleichzeitig auf eigenen Verbindungen aus dem
+       Pool (parallel_tasks) in eine UNLOGGED-Staging-Tabelle ohne Indizes
+       geschrieben. Jede Partition wird in derselben Transaktion wie ihr
+       Eintrag in der Fortschrittstabelle festgeschrieben, sodass ein
+       abgebrochener Lauf nur die fehlenden Partitionen nachlädt. Da
+       PostgreSQL UNLOGGED-Tabellen nach einem Absturz leert, werden vor dem
+       Fortsetzen die Zeilen der Staging-Tabelle je Quelltabelle mit dem
+       Fortschritt abgeglichen; bei Abweichungen werden die Partitionen dieser
+       Quelltabelle neu geladen.
+    3. Danach werden Primärschlüssel und Indizes einmal (die Indizes
+       gleichzeitig) erstellt, die Staging-Tabelle analysiert und in einer
+       Transaktion gegen die Zieltabelle getauscht.
+
+    Die Itemid-Listen stammen aus config/bronze/extraction.yaml; doppelte
+    Einträge werden nur einmal abgefragt.
+    """
+
+    def __init__(self, config_path=None, db_connection=None):
+        """
+        Initialisiert den Loader.
+
+        Args:
+            config_path (str, optional): Pfad zur Extraktionskonfiguration.
+                                         Standard: config/bronze/extraction.yaml.
+            db_connection (DatabaseConnection, optional): Datenbankverbindungsobjekt.
+                                                         Standard: Verbindung aus config/bronze/database.yaml.
+        """
+        base_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        if config_path is None:
+            config_path = os.path.join(base_dir, 'config', 'bronze', 'extraction.yaml')
+        with open(config_path, 'r') as file:
+            self.config = yaml.safe_load(file)
+
+        if db_connection is None:
+            db_connection = DatabaseConnection(os.path.join(base_dir, 'config', 'bronze', 'database.yaml'))
+        self.db = db_connection
+
+        self.schema = self.db.get_output_schema()
+        self.target = self.config.get('target_table', 'clinical_parameters')
+        self.staging = f"{self.target}_staging"
+        self.progress = self.config.get('progress_table', 'bronze_load_progress')
+        self.sources = [self._source(entry) for entry in self.config.get('sources', [])]
+
+    def _source(self, entry):
+        """
+        Vervollständigt einen Eintrag aus 'sources' um die Definition der Quelltabelle.
+        """
+        name = entry['name']
+        if name not in SOURCES:
+            raise ValueError(f"Unbekannte Quelltabelle: {name}")
+
+        itemids = [int(itemid) for itemid in entry.get('itemids', [])]
+        duplicates = sorted(itemid for itemid, count in Counter(itemids).items() if count > 1)
+        if duplicates:
+            logger.warning(f"Doppelte itemids für {name} werden nur einmal abgefragt: {duplicates}")
+
+        return {**SOURCES[name], **{key: value for key, value in entry.items() if key != 'columns'},
+                'name': name, 'itemids': sorted(set(itemids))}
+
+    def partitions(self):
+        """
+        Teilt den Wertebereich der subject_id in Partitionen.
+
+        Returns:
+            list: Parameter je Partition ({'lower': ..., 'upper': ...}, halboffen).
+        """
+        bounds_table = self.config.get('bounds_table', 'mimiciv_hosp.patients')
+        bounds = self.db.execute_query(
+            f"SELECT MIN(subject_id) AS lower, MAX(subject_id) AS upper FROM {bounds_table}"
+        ).iloc[0]
+        if pd.isna(bounds['lower']):
+            return []
+        return self.db.range_partitions(bounds['lower'], bounds['upper'], self.config.get('partitions', 32))
+
+    def run(self, restart=False):
+        """
+        Lädt die Bronze-Tabelle.
+
+        Args:
+            restart (bool, optional): Staging-Tabelle und Fortschritt eines abgebrochenen Laufs verwerfen.
+
+        Returns:
+            dict: Geladene Zeilen je Quelltabelle (einschließlich bereits abgeschlossener Partitionen).
+        """
+        start = time.perf_counter()
+        self._prepare(restart)
+
+        tasks = [(source, partition) for partition in self.partitions() for source in self.sources]
+        done = self._verify_staging(self._completed())
+        planned = {(source['name'], partition['lower'], partition['upper']) for source, partition in tasks}
+        if not done.keys() <= planned:
+            raise ValueError("Partitionen des abgebrochenen Laufs passen nicht zur Konfiguration, "
+                             "bitte mit restart=True neu starten")
+
+        pending = [(source, partition) for source, partition in tasks
+                   if (source['name'], partition['lower'], partition['upper']) not in done]
+        if done:
+            logger.info(f"Setze abgebrochenen Lauf fort: {len(done)} von {len(tasks)} Partitionen bereits geladen")
+
+        self._load_partitions(pending, len(tasks) - len(pending), len(tasks))
+        self._finalize()
+
+        rows = Counter()
+        for (name, _, _), count in self._completed().items():
+            rows[name] += count
+        self.db.execute_statement(f"DELETE FROM {self.schema}.{self.progress} WHERE target_table = :target",
+                                  {'target': self.target})
+
+        logger.info(f"Bronze-Tabelle {self.schema}.{self.target} geladen: {dict(rows)} "
+                    f"in {time.perf_counter() - start:.1f}s")
+        return dict(rows)
+
+    def _prepare(self, restart):
+        """
+        Erstellt Schema, Fortschrittstabelle und (falls nicht vorhanden) die Staging-Tabelle.
+        """
+        self.db.execute_statement(f"CREATE SCHEMA IF NOT EXISTS {self.schema}")
+        self.db.execute_statement(f"""
+        CREATE TABLE IF NOT EXISTS {self.schema}.{self.progress} (
+            target_table VARCHAR(255) NOT NULL,
+            source_table VARCHAR(50) NOT NULL,
+            lower_bound BIGINT NOT NULL,
+            upper_bound BIGINT NOT NULL,
+            row_count BIGINT NOT NULL,
+            duration_s DOUBLE PRECISION,
+            finished_at TIMESTAMP NOT NULL DEFAULT now(),
+            PRIMARY KEY (target_table, source_table, lower_bound, upper_bound)
+        )
+        """)
+
+        if self._exists(f"{self.schema}.{self.staging}") and not restart:
+            return
+
+        columns = ',\n            '.join(f"{name} {definition}" for name, definition in COLUMNS.items())
+        self.db.execute_statement(f"DROP TABLE IF EXISTS {self.schema}.{self.staging}")
+        self.db.execute_statement(f"DELETE FROM {self.schema}.{self.progress} WHERE target_table = :target",
+                                  {'target': self.target})
+        self.db.execute_statement(f"""
+        CREATE UNLOGGED TABLE {self.schema}.{self.staging} (
+            id SERIAL,
+            {columns}
+        )
+        """)
+
+    def _exists(self, name):
+        """
+        Prüft, ob eine Tabelle bzw. ein Index existiert.
+        """
+        result = self.db.execute_query("SELECT to_regclass(:name) IS NOT NULL AS present", params={'name': name})
+        return bool(result['present'].iloc[0])
+
+    def _completed(self):
+        """
+        Bereits geladene Partitionen.
+
+        Returns:
+            dict: (Quelltabelle, untere Grenze, obere Grenze) -> Zeilen.
+        """
+        result = self.db.execute_query(
+            f"SELECT source_table, lower_bound, upper_bound, row_count FROM {self.schema}.{self.progress} "
+            f"WHERE target_table = :target",
+            params={'target': self.target}
+        )
+        return {(row.source_table, int(row.lower_bound), int(row.upper_bound)): int(row.row_count)
+                for row in result.itertuples(index=False)}
+
+    def _verify_staging(self, done):
+        """
+        Gleicht die Zeilen der Staging-Tabelle je Quelltabelle mit dem Fortschritt ab.
+
+        Nach einem Absturz des Datenbankservers ist die UNLOGGED-Staging-Tabelle
+        leer, während die Fortschrittstabelle die Partitionen weiterhin als geladen
+        führt. Für Quelltabellen, deren Zeilenzahl von der Summe der row_count
+        abweicht, werden Zeilen und Fortschritt verworfen, damit ihre Partitionen
+        neu geladen werden.
+
+        Args:
+            done (dict): Bereits geladene Partitionen (siehe _completed).
+
+        Returns:
+            dict: Bereits geladene Partitionen, deren Zeilen vollständig in der Staging-Tabelle liegen.
+        """
+        if not done:
+            return done
+
+        expected = Counter()
+        for (name, _, _), count in done.items():
+            expected[name] += count
+        result = self.db.execute_query(
+            f"SELECT source_table, COUNT(*) AS row_count FROM {self.schema}.{self.staging} GROUP BY source_table"
+        )
+        staged = {row.source_table: int(row.row_count) for row in result.itertuples(index=False)}
+
+        mismatched = sorted(name for name in expected.keys() | staged.keys()
+                            if expected[name] != staged.get(name, 0))
+        for name in mismatched:
+            logger.warning(f"Staging-Tabelle enthält {staged.get(name, 0)} statt {expected[name]} Zeilen "
+                           f"aus {name} (z.B. nach einem Absturz), Partitionen werden neu geladen")
+            self.db.execute_statement(f"DELETE FROM {self.schema}.{self.staging} WHERE source_table = :source",
+                                      {'source': name})
+            self.db.execute_statement(f"DELETE FROM {self.schema}.{self.progress} "
+                                      f"WHERE target_table = :target AND source_table = :source",
+                                      {'target': self.target, 'source': name})
+
+        return {key: count for key, count in done.items() if key[0] not in mismatched}
+
+    def _insert_statement(self, source):
+        """
+        INSERT ... SELECT einer Partition einer Quelltabelle.
+        """
+        expressions = []
+        for column in COLUMNS:
+            if column == 'parameter_name':
+                expression = 'd.label'
+            elif column == 'source_table':
+                expression = f"'{source['name']}'"
+            else:
+                expression = source['columns'].get(column, f"s.{column}")
+            expressions.append(f"{expression} AS {column}")
+
+        return f"""
+        INSERT INTO {self.schema}.{self.staging} ({', '.join(COLUMNS)})
+        SELECT {', '.join(expressions)}
+        FROM {source['table']} s
+        JOIN {source['items']} d ON s.itemid = d.itemid
+        WHERE s.itemid = ANY(:itemids)
+        AND s.subject_id >= :lower AND s.subject_id < :upper
+        """
+
+    def _load_partitions(self, tasks, finished, total):
+        """
+        Lädt Partitionen gleichzeitig auf eigenen Verbindungen in die Staging-Tabelle.
+        """
+        if not tasks:
+            return
+
+        engine = self.db.connect()
+        statements = {source['name']: self._insert_statement(source) for source in self.sources}
+        progress = f"""
+        INSERT INTO {self.schema}.{self.progress}
+            (target_table, source_table, lower_bound, upper_bound, row_count, duration_s)
+        VALUES (:target, :source, :lower, :upper, :rows, :duration)
+        """
+
+        def load(source, partition):
+            start = time.perf_counter()
+            with measure('query', f"bronze_{source['name']}"):
+                with engine.begin() as connection:
+                    # Die Staging-Tabelle ist UNLOGGED; nur der Fortschrittseintrag wird protokolliert
+                    connection.execute(text("SET LOCAL synchronous_commit = off"))
+                    rows = connection.execute(text(statements[source['name']]),
+                                              {'itemids': source['itemids'], **partition}).rowcount
+                    duration = time.perf_counter() - start
+                    connection.execute(text(progress), {'target': self.target, 'source': source['name'],
+                                                        'rows': rows, 'duration': duration, **partition})
+            return rows, duration
+
+        parallel_tasks = max(1, int(self.config.get('parallel_tasks', 4)))
+        with ThreadPoolExecutor(max_workers=min(parallel_tasks, len(tasks))) as executor:
+            futures = {executor.submit(contextvars.copy_context().run, load, source, partition): (source, partition)
+                       for source, partition in tasks}
+            for future in as_completed(futures):
+                source, partition = futures[future]
+                rows, duration = future.result()
+                finished += 1
+                logger.info(f"Partition {finished}/{total} geladen: {source['name']} subject_id "
+                            f"[{partition['lower']}, {partition['upper']}), {rows} Zeilen in {duration:.1f}s")
+
+    def _finalize(self):
+        """
+        Erstellt Primärschlüssel und Indizes der Staging-Tabelle und tauscht sie gegen die Zieltabelle.
+        """
+        staging = f"{self.schema}.{self.staging}"
+        settings = self._session_settings()
+
+        with measure('query', 'bronze_indexes'):
+            if self.config.get('logged', True):
+                self.db.execute_statement(f"ALTER TABLE {staging} SET LOGGED")
+            # Bei einem erneuten Aufruf nach Abbruch bereits vorhandene Indizes überspringen
+            if not self._exists(f"{self.schema}.{self.staging}_pkey"):
+                self.db.execute_statement(
+                    f"{settings}ALTER TABLE {staging} ADD CONSTRAINT {self.staging}_pkey PRIMARY KEY (id)"
+                )
+
+            # Sekundärindizes gleichzeitig erstellen (CREATE INDEX sperrt nur Schreibzugriffe)
+            statements = [f"{settings}CREATE INDEX IF NOT EXISTS idx_{self.staging}_{column} ON {staging}({column})"
+                          for column in INDEX_COLUMNS]
+            with ThreadPoolExecutor(max_workers=len(statements)) as executor:
+                for future in [executor.submit(contextvars.copy_context().run, self.db.execute_statement, statement)
+                               for statement in statements]:
+                    future.result()
+            self.db.execute_statement(f"ANALYZE {staging}")
+
+        renames = [f"ALTER INDEX {self.schema}.{self.staging}_pkey RENAME TO {self.target}_pkey",
+                   f"ALTER SEQUENCE {self.schema}.{self.staging}_id_seq RENAME TO {self.target}_id_seq"]
+        renames += [f"ALTER INDEX {self.schema}.idx_{self.staging}_{column} RENAME TO idx_{self.target}_{column}"
+                    for column in INDEX_COLUMNS]
+
+        with measure('query', 'bronze_swap'):
+            with self.db.connect().begin() as connection:
+                connection.execute(text(f"DROP TABLE IF EXISTS {self.schema}.{self.target}"))
+                connection.execute(text(f"ALTER TABLE {staging} RENAME TO {self.target}"))
+                for statement in renames:
+                    connection.execute(text(statement))
+
+    def _session_settings(self):
+        """
+        SET-Anweisung für den Arbeitsspeicher der Indexerstellung (maintenance_work_mem),
+        gültig nur für die Transaktion der jeweiligen Anweisung.
+        """
+        memory = self.config.get('maintenance_work_mem')
+        if not memory:
+            return ''
+        return f"SET LOCAL maintenance_work_mem = '{memory}'; "
+
+
+def main(argv=None):
+    """
+    Kommandozeile: python -m src.bronze.loader [--restart]
+    """
+    parser = argparse.ArgumentParser(description="Partitionierte, parallele Extraktion der Bronze-Tabelle")
+    parser.add_argument('--config', help="Pfad zur Extraktionskonfiguration (Standard: config/bronze/extraction.yaml)")
+    parser.add_argument('--database', help="Pfad zur Datenbankkonfiguration (Standard: config/bronze/database.yaml)")
+    parser.add_argument('--restart', action='store_true', help="Abgebrochenen Lauf verwerfen und neu beginnen")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+    db_connection = DatabaseConnection(args.database) if args.database else None
+    BronzeLoader(args.config, db_connection=db_connection).run(restart=args.restart)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,262 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import tempfile
+from datetime import datetime
+from sqlalchemy import text
+from .writer import _quote
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow ist optional
+    pa = None
+    pq = None
+
+
+logger = logging.getLogger(__name__)
+
+
+class QueryCache:
+    """
+    Lokaler spaltenorientierter Cache für Abfrageergebnisse (Arrow IPC oder Parquet).
+
+    Der Schlüssel eines Eintrags setzt sich aus der normalisierten Abfrage, den
+    gebundenen Parametern und einem Fingerabdruck des Zustands der
+    Quelltabellen zusammen. Der Fingerabdruck ist günstig zu ermitteln
+    (relfilenode und Änderungszähler aus pg_stat_user_tables sowie optional
+    MAX(id)); ändert sich eine Quelltabelle, ändert sich der Schlüssel und der
+    alte Eintrag wird nicht mehr verwendet. Einträge werden memory-mapped
+    gelesen und bei Überschreiten der Maximalgröße nach dem Prinzip
+    least-recently-used entfernt.
+    """
+
+    FORMATS = {'arrow': '.arrow', 'parquet': '.parquet'}
+
+    def __init__(self, engine, directory, max_size_mb=2048, file_format='arrow', id_column='id'):
+        """
+        Initialisiert den Cache.
+
+        Args:
+            engine (sqlalchemy.engine.Engine): Engine für die Fingerabdruck-Abfragen.
+            directory (str): Verzeichnis der Cache-Dateien.
+            max_size_mb (float, optional): Maximale Gesamtgröße des Caches in MB.
+            file_format (str, optional): 'arrow' (Arrow IPC, unkomprimiert) oder 'parquet'.
+            id_column (str, optional): Monoton steigende ID-Spalte für den Fingerabdruck (None = nicht verwenden).
+        """
+        if pa is None:
+            raise ImportError("Für den Abfrage-Cache wird pyarrow benötigt")
+        if file_format not in self.FORMATS:
+            raise ValueError(f"Ungültiges Cache-Format: {file_format}")
+
+        self.engine = engine
+        self.directory = directory
+        self.max_size = int(max_size_mb * 1024 * 1024)
+        self.file_format = file_format
+        self.id_column = id_column
+        os.makedirs(directory, exist_ok=True)
+
+    def read(self, query, params, sources, load):
+        """
+        Liefert das Ergebnis aus dem Cache oder führt die Abfrage aus und speichert es.
+
+        Args:
+            query (str): SQL-Abfrage.
+            params (dict): Gebundene Parameter der Abfrage.
+            sources (list): Quelltabellen der Abfrage ('schema.tabelle').
+            load (callable): Führt die Abfrage aus und gibt ein DataFrame zurück.
+
+        Returns:
+            pandas.DataFrame: Ergebnis der Abfrage.
+        """
+        fingerprints = [self.fingerprint(source) for source in sources]
+        if any(fingerprint is None for fingerprint in fingerprints):
+            # Zustand der Quelle nicht ermittelbar, Ergebnis nicht cachen
+            return load()
+
+        key = self.key(query, params, fingerprints)
+        data = self.get(key)
+        if data is not None:
+            logger.info(f"Abfrageergebnis aus dem Cache geladen ({key[:12]}, {len(data)} Zeilen)")
+            return data
+
+        data = load()
+        try:
+            self.put(key, data, query, sources)
+        except (OSError, ValueError, pa.ArrowException) as e:
+            # Ein nicht speicherbares Ergebnis (z.B. volle Platte, nicht konvertierbare
+            # Spalten) darf die Abfrage nicht scheitern lassen
+            logger.warning(f"Abfrageergebnis konnte nicht im Cache gespeichert werden ({key[:12]}): {e}")
+        return data
+
+    def key(self, query, params, fingerprints):
+        """
+        Bildet den Schlüssel aus normalisierter Abfrage, Parametern und Fingerabdrücken.
+
+        Returns:
+            str: SHA-256-Hash als Hex-String.
+        """
+        normalized = re.sub(r'\s+', ' ', query).strip()
+        payload = json.dumps([normalized, params or {}, fingerprints], sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def fingerprint(self, source):
+        """
+        Ermittelt den Fingerabdruck einer Quelltabelle.
+
+        Args:
+            source (str): Tabelle als 'schema.tabelle'.
+
+        Returns:
+            list or None: Fingerabdruck oder None, wenn die Tabelle nicht gefunden wurde.
+        """
+        schema, table = source.split('.', 1)
+        with self.engine.connect() as connection:
+            row = connection.execute(text("""
+                SELECT c.relfilenode, s.n_tup_ins, s.n_tup_upd, s.n_tup_del,
+                       EXISTS (
+                           SELECT 1 FROM information_schema.columns
+                           WHERE table_schema = :schema AND table_name = :table AND column_name = :id_column
+                       ) AS has_id
+                FROM pg_class c
+                JOIN pg_namespace n ON n.oid = c.relnamespace
+                LEFT JOIN pg_stat_user_tables s ON s.relid = c.oid
+                WHERE n.nspname = :schema AND c.relname = :table
+            """), {'schema': schema, 'table': table, 'id_column': self.id_column or ''}).fetchone()
+
+            if row is None:
+                return None
+
+            fingerprint = [row.relfilenode, row.n_tup_ins, row.n_tup_upd, row.n_tup_del]
+            # Die Statistikzähler werden von PostgreSQL verzögert (bis zu einigen Sekunden)
+            # aktualisiert; MAX(id) erkennt neu eingefügte Zeilen sofort. Nach Updates
+            # bestehender Zeilen kann invalidate() den Cache sofort leeren.
+            if row.has_id:
+                max_id = connection.execute(text(f"SELECT MAX({_quote(self.id_column)}) FROM {_quote(schema)}.{_quote(table)}")).scalar()
+                fingerprint.append(max_id)
+
+        return fingerprint
+
+    def get(self, key):
+        """
+        Liest einen Eintrag memory-mapped ein.
+
+        Returns:
+            pandas.DataFrame or None: Daten oder None, wenn kein Eintrag existiert.
+        """
+        path = self._path(key)
+        if not os.path.exists(path):
+            return None
+
+        try:
+            if self.file_format == 'arrow':
+                with pa.memory_map(path) as source:
+                    table = pa.ipc.open_file(source).read_all()
+            else:
+                table = pq.read_table(path, memory_map=True)
+            data = table.to_pandas()
+        except (OSError, pa.ArrowException) as e:
+            logger.warning(f"Cache-Eintrag {key[:12]} nicht lesbar, wird verworfen: {e}")
+            self._remove(key)
+            return None
+
+        # Zugriffszeit für die LRU-Verdrängung aktualisieren
+        os.utime(path)
+        return data
+
+    def put(self, key, data, query, sources):
+        """
+        Speichert ein Abfrageergebnis und verdrängt bei Bedarf alte Einträge.
+
+        Jeder Schreibvorgang verwendet eine eigene temporäre Datei, die erst
+        vollständig geschrieben umbenannt wird; gleichzeitige Prozesse mit
+        demselben Schlüssel überschreiben sich so nicht gegenseitig.
+        """
+        path = self._path(key)
+        table = pa.Table.from_pandas(data, preserve_index=False)
+
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        os.close(fd)
+        try:
+            if self.file_format == 'arrow':
+                with pa.OSFile(tmp_path, 'wb') as sink:
+                    with pa.ipc.new_file(sink, table.schema) as writer:
+                        writer.write_table(table)
+            else:
+                pq.write_table(table, tmp_path)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+        with open(self._meta_path(key), 'w') as file:
+            json.dump({
+                'query': query,
+                'sources': list(sources),
+                'rows': len(data),
+                'created_at': datetime.now().isoformat(),
+            }, file)
+
+        self._evict()
+
+    def invalidate(self, source=None):
+        """
+        Entfernt Einträge aus dem Cache.
+
+        Args:
+            source (str, optional): Nur Einträge dieser Quelltabelle ('schema.tabelle') entfernen.
+                                    Wenn None, wird der gesamte Cache geleert.
+
+        Returns:
+            int: Anzahl der entfernten Einträge.
+        """
+        removed = 0
+        for key in self._keys():
+            if source is not None:
+                try:
+                    with open(self._meta_path(key)) as file:
+                        sources = json.load(file).get('sources', [])
+                except (OSError, ValueError):
+                    sources = []
+                if source not in sources:
+                    continue
+            self._remove(key)
+            removed += 1
+        return removed
+
+    def size(self):
+        """
+        Gesamtgröße der Cache-Dateien in Bytes.
+        """
+        return sum(os.path.getsize(self._path(key)) for key in self._keys())
+
+    def _evict(self):
+        """
+        Entfernt die am längsten nicht verwendeten Einträge, bis die Maximalgröße eingehalten ist.
+        """
+        entries = [(os.path.getmtime(self._path(key)), os.path.getsize(self._path(key)), key) for key in self._keys()]
+        total = sum(size for _, size, _ in entries)
+
+        for _, size, key in sorted(entries):
+            if total <= self.max_size:
+                break
+            self._remove(key)
+            total -= size
+            logger.info(f"Cache-Eintrag {key[:12]} verdrängt ({size / 1024 / 1024:.1f} MB)")
+
+    def _keys(self):
+        extension = self.FORMATS[self.file_format]
+        return [name[:-len(extension)] for name in os.listdir(self.directory) if name.endswith(extension)]
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + self.FORMATS[self.file_format])
+
+    def _meta_path(self, key):
+        return os.path.join(self.directory, key + '.json')
+
+    def _remove(self, key):
+        for path in (self._path(key), self._meta_path(key)):
+            if os.path.exists(path):
+                os.remove(path)
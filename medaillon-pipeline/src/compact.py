@@ -0,0 +1,118 @@
+import numpy as np
+import pandas as pd
+
+
+# ID-Spalten, die als nullable Int32 gespeichert werden
+ID_COLUMNS = ['subject_id', 'hadm_id', 'stay_id', 'concept_id']
+
+INT32_MIN, INT32_MAX = np.iinfo('int32').min, np.iinfo('int32').max
+
+
+class CompactDtypes:
+    """
+    Kompakte Darstellung der Long- und Wide-Frames (performance.compact_dtypes).
+
+    - Konzeptnamen (Pivot-Spalte) als category
+    - ID-Spalten als nullable Int32 (nur wenn alle Werte in den Wertebereich passen)
+    - Messwerte, abgeleitete Parameter und Aggregate als float32
+    - Score-Spalten und Score-Komponenten als nullable Int8
+
+    Präzisionsvertrag gegenüber der float64-Verarbeitung:
+
+    - Messwerte werden auf float32 gerundet (relativer Fehler <= 2^-24, ca. 6e-8,
+      also etwa 7 signifikante Stellen).
+    - Mittelwerte, imputierte und abgeleitete Werte weichen um höchstens 1e-6
+      relativ zum Betrag der eingehenden Werte von der float64-Verarbeitung ab
+      (bei Mittelwerten mit Auslöschung also relativ zum größten Einzelwert,
+      nicht zum Ergebnis).
+    - Score-Komponenten vergleichen float32-Werte mit float32-Schwellenwerten.
+      Sie stimmen mit der float64-Verarbeitung überein, außer wenn der
+      float64-Wert innerhalb dieser Toleranz an einem Schwellenwert liegt; dann
+      kann die Komponente um genau eine Stufe abweichen und mit ihr der
+      Gesamtscore. Das betrifft vor allem Quotienten gerundeter Messwerte, die
+      exakt auf einer Schwelle liegen: PaO2 80 / FiO2 0.40 ergibt in float64
+      genau 200, in float32 199.99999 (SOFA_score mit pipeline.yaml und
+      synthetischen Daten: etwa 0.2-0.3 % der Zeilen). Ein Vergleich in
+      float64 behebt das nicht, da 0.40 bereits als float32 gespeichert ist
+      (0.4000000059...); für schwellengenaue Scores compact_dtypes deaktivieren.
+    - IDs, Zeitstempel, Zeilen und Spalten sind identisch.
+    """
+
+    SCORE_DTYPE = 'Int8'
+
+    def __init__(self, pivot_col='concept_name', value_col='value'):
+        """
+        Initialisiert die Umwandlung.
+
+        Args:
+            pivot_col (str, optional): Spalte mit den Konzeptnamen im Long-Format.
+            value_col (str, optional): Spalte mit den Messwerten im Long-Format.
+        """
+        self.pivot_col = pivot_col
+        self.value_col = value_col
+
+    def long(self, data):
+        """
+        Wandelt Daten im Long-Format in kompakte Datentypen um.
+
+        Args:
+            data (pandas.DataFrame): Daten im Long-Format (z.B. aus load_data).
+
+        Returns:
+            pandas.DataFrame: Daten mit kompakten Datentypen.
+        """
+        columns = {}
+        if self.pivot_col in data.columns and not isinstance(data[self.pivot_col].dtype, pd.CategoricalDtype):
+            columns[self.pivot_col] = data[self.pivot_col].astype('category')
+        if self.value_col in data.columns:
+            columns[self.value_col] = _to_float32(data[self.value_col])
+        columns.update(self._ids(data))
+        return data.assign(**columns) if columns else data
+
+    def wide(self, data, exclude=()):
+        """
+        Wandelt Daten im Wide-Format in kompakte Datentypen um.
+
+        Args:
+            data (pandas.DataFrame): Daten im Wide-Format (z.B. aus pivot_data oder aggregate_data).
+            exclude (iterable, optional): Spalten, die nicht umgewandelt werden.
+
+        Returns:
+            pandas.DataFrame: Daten mit kompakten Datentypen.
+        """
+        columns = self._ids(data)
+        for col in data.columns:
+            if col in columns or col in exclude or col in ID_COLUMNS:
+                continue
+            dtype = data[col].dtype
+            if pd.api.types.is_float_dtype(dtype) and dtype != 'float32':
+                columns[col] = _to_float32(data[col])
+        return data.assign(**columns) if columns else data
+
+    def _ids(self, data):
+        """
+        Wandelt ID-Spalten in nullable Int32 um, sofern der Wertebereich es zulässt.
+        """
+        columns = {}
+        for col in ID_COLUMNS:
+            if col not in data.columns or data[col].dtype == 'Int32':
+                continue
+            values = pd.to_numeric(data[col], errors='coerce')
+            if values.notna().any() and (values.min() < INT32_MIN or values.max() > INT32_MAX):
+                continue
+            # Nur ganzzahlige IDs umwandeln
+            if pd.api.types.is_float_dtype(values.dtype) and not np.array_equal(values.dropna(), np.floor(values.dropna())):
+                continue
+            columns[col] = values.astype('Int32')
+        return columns
+
+
+def _to_float32(series):
+    """
+    Wandelt eine Spalte (auch object, z.B. Decimal aus NUMERIC-Spalten) in float32 um.
+    """
+    if series.dtype == 'object':
+        series = pd.to_numeric(series, errors='coerce')
+    if isinstance(series.dtype, np.dtype):
+        return series.astype('float32')
+    return pd.Series(series.to_numpy(dtype='float32', na_value=np.nan), index=series.index, name=series.name)
@@ -1,7 +1,17 @@
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
 import yaml
 import os
+from .instrumentation import measure
+from .cache import QueryCache
+from .writer import _quote
+
+try:
+    import pyarrow as pa
+except ImportError:  # pyarrow ist optional
+    pa = None
 
 
 class DatabaseConnection:
@@ -9,6 +19,9 @@ class DatabaseConnection:
     Klasse zur Verwaltung der Datenbankverbindung für die Medaillon-Pipeline.
     """
     
+    # Standardwerte des Verbindungspools (Abschnitt 'pool' der Konfiguration)
+    POOL_DEFAULTS = {'size': 5, 'max_overflow': 10, 'pre_ping': True, 'recycle': 1800, 'timeout': 30}
+    
     def __init__(self, config_path=None):
         """
         Initialisiert die Datenbankverbindung mit den Konfigurationsparametern.
@@ -30,6 +43,9 @@ class DatabaseConnection:
         
         # Engine erstellen
         self.engine = None
+        
+        # Lokaler Cache für Abfrageergebnisse (siehe QueryCache), wird bei Bedarf erstellt
+        self.cache = None
     
     def _load_config(self, config_path):
         """
@@ -58,26 +74,245 @@ class DatabaseConnection:
         """
         Stellt eine Verbindung zur Datenbank her.
         
+        Die Engine verwaltet einen Verbindungspool, dessen Größe, Prüfung vor
+        der Verwendung (pre_ping) und maximale Lebensdauer einer Verbindung
+        (recycle, in Sekunden) im Abschnitt 'pool' der Konfiguration festgelegt werden.
+        
         Returns:
             sqlalchemy.engine.Engine: SQLAlchemy-Engine-Objekt.
         """
         if self.engine is None:
-            self.engine = create_engine(self.connection_string)
+            pool = {**self.POOL_DEFAULTS, **(self.config.get('pool') or {})}
+            self.engine = create_engine(
+                self.connection_string,
+                pool_size=pool['size'],
+                max_overflow=pool['max_overflow'],
+                pool_pre_ping=pool['pre_ping'],
+                pool_recycle=pool['recycle'],
+                pool_timeout=pool['timeout']
+            )
         return self.engine
     
-    def execute_query(self, query):
+    def execute_query(self, query, params=None, sources=None):
         """
         Führt eine SQL-Abfrage aus und gibt das Ergebnis als DataFrame zurück.
         
         Args:
             query (str): SQL-Abfrage.
+            params (dict, optional): Gebundene Parameter der Abfrage (z.B. {'subject_ids': [...]} für :subject_ids).
+            sources (list, optional): Quelltabellen der Abfrage ('schema.tabelle'). Wenn angegeben und der
+                                      Cache in der Konfiguration aktiviert ist, wird das Ergebnis lokal
+                                      zwischengespeichert, solange sich die Quelltabellen nicht ändern.
             
         Returns:
             pandas.DataFrame: Ergebnis der Abfrage.
         """
-        from sqlalchemy import text
         engine = self.connect()
-        return pd.read_sql(text(query), engine)
+        
+        def load():
+            with measure('query', 'execute_query') as measurement:
+                result = pd.read_sql(text(query), engine, params=params)
+                measurement.output(result)
+            return result
+        
+        cache = self.get_cache() if sources else None
+        if cache is None:
+            return load()
+        
+        with measure('query', 'cached_query') as measurement:
+            result = cache.read(query, params, sources, load)
+            measurement.output(result)
+        return result
+    
+    def get_cache(self):
+        """
+        Gibt den Abfrage-Cache zurück, falls er in der Konfiguration aktiviert ist.
+        
+        Returns:
+            QueryCache or None: Cache oder None, wenn deaktiviert.
+        """
+        cache_config = self.config.get('cache', {})
+        if self.cache is None and cache_config.get('enabled', False):
+            base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+            self.cache = QueryCache(
+                self.connect(),
+                cache_config.get('directory') or os.path.join(base_dir, 'cache'),
+                max_size_mb=cache_config.get('max_size_mb', 2048),
+                file_format=cache_config.get('format', 'arrow'),
+                id_column=cache_config.get('id_column', 'id')
+            )
+        return self.cache
+    
+    def invalidate_cache(self, source=None):
+        """
+        Entfernt Einträge aus dem Abfrage-Cache.
+        
+        Args:
+            source (str, optional): Nur Einträge dieser Quelltabelle ('schema.tabelle') entfernen.
+                                    Wenn None, wird der gesamte Cache geleert.
+            
+        Returns:
+            int: Anzahl der entfernten Einträge.
+        """
+        cache = self.get_cache()
+        return cache.invalidate(source) if cache is not None else 0
+    
+    def execute_statement(self, statement, params=None):
+        """
+        Führt eine SQL-Anweisung ohne Ergebnismenge (z.B. DDL, INSERT) in einer Transaktion aus.
+        
+        Args:
+            statement (str): SQL-Anweisung.
+            params (dict or list, optional): Gebundene Parameter; eine Liste von dicts führt die
+                                             Anweisung für jeden Eintrag aus.
+        """
+        engine = self.connect()
+        with measure('query', 'execute_statement'):
+            with engine.begin() as connection:
+                connection.execute(text(statement), params)
+    
+    def iter_query(self, query, chunk_size=100000, params=None, as_arrow=False):
+        """
+        Führt eine SQL-Abfrage über einen serverseitigen Cursor aus und liefert
+        das Ergebnis in Blöcken, ohne es vollständig in den Speicher zu laden.
+        
+        Args:
+            query (str): SQL-Abfrage.
+            chunk_size (int, optional): Anzahl der Zeilen pro Block.
+            params (dict, optional): Gebundene Parameter der Abfrage.
+            as_arrow (bool, optional): Blöcke als pyarrow.Table statt als DataFrame liefern.
+            
+        Yields:
+            pandas.DataFrame or pyarrow.Table: Nächster Block des Ergebnisses.
+        """
+        if as_arrow:
+            _require_arrow()
+        engine = self.connect()
+        with engine.connect().execution_options(stream_results=True, max_row_buffer=chunk_size) as connection:
+            chunks = pd.read_sql(text(query), connection, chunksize=chunk_size, params=params)
+            while True:
+                with measure('query', 'iter_query') as measurement:
+                    chunk = next(chunks, None)
+                    if chunk is not None:
+                        measurement.output(chunk)
+                if chunk is None:
+                    break
+                yield _to_arrow(chunk) if as_arrow else chunk
+    
+    def fetch_concurrent(self, queries, max_workers=None, as_arrow=False):
+        """
+        Führt mehrere Abfragen (z.B. Partitionen nach subject_id) parallel über den Verbindungspool aus.
+        
+        Jede Abfrage läuft in einem eigenen Thread mit einer eigenen Verbindung
+        aus dem Pool. Der Datenbanktreiber gibt während der Wartezeit auf den
+        Server die GIL frei, sodass Ausführung und Übertragung der Partitionen
+        überlappen. Die Abfragen werden im laufenden Bericht (siehe
+        instrumentation) einzeln erfasst.
+        
+        Args:
+            queries (list): Abfragen als SQL-Text oder Paare (SQL, gebundene Parameter),
+                            z.B. eine Abfrage mit :lower/:upper und range_partitions().
+            max_workers (int, optional): Anzahl gleichzeitiger Abfragen. Standard: Poolgröße.
+            as_arrow (bool, optional): Ergebnisse als pyarrow.Table statt als DataFrame liefern.
+            
+        Returns:
+            list: Ergebnisse in der Reihenfolge der Abfragen.
+        """
+        if as_arrow:
+            _require_arrow()
+        queries = [(query, None) if isinstance(query, str) else tuple(query) for query in queries]
+        if not queries:
+            return []
+        
+        if max_workers is None:
+            max_workers = {**self.POOL_DEFAULTS, **(self.config.get('pool') or {})}['size']
+        engine = self.connect()
+        
+        def fetch(query, params):
+            with measure('query', 'fetch_concurrent') as measurement:
+                with engine.connect() as connection:
+                    result = pd.read_sql(text(query), connection, params=params)
+                measurement.output(result)
+            return _to_arrow(result) if as_arrow else result
+        
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(queries))) as executor:
+            # Eigene Kopie des Kontexts je Abfrage, damit sie im laufenden Bericht erfasst wird
+            futures = [executor.submit(contextvars.copy_context().run, fetch, query, params)
+                       for query, params in queries]
+            return [future.result() for future in futures]
+    
+    def fetch_subjects(self, table, schema=None, subject_ids=None, start_time=None, end_time=None,
+                       columns=None, key_col='subject_id', time_col='time_window'):
+        """
+        Lädt die Zeilen ausgewählter Patienten und eines Zeitbereichs aus einer Ausgabetabelle.
+        
+        Patienten und Zeitgrenzen werden als gebundene Parameter übergeben. Bei nach
+        subject_id partitionierten Tabellen (siehe BulkWriter) liest PostgreSQL nur die
+        Partitionen der angefragten Patienten, der Zeitbereich nutzt den Index auf
+        (subject_id, time_window) bzw. den BRIN-Index auf time_window.
+        
+        Args:
+            table (str): Name der Tabelle.
+            schema (str, optional): Name des Schemas. Wenn None, wird das Ausgabeschema verwendet.
+            subject_ids (list, optional): Patienten-IDs. Wenn None, werden alle Patienten geladen.
+            start_time (datetime, optional): Beginn des Zeitbereichs (einschließlich).
+            end_time (datetime, optional): Ende des Zeitbereichs (ausschließlich).
+            columns (list, optional): Zu ladende Spalten (z.B. ['SOFA_score']); Schlüssel- und
+                                      Zeitspalte werden immer geladen. Wenn None, alle Spalten.
+            key_col (str, optional): Patientenspalte.
+            time_col (str, optional): Zeitspalte. Wenn None, wird nicht nach Zeit gefiltert oder sortiert.
+            
+        Returns:
+            pandas.DataFrame: Zeilen sortiert nach Patient und Zeit.
+        """
+        if schema is None:
+            schema = self.get_output_schema()
+        
+        keys = [key_col] + ([time_col] if time_col else [])
+        if columns is None:
+            select = '*'
+        else:
+            select = ', '.join(_quote(col) for col in dict.fromkeys(keys + list(columns)))
+        
+        conditions, params = [], {}
+        
+        if subject_ids is not None:
+            conditions.append(f"{_quote(key_col)} = ANY(:subject_ids)")
+            params['subject_ids'] = [int(subject_id) for subject_id in subject_ids]
+        
+        if start_time is not None:
+            conditions.append(f"{_quote(time_col)} >= :start_time")
+            params['start_time'] = pd.Timestamp(start_time).to_pydatetime()
+        
+        if end_time is not None:
+            conditions.append(f"{_quote(time_col)} < :end_time")
+            params['end_time'] = pd.Timestamp(end_time).to_pydatetime()
+        
+        query = f"SELECT {select} FROM {_quote(schema)}.{_quote(table)}"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY " + ", ".join(_quote(col) for col in keys)
+        
+        return self.execute_query(query, params=params)
+    
+    @staticmethod
+    def range_partitions(lower, upper, n_partitions):
+        """
+        Teilt einen Wertebereich (z.B. subject_id) in gleich breite, halboffene Partitionen.
+        
+        Args:
+            lower (int): Kleinster Wert.
+            upper (int): Größter Wert.
+            n_partitions (int): Anzahl der Partitionen.
+            
+        Returns:
+            list: Parameter je Partition ({'lower': ..., 'upper': ...}) für
+                  Bedingungen der Form "col >= :lower AND col < :upper".
+        """
+        n_partitions = max(1, int(n_partitions))
+        step = -(-(int(upper) - int(lower) + 1) // n_partitions)
+        return [{'lower': start, 'upper': min(start + step, int(upper) + 1)}
+                for start in range(int(lower), int(upper) + 1, max(step, 1))]
     
     def get_schema_names(self):
         """
@@ -108,12 +343,12 @@ class DatabaseConnection:
         if schema is None:
             schema = self.config['database']['schema_input']
         
-        query = f"""
+        query = """
         SELECT table_name 
         FROM information_schema.tables 
-        WHERE table_schema = '{schema}'
+        WHERE table_schema = :schema
         """
-        result = self.execute_query(query)
+        result = self.execute_query(query, params={'schema': schema})
         return result['table_name'].tolist()
     
     def get_columns(self, table, schema=None):
@@ -130,15 +365,40 @@ class DatabaseConnection:
         if schema is None:
             schema = self.config['database']['schema_input']
         
-        query = f"""
+        query = """
         SELECT column_name 
         FROM information_schema.columns 
-        WHERE table_schema = '{schema}' 
-        AND table_name = '{table}'
+        WHERE table_schema = :schema 
+        AND table_name = :table
+        ORDER BY ordinal_position
         """
-        result = self.execute_query(query)
+        result = self.execute_query(query, params={'schema': schema, 'table': table})
         return result['column_name'].tolist()
     
+    def get_column_types(self, table, schema=None):
+        """
+        Gibt die Spalten einer Tabelle mit ihren Datentypen zurück.
+        
+        Args:
+            table (str): Name der Tabelle.
+            schema (str, optional): Name des Schemas. Wenn None, wird das Eingabeschema aus der Konfiguration verwendet.
+            
+        Returns:
+            dict: Spaltenname -> Datentyp wie in information_schema.columns (z.B. 'bigint').
+        """
+        if schema is None:
+            schema = self.config['database']['schema_input']
+        
+        query = """
+        SELECT column_name, data_type
+        FROM information_schema.columns 
+        WHERE table_schema = :schema 
+        AND table_name = :table
+        ORDER BY ordinal_position
+        """
+        result = self.execute_query(query, params={'schema': schema, 'table': table})
+        return dict(zip(result['column_name'], result['data_type']))
+    
     def get_input_schema(self):
         """
         Gibt das Eingabeschema aus der Konfiguration zurück.
@@ -156,3 +416,46 @@ class DatabaseConnection:
             str: Name des Ausgabeschemas.
         """
         return self.config['database']['schema_output']
+
+
+class OfflineConnection:
+    """
+    Ersatz für DatabaseConnection ohne Datenbank (z.B. in Arbeitsprozessen oder
+    im Benchmark): stellt die Schemanamen bereit und bricht bei jedem
+    Datenbankzugriff ab, damit nie unbemerkt eine Datenbank abgefragt wird.
+    """
+    
+    def __init__(self, schema_input='silver_schema', schema_output='gold_schema'):
+        """
+        Initialisiert die Verbindung.
+        
+        Args:
+            schema_input (str, optional): Name des Eingabeschemas.
+            schema_output (str, optional): Name des Ausgabeschemas.
+        """
+        self.schema_input = schema_input
+        self.schema_output = schema_output
+    
+    def get_input_schema(self):
+        return self.schema_input
+    
+    def get_output_schema(self):
+        return self.schema_output
+    
+    def execute_query(self, query, params=None, sources=None):
+        raise RuntimeError(f"Keine Datenbankverbindung, Abfrage nicht möglich: {query}")
+
+
+def _require_arrow():
+    """
+    Prüft, ob pyarrow für Arrow-Ergebnisse verfügbar ist.
+    """
+    if pa is None:
+        raise ImportError("Für Arrow-Ergebnisse wird pyarrow benötigt")
+
+
+def _to_arrow(frame):
+    """
+    Wandelt ein Abfrageergebnis in eine pyarrow.Table um.
+    """
+    return pa.Table.from_pandas(frame, preserve_index=False)
@@ -0,0 +1,314 @@
+import ast
+import logging
+import operator
+import re
+import numpy as np
+import pandas as pd
+
+try:
+    import numexpr
+except ImportError:  # numexpr ist optional
+    numexpr = None
+
+
+logger = logging.getLogger(__name__)
+
+
+# Spaltenreferenzen in Formeln: $["Name"], $['Name'], $[3004249] und $name
+COLUMN_REFERENCE = re.compile(
+    r"""\$\[\s*(?:"(?P<dq>[^"]*)"|'(?P<sq>[^']*)'|(?P<id>\d+))\s*\]|\$(?P<name>[A-Za-z_][A-Za-z0-9_]*)"""
+)
+
+# Erlaubte arithmetische Operatoren
+BINARY_OPERATORS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.Pow: operator.pow,
+}
+UNARY_OPERATORS = {
+    ast.USub: operator.neg,
+    ast.UAdd: operator.pos,
+}
+
+# Ab dieser Zeilenzahl wird numexpr verwendet (falls installiert)
+NUMEXPR_MIN_ROWS = 100000
+
+
+class CompiledFormula:
+    """
+    Einmalig geparste Formel eines abgeleiteten Parameters.
+
+    Die Formel wird in einen AST aus Spaltenreferenzen, Zahlen und den
+    Operatoren + - * / ** übersetzt. Alles andere (Funktionsaufrufe, Attribute,
+    Namen ohne $-Präfix, ...) wird beim Kompilieren abgelehnt, sodass auch
+    Konfigurationen anderer Teams gefahrlos ausgewertet werden können. Potenzen
+    ohne Spaltenreferenz (z.B. 9 ** 9 ** 9) werden ebenfalls abgelehnt, da Python
+    sie mit beliebig großen Ganzzahlen ohne Zeitgrenze berechnen würde.
+    """
+
+    def __init__(self, formula):
+        """
+        Kompiliert die Formel.
+
+        Args:
+            formula (str): Formel aus der Konfiguration, z.B. '($["Systolic blood pressure"] + 2 * $["Diastolic blood pressure"]) / 3'.
+
+        Raises:
+            ValueError: Wenn die Formel kein arithmetischer Ausdruck ist.
+        """
+        self.formula = str(formula)
+        self.columns = []
+        placeholders = {}
+
+        def substitute(match):
+            column = next(group for group in match.groups() if group is not None)
+            if column not in placeholders:
+                placeholders[column] = f"_c{len(placeholders)}"
+                self.columns.append(column)
+            return placeholders[column]
+
+        expression = COLUMN_REFERENCE.sub(substitute, self.formula)
+        self._placeholders = {placeholder: column for column, placeholder in placeholders.items()}
+
+        try:
+            tree = ast.parse(expression.strip(), mode='eval')
+        except SyntaxError as e:
+            raise ValueError(f"Ungültige Formel '{self.formula}': {e.msg}")
+
+        self._evaluate = self._compile(tree.body)
+        self._expression = ast.unparse(tree.body)
+
+    def _compile(self, node):
+        """
+        Übersetzt einen AST-Knoten in eine Funktion über ein dict von Spaltenarrays.
+        """
+        if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)) and not isinstance(node.value, bool):
+            value = node.value
+            return lambda env: value
+
+        if isinstance(node, ast.Name) and node.id in self._placeholders:
+            name = node.id
+            return lambda env: env[name]
+
+        if isinstance(node, ast.BinOp) and isinstance(node.op, ast.Pow) and not self._references_column(node):
+            raise ValueError(f"Ungültige Formel '{self.formula}': ** ist nur mit einer Spaltenreferenz erlaubt")
+
+        if isinstance(node, ast.BinOp) and type(node.op) in BINARY_OPERATORS:
+            op = BINARY_OPERATORS[type(node.op)]
+            left, right = self._compile(node.left), self._compile(node.right)
+            return lambda env: op(left(env), right(env))
+
+        if isinstance(node, ast.UnaryOp) and type(node.op) in UNARY_OPERATORS:
+            op = UNARY_OPERATORS[type(node.op)]
+            operand = self._compile(node.operand)
+            return lambda env: op(operand(env))
+
+        raise ValueError(f"Ungültige Formel '{self.formula}': nur Spaltenreferenzen, Zahlen und + - * / ** sind erlaubt")
+
+    def _references_column(self, node):
+        """
+        Prüft, ob ein Teilausdruck mindestens eine Spaltenreferenz enthält.
+
+        Nur solche Ausdrücke werden mit numpy-Arrays (feste Breite) ausgewertet.
+        """
+        return any(isinstance(child, ast.Name) and child.id in self._placeholders for child in ast.walk(node))
+
+    def evaluate(self, columns, use_numexpr=False):
+        """
+        Wertet die Formel vektorisiert aus.
+
+        Args:
+            columns (dict): Spaltenname -> numpy-Array für alle referenzierten Spalten.
+            use_numexpr (bool, optional): Ob numexpr verwendet werden soll (falls installiert).
+
+        Returns:
+            numpy.ndarray or float: Ergebnis; bei Formeln ohne Spaltenreferenz ein Skalar.
+        """
+        env = {placeholder: columns[column] for placeholder, column in self._placeholders.items()}
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            if use_numexpr and numexpr is not None and env:
+                return numexpr.evaluate(self._expression, local_dict=env)
+            return self._evaluate(env)
+
+
+class DerivedParameterEngine:
+    """
+    Berechnet alle abgeleiteten Parameter einer Konfiguration in einem Durchlauf.
+
+    Die Formeln werden einmalig kompiliert; Abhängigkeiten zwischen abgeleiteten
+    Parametern (ein Parameter verwendet einen anderen) werden als DAG aufgelöst,
+    sodass die Reihenfolge in der Konfiguration keine Rolle spielt. Alle
+    Ergebnisse werden gesammelt und mit einer einzigen Kopie an den Frame
+    angehängt.
+    """
+
+    def __init__(self, derived_params, use_numexpr=True):
+        """
+        Initialisiert die Engine.
+
+        Args:
+            derived_params (list): Abschnitt 'derived_parameters' der Konfiguration.
+            use_numexpr (bool, optional): numexpr für große Frames verwenden, falls installiert.
+        """
+        self.use_numexpr = use_numexpr
+        self.params = []
+        for param in derived_params:
+            entry = {
+                'name': param.get('name'),
+                'formula': param.get('formula'),
+                'required_columns': [str(col) for col in param.get('required_columns', [])],
+                'compiled': None,
+                'error': None,
+            }
+            try:
+                entry['compiled'] = CompiledFormula(entry['formula'])
+            except ValueError as e:
+                entry['error'] = str(e)
+            self.params.append(entry)
+
+        self.order, cyclic = self._resolve_order()
+        for entry in cyclic:
+            entry['error'] = f"Zyklische Abhängigkeit zwischen abgeleiteten Parametern bei {entry['name']}"
+
+    def _resolve_order(self):
+        """
+        Sortiert die Parameter topologisch nach ihren Abhängigkeiten.
+
+        Unabhängige Parameter behalten die Reihenfolge der Konfiguration.
+
+        Returns:
+            tuple: (geordnete Parameter, Parameter in Zyklen)
+        """
+        names = {entry['name'] for entry in self.params}
+        depends = []
+        for entry in self.params:
+            used = set(entry['required_columns'])
+            if entry['compiled'] is not None:
+                used.update(entry['compiled'].columns)
+            depends.append({col for col in used if col in names and col != entry['name']})
+
+        order, done = [], set()
+        remaining = list(range(len(self.params)))
+        while remaining:
+            ready = [i for i in remaining if depends[i] <= done]
+            if not ready:
+                break
+            for i in ready:
+                order.append(self.params[i])
+                done.add(self.params[i]['name'])
+            remaining = [i for i in remaining if i not in ready]
+
+        return order, [self.params[i] for i in remaining]
+
+    def available(self, columns):
+        """
+        Gibt die angegebenen Spalten und alle daraus berechenbaren abgeleiteten Parameter zurück.
+
+        Args:
+            columns (iterable): Vorhandene Spalten.
+
+        Returns:
+            set: Vorhandene und berechenbare Spalten.
+        """
+        available = set(columns)
+        for entry in self.order:
+            if entry['error'] is not None:
+                continue
+            if all(col in available for col in entry['required_columns'] + entry['compiled'].columns):
+                available.add(entry['name'])
+        return available
+
+    def compute(self, data):
+        """
+        Berechnet alle abgeleiteten Parameter.
+
+        Gibt es bereits eine gemessene Spalte mit dem Namen eines abgeleiteten
+        Parameters (z.B. Mean arterial pressure), bleiben die gemessenen Werte
+        erhalten; die Formel füllt nur fehlende Werte auf.
+
+        Args:
+            data (pandas.DataFrame): Eingabedaten im Wide-Format.
+
+        Returns:
+            pandas.DataFrame: Daten mit abgeleiteten Parametern.
+        """
+        new_columns = {}
+        available = set(data.columns)
+        use_numexpr = self.use_numexpr and len(data) >= NUMEXPR_MIN_ROWS
+
+        def column(name):
+            return new_columns[name] if name in new_columns else data[name]
+
+        for entry in self.params:
+            if entry['error'] is not None and entry not in self.order:
+                logger.error(f"Fehler bei der Berechnung von {entry['name']}: {entry['error']}")
+
+        for entry in self.order:
+            name = entry['name']
+
+            # Prüfen, ob alle erforderlichen Spalten vorhanden sind
+            missing = [col for col in entry['required_columns'] if col not in available]
+            for col in missing:
+                kind = 'concept_id' if col.isdigit() else 'Spalte'
+                logger.warning(f"Erforderliche {kind} {col} für {name} nicht gefunden")
+            if missing:
+                logger.warning(f"Überspringe Berechnung von {name} wegen fehlender Spalten")
+                continue
+
+            if entry['error'] is not None:
+                logger.error(f"Fehler bei der Berechnung von {name}: {entry['error']}")
+                continue
+
+            compiled = entry['compiled']
+            missing = [col for col in compiled.columns if col not in available]
+            if missing:
+                logger.error(f"Fehler bei der Berechnung von {name}: Spalte(n) {missing} nicht gefunden")
+                continue
+
+            logger.debug(f"Berechne {name} mit Formel: {entry['formula']}")
+
+            # Nicht-numerische Spalten einmalig konvertieren
+            for col in dict.fromkeys(entry['required_columns'] + compiled.columns):
+                if column(col).dtype == 'object':
+                    logger.debug(f"Konvertiere Spalte {col} zu numerischen Werten")
+                    new_columns[col] = pd.to_numeric(column(col), errors='coerce')
+
+            arrays = {col: _as_array(column(col)) for col in compiled.columns}
+            values = compiled.evaluate(arrays, use_numexpr=use_numexpr)
+            # Konstante Formeln werden auf alle Zeilen übertragen
+            result_values = pd.Series(values, index=data.index)
+            if name in data.columns:
+                measured = column(name)
+                if measured.dtype == 'object':
+                    measured = pd.to_numeric(measured, errors='coerce')
+                logger.warning(f"Spalte {name} ist bereits in den Daten vorhanden; "
+                               f"nur fehlende Werte werden aus der Formel berechnet")
+                result_values = measured.fillna(result_values)
+            new_columns[name] = result_values
+            available.add(name)
+
+            # Statistiken nur im Debug-Modus berechnen
+            if logger.isEnabledFor(logging.DEBUG) and not result_values.empty:
+                logger.debug(f"Ergebnis für {name}: Min={result_values.min()}, Max={result_values.max()}, Mittelwert={result_values.mean()}")
+
+        if not new_columns:
+            return data.copy()
+
+        # Neue Spalten in der Reihenfolge der Konfiguration anhängen
+        ordered = {col: values for col, values in new_columns.items() if col in data.columns}
+        for entry in self.params:
+            if entry['name'] in new_columns:
+                ordered[entry['name']] = new_columns[entry['name']]
+        return data.assign(**ordered)
+
+
+def _as_array(series):
+    """
+    Liefert die Werte einer Spalte als numpy-Array; nullable Typen werden zu float mit NaN.
+    """
+    if isinstance(series.dtype, np.dtype):
+        return series.to_numpy()
+    return series.to_numpy(dtype='float64', na_value=np.nan)
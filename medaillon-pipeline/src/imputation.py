@@ -0,0 +1,423 @@
+import logging
+import numpy as np
+import pandas as pd
+from .aggregation import entry_columns, entry_concept_ids
+
+
+logger = logging.getLogger(__name__)
+
+# Quellkonzepte der Ableitungen der ersten Imputationsstufe
+GCS_SUBSCORE_CONCEPTS = (3016335, 3009094, 3008223)  # Augenöffnung, verbale und motorische Reaktion
+SPO2_CONCEPT = 4020553  # Oxygen saturation measurement
+
+# PaO2 wird nur bis zu dieser Sättigung aus SpO2 geschätzt; darüber ist die Bindungskurve zu flach
+SPO2_MAX_FOR_PAO2 = 97
+
+
+class ImputationEngine:
+    """
+    Vektorisierte Imputation fehlender Werte im Wide-Format.
+
+    Alle Methoden ('locf', 'nocb', 'last', 'mean', 'median', 'zero', 'constant')
+    arbeiten mit genau einer Sortierung und einem gruppierten Durchlauf über
+    alle numerischen Spalten gleichzeitig, statt Zeile für Zeile.
+
+    LOCF und NOCB können die Übertragung je Spalte auf eine maximale Dauer
+    (max_age) seit bzw. bis zur letzten echten Messung begrenzen.
+    """
+
+    def __init__(self, method='locf', group_by=None, constant_value=0, max_age=None, column_max_age=None):
+        """
+        Initialisiert die Imputation.
+
+        Args:
+            method (str, optional): Imputationsmethode.
+            group_by (list, optional): Spalten für die Gruppierung (z.B. ['subject_id']).
+            constant_value (float, optional): Füllwert für die Methode 'constant'.
+            max_age (str or pandas.Timedelta, optional): Maximale Übertragungsdauer für LOCF/NOCB
+                                                          (z.B. '24h'). Wenn None, unbegrenzt.
+            column_max_age (dict, optional): Abweichende maximale Übertragungsdauer je Spalte
+                                             (None = unbegrenzt).
+        """
+        self.method = method
+        self.group_by = list(group_by) if group_by else []
+        self.constant_value = constant_value
+        self.max_age = _timedelta(max_age)
+        self.column_max_age = {col: _timedelta(value) for col, value in (column_max_age or {}).items()}
+
+    def impute(self, data):
+        """
+        Imputiert fehlende Werte in den Daten.
+
+        Args:
+            data (pandas.DataFrame): Daten mit fehlenden Werten.
+
+        Returns:
+            pandas.DataFrame: Nach Gruppe und Zeit sortierte Daten mit imputierten Werten.
+        """
+        group_by = self.group_by
+
+        # Zeitstempelspalte identifizieren und einmalig sortieren
+        time_cols = [col for col in data.columns if pd.api.types.is_datetime64_any_dtype(data[col])]
+        time_col = time_cols[0] if time_cols else None
+        if time_col is not None:
+            result = data.sort_values(by=group_by + [time_col], kind='stable')
+        else:
+            result = data.copy()
+
+        # Numerische Spalten identifizieren
+        numeric_cols = result.select_dtypes(include=['number']).columns.tolist()
+        numeric_cols = [col for col in numeric_cols if col not in group_by and col not in time_cols]
+        if not numeric_cols:
+            return result
+
+        values = result[numeric_cols]
+
+        if self.method in ('locf', 'nocb') and time_col is not None and self._bounded(numeric_cols):
+            # Übertragung mit maximaler Dauer
+            filled = self._carry(result, numeric_cols, time_col, backward=self.method == 'nocb')
+
+        elif self.method == 'locf':  # Last Observation Carried Forward
+            filled = self._grouped(result, numeric_cols).ffill()
+
+        elif self.method == 'nocb':  # Next Observation Carried Backward
+            filled = self._grouped(result, numeric_cols).bfill()
+
+        elif self.method in ('mean', 'median'):  # Mittelwert / Median
+            if group_by:
+                fill_values = self._grouped(result, numeric_cols).transform(self.method)
+            else:
+                fill_values = getattr(values, self.method)()
+            filled = values.fillna(fill_values)
+
+        elif self.method == 'zero':  # Nullen
+            filled = values.fillna(0)
+
+        elif self.method == 'constant':  # Konstanter Wert
+            filled = values.fillna(self.constant_value)
+
+        elif self.method == 'last':  # Letzter verfügbarer Wert
+            filled = self._last_value(result, numeric_cols, time_col)
+
+        else:
+            return result
+
+        result[numeric_cols] = filled
+        return result
+
+    def _grouped(self, frame, columns):
+        """
+        Gruppiert die Wertespalten nach den Gruppierungsspalten.
+
+        Ohne Gruppierung werden die Spalten selbst zurückgegeben, sodass
+        ffill/bfill über alle Zeilen laufen.
+        """
+        if not self.group_by:
+            return frame[columns]
+        return frame.groupby(self.group_by)[columns]
+
+    def _bounded(self, columns):
+        """
+        Prüft, ob für eine der Spalten eine maximale Übertragungsdauer gilt.
+        """
+        return any(self.column_max_age.get(col, self.max_age) is not None for col in columns)
+
+    def _carry(self, frame, columns, time_col, backward=False):
+        """
+        LOCF (bzw. NOCB) mit maximaler Übertragungsdauer je Spalte.
+
+        Statt der Werte wird für jede Zelle die Zeilenposition der letzten
+        (bzw. nächsten) echten Messung per kumulativem Maximum (Minimum) über
+        alle Spalten gleichzeitig fortgeschrieben. Eine Position ist gültig,
+        wenn sie in derselben Gruppe liegt und der Abstand der Zeitstempel
+        höchstens max_age beträgt; die Werte werden anschließend über diese
+        Positionen übernommen. Ohne max_age entspricht das Ergebnis ffill/bfill
+        je Gruppe. Zeilen ohne Zeitstempel werden in begrenzten Spalten weder
+        gefüllt noch zum Füllen verwendet.
+
+        Args:
+            frame (pandas.DataFrame): Nach Gruppe und Zeit sortierte Daten.
+            columns (list): Zu füllende Spalten.
+            time_col (str): Zeitstempelspalte.
+            backward (bool, optional): NOCB statt LOCF.
+
+        Returns:
+            pandas.DataFrame: Gefüllte Spalten.
+        """
+        n = len(frame)
+        rows = np.arange(n)
+        # Spaltenweise zusammenhängend (Spalten x Zeilen)
+        observed = frame[columns].notna().to_numpy().T.copy()
+
+        # Gruppengrenzen (Daten sind nach Gruppe sortiert); Zeilen ohne Gruppenschlüssel bilden je eine eigene Gruppe
+        changed = np.zeros(n, dtype=bool)
+        changed[:1] = True
+        for col in self.group_by:
+            keys = frame[col].to_numpy()
+            changed[1:] |= keys[1:] != keys[:-1]
+
+        if backward:
+            last_row = np.append(changed[1:], True)
+            bound = np.minimum.accumulate(np.where(last_row, rows, n)[::-1])[::-1]
+            source = np.minimum.accumulate(np.where(observed, rows, n)[:, ::-1], axis=1)[:, ::-1]
+            valid = source <= bound
+        else:
+            bound = np.maximum.accumulate(np.where(changed, rows, 0))
+            source = np.maximum.accumulate(np.where(observed, rows, -1), axis=1)
+            valid = source >= bound
+
+        times = frame[time_col].to_numpy(dtype='datetime64[ns]')
+        missing_time = np.isnat(times)
+        times = times.view('int64')
+
+        filled = {}
+        for i, col in enumerate(columns):
+            col_source = source[i]
+            col_valid = valid[i]
+            clipped = np.clip(col_source, 0, n - 1)
+            max_age = self.column_max_age.get(col, self.max_age)
+            if max_age is not None:
+                age = np.abs(times - times[clipped])
+                col_valid = col_valid & (age <= max_age.value) & ~missing_time & ~missing_time[clipped]
+            # Echte Messungen bleiben immer erhalten
+            keep = col_valid | observed[i]
+            series = frame[col]
+            if series.dtype.kind == 'f' and isinstance(series.dtype, np.dtype):
+                values = series.to_numpy()[clipped]
+                values[~keep] = np.nan
+            else:
+                values = pd.api.extensions.take(series.array, np.where(keep, col_source, -1), allow_fill=True)
+            filled[col] = pd.Series(values, index=frame.index, name=col)
+
+        return pd.DataFrame(filled, index=frame.index)
+
+    def _last_value(self, frame, columns, time_col):
+        """
+        Füllt jede Lücke mit dem letzten Messwert, dessen Zeitstempel nicht nach
+        dem Zeitstempel der Zeile liegt.
+
+        Entspricht einer LOCF innerhalb jeder Gruppe; bei mehreren Zeilen mit
+        identischem Zeitstempel zählen auch Werte aus den Nachbarzeilen desselben
+        Zeitpunkts. Haben mehrere dieser Zeilen einen Wert, gilt der in der
+        Reihenfolge der Eingabe letzte (die Sortierung ist stabil). Die frühere
+        zeilenweise Implementierung wählte hier abhängig von einer instabilen
+        Sortierung einen beliebigen dieser Werte. Zeilen ohne Zeitstempel
+        werden nicht imputiert.
+        """
+        values = frame[columns]
+        if not self.group_by:
+            return values.ffill()
+
+        if time_col is None:
+            return values
+
+        filled = frame.groupby(self.group_by)[columns].ffill()
+
+        # Werte anderer Zeilen mit identischem Zeitstempel haben Vorrang vor älteren Messungen
+        if frame.duplicated(subset=self.group_by + [time_col]).any():
+            same_time = frame.groupby(self.group_by + [time_col])[columns].transform('last')
+            filled = values.fillna(same_time).fillna(filled)
+
+        missing_time = frame[time_col].isna().to_numpy()
+        if missing_time.any():
+            filled[missing_time] = values[missing_time]
+
+        return filled
+
+
+class MultiLevelImputation:
+    """
+    Mehrstufige Imputation je Konzept (first_level, second_level, third_level).
+
+    - first_level: Ableitungen aus anderen Konzepten, z.B. GCS_from_subscores
+      (Summe der drei Subscores) und Pao2_from_Spo2 (Severinghaus-Gleichung
+      nach Ellis, nur bis SpO2 97 %)
+    - second_level: Übertragung des letzten Werts ('forwarding', optional mit
+      max_age je Eintrag bzw. imputation.max_age)
+    - third_level: konstanter Normalwert je Konzept ('value')
+
+    Jede Stufe füllt nur Zellen, die nach den vorherigen Stufen noch fehlen,
+    und läuft vektorisiert über alle ihre Spalten (eine Sortierung, ein
+    Übertragungsdurchlauf, ein fillna). Für jede Zelle der konfigurierten
+    Spalten wird in provenance festgehalten, woher der Wert stammt:
+    0 = gemessen, 1-3 = Imputationsstufe, -1 = weiterhin fehlend.
+    """
+
+    MEASURED = 0
+    MISSING = -1
+
+    # Ableitungen der ersten Stufe und ihre Quellkonzepte
+    FIRST_LEVEL_METHODS = {
+        'GCS_from_subscores': GCS_SUBSCORE_CONCEPTS,
+        'Pao2_from_Spo2': (SPO2_CONCEPT,),
+    }
+
+    # Übertragungsmethoden der zweiten Stufe
+    SECOND_LEVEL_METHODS = {'forwarding': 'locf', 'locf': 'locf', 'backwarding': 'nocb', 'nocb': 'nocb'}
+
+    def __init__(self, imputation_config, group_by=None, concept_columns=None):
+        """
+        Initialisiert die mehrstufige Imputation.
+
+        Args:
+            imputation_config (dict): Abschnitt 'imputation' der Konfiguration.
+            group_by (list, optional): Spalten für die Gruppierung (z.B. ['subject_id']).
+            concept_columns (dict, optional): concept_id -> Spaltenname (siehe concept_ids).
+        """
+        self.first_level = imputation_config.get('first_level', []) or []
+        self.second_level = imputation_config.get('second_level', []) or []
+        self.third_level = imputation_config.get('third_level', []) or []
+        self.max_age = imputation_config.get('max_age')
+        self.group_by = list(group_by) if group_by else []
+        self.concept_columns = concept_columns or {}
+        self.provenance = None
+
+    @staticmethod
+    def configured(imputation_config):
+        """
+        Prüft, ob die Konfiguration Imputationsstufen enthält.
+        """
+        return any(imputation_config.get(level) for level in ('first_level', 'second_level', 'third_level'))
+
+    @property
+    def concept_ids(self):
+        """
+        concept_ids, deren Spaltennamen für die Imputation nachgeschlagen werden müssen.
+        """
+        concept_ids = set(entry_concept_ids(self.first_level + self.second_level + self.third_level))
+        for entry in self.first_level:
+            concept_ids.update(self.FIRST_LEVEL_METHODS.get(entry.get('method'), ()))
+        return sorted(concept_ids)
+
+    def impute(self, data):
+        """
+        Führt die Imputationsstufen nacheinander aus.
+
+        Args:
+            data (pandas.DataFrame): Daten im Wide-Format.
+
+        Returns:
+            pandas.DataFrame: Nach Gruppe und Zeit sortierte Daten mit imputierten Werten;
+                              die Herkunft je Zelle steht anschließend in self.provenance.
+        """
+        time_cols = [col for col in data.columns if pd.api.types.is_datetime64_any_dtype(data[col])]
+        time_col = time_cols[0] if time_cols else None
+        if time_col is not None:
+            result = data.sort_values(by=self.group_by + [time_col], kind='stable')
+        else:
+            result = data.copy()
+
+        provenance = {}
+
+        def track(columns):
+            for col in columns:
+                if col not in provenance:
+                    provenance[col] = np.where(result[col].notna().to_numpy(), self.MEASURED, self.MISSING).astype('int8')
+            return {col: result[col].isna().to_numpy() for col in columns}
+
+        def record(missing, level):
+            for col, was_missing in missing.items():
+                provenance[col][was_missing & result[col].notna().to_numpy()] = level
+
+        # Stufe 1: Ableitungen aus anderen Konzepten
+        derived = {}
+        for entry in self.first_level:
+            column = self._column(entry, result.columns)
+            values = self._derive(entry, result)
+            if column is None or values is None:
+                continue
+            if column not in result.columns:
+                result[column] = np.nan
+            derived[column] = values
+        if derived:
+            missing = track(derived)
+            for col, values in derived.items():
+                result[col] = result[col].fillna(pd.Series(values, index=result.index))
+            record(missing, 1)
+
+        # Stufe 2: Übertragung je Gruppe (ein Durchlauf je Richtung)
+        modes = {}
+        for column, entry in entry_columns(self.second_level, result.columns, self.concept_columns):
+            mode = self.SECOND_LEVEL_METHODS.get(entry.get('method', 'forwarding'))
+            if mode is None:
+                logger.warning(f"Unbekannte Imputationsmethode {entry.get('method')} für {column}")
+                continue
+            modes.setdefault(mode, {})[column] = entry.get('max_age', self.max_age)
+        for mode, columns in modes.items():
+            missing = track(columns)
+            engine = ImputationEngine(method=mode, group_by=self.group_by, max_age=self.max_age, column_max_age=columns)
+            subset = [col for col in self.group_by + ([time_col] if time_col else []) if col in result.columns]
+            filled = engine.impute(result[subset + list(columns)])
+            result[list(columns)] = filled[list(columns)]
+            record(missing, 2)
+
+        # Stufe 3: Konstante Normalwerte
+        constants = {column: entry['value']
+                     for column, entry in entry_columns(self.third_level, result.columns, self.concept_columns)
+                     if entry.get('value') is not None}
+        if constants:
+            missing = track(constants)
+            result = result.fillna(constants)
+            record(missing, 3)
+
+        self.provenance = pd.DataFrame(provenance, index=result.index)
+        return result
+
+    def _column(self, entry, columns):
+        """
+        Spaltenname des Zielkonzepts eines Eintrags (auch wenn die Spalte noch nicht existiert).
+        """
+        matches = entry_columns([entry], columns, self.concept_columns)
+        if matches:
+            return matches[0][0]
+        column = entry.get('column') or entry.get('concept_name')
+        if column is None and 'concept_id' in entry:
+            column = self.concept_columns.get(int(entry['concept_id']))
+        if column is None:
+            logger.debug(f"Zielspalte für {entry} nicht gefunden")
+        return column
+
+    def _derive(self, entry, data):
+        """
+        Berechnet die Werte einer Ableitung der ersten Stufe.
+
+        Returns:
+            numpy.ndarray or None: Abgeleitete Werte oder None, wenn Quellspalten fehlen.
+        """
+        method = entry.get('method')
+        if method not in self.FIRST_LEVEL_METHODS:
+            logger.warning(f"Unbekannte Ableitung {method}")
+            return None
+
+        sources = []
+        for concept_id in self.FIRST_LEVEL_METHODS[method]:
+            matches = entry_columns([{'concept_id': concept_id}], data.columns, self.concept_columns)
+            if not matches:
+                logger.debug(f"Quellkonzept {concept_id} für {method} nicht in den Daten")
+                return None
+            sources.append(data[matches[0][0]].to_numpy(dtype='float64', na_value=np.nan))
+
+        if method == 'GCS_from_subscores':
+            return sources[0] + sources[1] + sources[2]
+        return _pao2_from_spo2(sources[0])
+
+
+def _timedelta(value):
+    """
+    Wandelt eine Dauer (z.B. '24h') in pandas.Timedelta um; None bleibt None.
+    """
+    if value is None:
+        return None
+    return pd.Timedelta(pd.tseries.frequencies.to_offset(value)) if isinstance(value, str) else pd.Timedelta(value)
+
+
+def _pao2_from_spo2(spo2):
+    """
+    Schätzt PaO2 (mmHg) aus SpO2 (%) mit der invertierten Severinghaus-Gleichung (Ellis).
+
+    Oberhalb von SPO2_MAX_FOR_PAO2 ist die Schätzung unzuverlässig und ergibt NaN.
+    """
+    saturation = np.where((spo2 > 0) & (spo2 <= SPO2_MAX_FOR_PAO2), spo2, np.nan) / 100
+    a = 11700 / (1 / saturation - 1)
+    b = np.sqrt(50 ** 3 + a ** 2)
+    return np.cbrt(b + a) - np.cbrt(b - a)
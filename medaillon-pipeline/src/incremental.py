@@ -0,0 +1,172 @@
+import pandas as pd
+
+
+class WatermarkStore:
+    """
+    Verwaltet die Hochwassermarken (Watermarks) für inkrementelle Gold-Läufe.
+
+    Für jede Ausgabetabelle und jeden Patienten wird die höchste bereits
+    verarbeitete Zeilen-ID der Eingabetabelle sowie der späteste charttime
+    gespeichert. Patienten mit neueren Zeilen in der Silver-Tabelle gelten als
+    geändert und werden beim nächsten Lauf neu berechnet.
+
+    Zusätzlich wird je Ausgabetabelle die höchste ID gespeichert, bis zu der ein
+    Lauf vollständig abgeschlossen wurde (Tabelle '<table>_runs'). Nur Zeilen
+    oberhalb dieser Marke werden mit den Watermarks der Patienten verglichen,
+    sodass ein Lauf ohne neue Daten nur einen Indexzugriff auf die ID benötigt
+    statt die gesamte Eingabetabelle zu lesen.
+    """
+
+    def __init__(self, db_connection, schema, table='pipeline_watermarks'):
+        """
+        Initialisiert den Watermark-Speicher.
+
+        Args:
+            db_connection (DatabaseConnection): Datenbankverbindungsobjekt.
+            schema (str): Schema der Metadatentabelle (üblicherweise das Gold-Schema).
+            table (str, optional): Name der Metadatentabelle.
+        """
+        self.db = db_connection
+        self.schema = schema
+        self.table = table
+
+    @property
+    def qualified_name(self):
+        """Vollständiger Name der Metadatentabelle."""
+        return f"{self.schema}.{self.table}"
+
+    @property
+    def runs_name(self):
+        """Vollständiger Name der Tabelle der abgeschlossenen Läufe."""
+        return f"{self.schema}.{self.table}_runs"
+
+    def ensure_table(self):
+        """
+        Erstellt die Metadatentabelle, falls sie noch nicht existiert.
+        """
+        self.db.execute_statement(f"""
+        CREATE TABLE IF NOT EXISTS {self.qualified_name} (
+            output_table VARCHAR(255) NOT NULL,
+            subject_id INTEGER NOT NULL,
+            max_id BIGINT NOT NULL,
+            max_charttime TIMESTAMP,
+            updated_at TIMESTAMP NOT NULL DEFAULT now(),
+            PRIMARY KEY (output_table, subject_id)
+        )
+        """)
+        self.db.execute_statement(f"""
+        CREATE TABLE IF NOT EXISTS {self.runs_name} (
+            output_table VARCHAR(255) PRIMARY KEY,
+            max_id BIGINT NOT NULL,
+            updated_at TIMESTAMP NOT NULL DEFAULT now()
+        )
+        """)
+
+    def changed_subjects(self, output_table, source, id_col='id', time_col='charttime'):
+        """
+        Ermittelt Patienten mit Zeilen, die nach dem letzten Lauf hinzugekommen sind.
+
+        Args:
+            output_table (str): Name der Gold-Tabelle, für die die Watermarks gelten.
+            source (str): Vollständiger Name der Eingabetabelle (schema.table).
+            id_col (str, optional): Monoton steigende Zeilen-ID der Eingabetabelle.
+            time_col (str, optional): Zeitstempelspalte der Eingabetabelle.
+
+        Returns:
+            pandas.DataFrame: Spalten subject_id, max_id und max_charttime je geändertem Patienten.
+        """
+        query = f"""
+        SELECT s.subject_id, MAX(s.{id_col}) AS max_id, MAX(s.{time_col}) AS max_charttime
+        FROM {source} s
+        LEFT JOIN {self.qualified_name} w
+            ON w.output_table = :output_table
+            AND w.subject_id = s.subject_id
+        WHERE s.{id_col} > :completed
+        AND (w.max_id IS NULL OR s.{id_col} > w.max_id)
+        GROUP BY s.subject_id
+        ORDER BY s.subject_id
+        """
+        return self.db.execute_query(query, params={'output_table': output_table,
+                                                    'completed': self.completed(output_table)})
+
+    def completed(self, output_table):
+        """
+        Gibt die höchste ID zurück, bis zu der ein Lauf vollständig abgeschlossen wurde.
+
+        Args:
+            output_table (str): Name der Gold-Tabelle.
+
+        Returns:
+            int: Höchste verarbeitete ID (-1, wenn noch kein Lauf abgeschlossen wurde).
+        """
+        result = self.db.execute_query(
+            f"SELECT max_id FROM {self.runs_name} WHERE output_table = :output_table",
+            params={'output_table': output_table}
+        )
+        return int(result['max_id'].iloc[0]) if len(result) else -1
+
+    def complete(self, output_table, marks):
+        """
+        Markiert einen Lauf als abgeschlossen: Alle Zeilen bis zur höchsten ID in marks sind verarbeitet.
+
+        Darf erst aufgerufen werden, wenn alle Patienten aus changed_subjects geschrieben
+        wurden; nach einem Abbruch bleibt die bisherige Marke erhalten.
+
+        Args:
+            output_table (str): Name der Gold-Tabelle.
+            marks (pandas.DataFrame): Ergebnis von changed_subjects für den gesamten Lauf.
+        """
+        if marks.empty:
+            return
+
+        self.db.execute_statement(f"""
+        INSERT INTO {self.runs_name} (output_table, max_id, updated_at)
+        VALUES (:output_table, :max_id, now())
+        ON CONFLICT (output_table) DO UPDATE
+        SET
+            max_id = GREATEST({self.table}_runs.max_id, EXCLUDED.max_id),
+            updated_at = EXCLUDED.updated_at
+        """, {'output_table': output_table, 'max_id': int(marks['max_id'].max())})
+
+    def update(self, output_table, marks):
+        """
+        Speichert neue Watermarks für die übergebenen Patienten.
+
+        Args:
+            output_table (str): Name der Gold-Tabelle.
+            marks (pandas.DataFrame): Ergebnis von changed_subjects für die verarbeiteten Patienten.
+        """
+        if marks.empty:
+            return
+
+        rows = [
+            {
+                'output_table': output_table,
+                'subject_id': int(row.subject_id),
+                'max_id': int(row.max_id),
+                'max_charttime': None if pd.isna(row.max_charttime) else row.max_charttime,
+            }
+            for row in marks.itertuples(index=False)
+        ]
+        self.db.execute_statement(f"""
+        INSERT INTO {self.qualified_name} (output_table, subject_id, max_id, max_charttime, updated_at)
+        VALUES (:output_table, :subject_id, :max_id, :max_charttime, now())
+        ON CONFLICT (output_table, subject_id) DO UPDATE
+        SET
+            max_id = GREATEST({self.table}.max_id, EXCLUDED.max_id),
+            max_charttime = GREATEST({self.table}.max_charttime, EXCLUDED.max_charttime),
+            updated_at = EXCLUDED.updated_at
+        """, rows)
+
+    def reset(self, output_table):
+        """
+        Entfernt alle Watermarks einer Gold-Tabelle (z.B. vor einem vollständigen Neuaufbau).
+
+        Args:
+            output_table (str): Name der Gold-Tabelle.
+        """
+        for name in (self.qualified_name, self.runs_name):
+            self.db.execute_statement(
+                f"DELETE FROM {name} WHERE output_table = :output_table",
+                {'output_table': output_table}
+            )
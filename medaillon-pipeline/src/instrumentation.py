@@ -0,0 +1,298 @@
+import functools
+import json
+import logging
+import sys
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+import pandas as pd
+
+try:
+    import resource
+except ImportError:  # nicht verfügbar unter Windows
+    resource = None
+
+
+logger = logging.getLogger(__name__)
+
+# Bericht des aktuell laufenden Pipeline-Laufs (None außerhalb eines Laufs)
+_active_report = ContextVar('run_report', default=None)
+
+# False innerhalb von disabled(): Schritte und Abfragen werden weder gemessen noch protokolliert
+_enabled = ContextVar('instrumentation_enabled', default=True)
+
+
+class RunReport:
+    """
+    Bericht eines Pipeline-Laufs.
+
+    Für jeden Pipeline-Schritt und jede Datenbankabfrage wird ein Eintrag mit
+    Laufzeit (Wall- und CPU-Zeit), Zeilen und Spalten vor und nach dem Schritt,
+    Spitzenwert des Arbeitsspeichers (RSS) und übertragenen Bytes gespeichert.
+    """
+
+    def __init__(self, name):
+        """
+        Initialisiert den Bericht.
+
+        Args:
+            name (str): Name des Laufs (z.B. 'run_pipeline').
+        """
+        self.name = name
+        self.started_at = datetime.now()
+        self.stages = []
+        self._start = time.perf_counter()
+        self._cpu_start = time.process_time()
+        self.wall_time = None
+        self.cpu_time = None
+
+    def add(self, record):
+        """Fügt einen Eintrag hinzu."""
+        self.stages.append(record)
+
+    def finish(self):
+        """Schließt den Bericht ab und setzt die Gesamtlaufzeit."""
+        self.wall_time = time.perf_counter() - self._start
+        self.cpu_time = time.process_time() - self._cpu_start
+
+    def to_dict(self):
+        """
+        Gibt den Bericht als dict zurück.
+
+        Returns:
+            dict: Laufdaten und Liste der Einträge.
+        """
+        return {
+            'name': self.name,
+            'started_at': self.started_at.isoformat(),
+            'wall_time_s': self.wall_time,
+            'cpu_time_s': self.cpu_time,
+            'peak_rss_mb': peak_rss_mb(),
+            'stages': self.stages,
+        }
+
+    def to_json(self, path=None):
+        """
+        Serialisiert den Bericht als JSON.
+
+        Args:
+            path (str, optional): Wenn angegeben, wird der Bericht zusätzlich in diese Datei geschrieben.
+
+        Returns:
+            str: Bericht als JSON.
+        """
+        report = json.dumps(self.to_dict(), indent=2, default=str)
+        if path is not None:
+            with open(path, 'w') as file:
+                file.write(report)
+        return report
+
+
+class _Measurement:
+    """
+    Messung eines einzelnen Schritts (siehe measure).
+    """
+
+    def __init__(self, kind, name, data=None):
+        self.record = {'kind': kind, 'name': name}
+        if isinstance(data, pd.DataFrame):
+            self.record['rows_in'], self.record['columns_in'] = data.shape
+        self._start = time.perf_counter()
+        self._cpu_start = time.process_time()
+
+    def output(self, data=None, rows=None, bytes_transferred=None):
+        """
+        Erfasst das Ergebnis des Schritts.
+
+        Args:
+            data (pandas.DataFrame, optional): Ergebnis des Schritts.
+            rows (int, optional): Anzahl der Zeilen, falls kein DataFrame vorliegt.
+            bytes_transferred (int, optional): Übertragene Bytes (z.B. beim Schreiben per COPY).
+        """
+        if isinstance(data, pd.DataFrame):
+            self.record['rows_out'], self.record['columns_out'] = data.shape
+            self.record['bytes_out'] = int(data.memory_usage(index=True, deep=False).sum())
+        elif rows is not None:
+            self.record['rows_out'] = rows
+        if bytes_transferred is not None:
+            self.record['bytes_transferred'] = bytes_transferred
+
+    def finish(self, error=None):
+        self.record['wall_time_s'] = time.perf_counter() - self._start
+        self.record['cpu_time_s'] = time.process_time() - self._cpu_start
+        self.record['peak_rss_mb'] = peak_rss_mb()
+        if error is not None:
+            self.record['error'] = repr(error)
+
+
+@contextmanager
+def measure(kind, name, data=None):
+    """
+    Misst einen Schritt und trägt ihn in den Bericht des laufenden Laufs ein.
+
+    Außerhalb eines Laufs wird nur protokolliert.
+
+    Args:
+        kind (str): Art des Schritts ('stage', 'query', 'write').
+        name (str): Name des Schritts.
+        data (pandas.DataFrame, optional): Eingabedaten des Schritts.
+
+    Yields:
+        _Measurement: Messung; das Ergebnis wird über output() erfasst.
+    """
+    if not _enabled.get():
+        yield _NO_MEASUREMENT
+        return
+
+    measurement = _Measurement(kind, name, data)
+    try:
+        yield measurement
+    except Exception as e:
+        measurement.finish(error=e)
+        _record(measurement.record)
+        raise
+    measurement.finish()
+    _record(measurement.record)
+
+
+class _NoMeasurement:
+    """
+    Platzhalter für Messungen innerhalb von disabled().
+    """
+
+    def output(self, data=None, rows=None, bytes_transferred=None):
+        pass
+
+
+_NO_MEASUREMENT = _NoMeasurement()
+
+
+@contextmanager
+def disabled():
+    """
+    Schaltet Messung und Protokollierung aller Schritte und Abfragen ab,
+    z.B. für latenzkritische Einzelabfragen (siehe SubjectScorer).
+    """
+    token = _enabled.set(False)
+    try:
+        yield
+    finally:
+        _enabled.reset(token)
+
+
+def _record(record):
+    """
+    Trägt einen Eintrag in den laufenden Bericht ein und protokolliert ihn.
+    """
+    report = _active_report.get()
+    if report is not None:
+        report.add(record)
+
+    if logger.isEnabledFor(logging.INFO):
+        rows = ''
+        if 'rows_in' in record or 'rows_out' in record:
+            rows = f", Zeilen {record.get('rows_in', '-')} -> {record.get('rows_out', '-')}"
+        logger.info(f"{record['kind']} {record['name']}: {record['wall_time_s']:.3f}s{rows}")
+
+
+def stage(name=None):
+    """
+    Dekorator, der einen Pipeline-Schritt misst.
+
+    Ist das erste Argument ein DataFrame, werden Zeilen und Spalten der
+    Eingabe erfasst; ist das Ergebnis ein DataFrame, die der Ausgabe.
+
+    Args:
+        name (str, optional): Name im Bericht. Standard: Name der Methode.
+    """
+    def decorator(method):
+        stage_name = name or method.__name__
+
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            if not _enabled.get():
+                return method(self, *args, **kwargs)
+            data = args[0] if args else kwargs.get('data')
+            with measure('stage', stage_name, data) as measurement:
+                result = method(self, *args, **kwargs)
+                measurement.output(result if isinstance(result, pd.DataFrame) else None,
+                                   rows=result if isinstance(result, int) else None)
+            return result
+
+        return wrapper
+    return decorator
+
+
+def run(name=None):
+    """
+    Dekorator für Einstiegspunkte der Pipeline (run_pipeline, ...).
+
+    Startet einen neuen RunReport, sofern nicht bereits ein Lauf aktiv ist,
+    und speichert ihn nach Abschluss in self.last_report. Innerhalb eines
+    laufenden Laufs wird der Aufruf wie ein Schritt gemessen.
+
+    Args:
+        name (str, optional): Name des Laufs. Standard: Name der Methode.
+    """
+    def decorator(method):
+        run_name = name or method.__name__
+        measured = stage(run_name)(method)
+
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            if _active_report.get() is not None:
+                return measured(self, *args, **kwargs)
+
+            report = RunReport(run_name)
+            token = _active_report.set(report)
+            try:
+                return measured(self, *args, **kwargs)
+            finally:
+                _active_report.reset(token)
+                report.finish()
+                self.last_report = report
+                logger.info(f"Lauf {run_name} abgeschlossen: {report.wall_time:.3f}s, "
+                            f"Spitzen-RSS {report.to_dict()['peak_rss_mb']} MB")
+
+                report_path = self.config.get('instrumentation', {}).get('report_path')
+                if report_path:
+                    report.to_json(report_path)
+
+        return wrapper
+    return decorator
+
+
+def peak_rss_mb():
+    """
+    Spitzenwert des Arbeitsspeichers (RSS) des Prozesses in MB.
+
+    Returns:
+        float or None: Spitzen-RSS oder None, wenn nicht ermittelbar.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux liefert KB, macOS Bytes
+    if sys.platform == 'darwin':
+        return round(peak / 1024 / 1024, 1)
+    return round(peak / 1024, 1)
+
+
+def configure_logging(config):
+    """
+    Konfiguriert das Logging der Pipeline-Module aus dem Abschnitt 'logging'.
+
+    Ohne eigenen Handler erhalten die Pipeline-Logger einen Handler auf der
+    Konsole, damit Meldungen wie bisher sichtbar sind.
+
+    Args:
+        config (dict): Abschnitt 'logging' der Konfiguration, z.B. {'level': 'INFO'}.
+    """
+    package_logger = logging.getLogger(__package__)
+    package_logger.setLevel(str(config.get('level', 'INFO')).upper())
+
+    if not package_logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter(config.get('format', '%(asctime)s %(levelname)s %(name)s: %(message)s')))
+        package_logger.addHandler(handler)
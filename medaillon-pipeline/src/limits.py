@@ -0,0 +1,173 @@
+import logging
+import numpy as np
+import pandas as pd
+from .writer import _quote
+
+
+logger = logging.getLogger(__name__)
+
+
+class PhysiologicalLimits:
+    """
+    Physiologische Grenzen je Konzept (Abschnitt 'outlier_handling').
+
+    Die Grenzen stammen aus der Tabelle physiological_limits des Silver-Schemas
+    (min_value, max_value) und den Einträgen outlier_handling.outliers
+    (valid_low, valid_high), wobei die Konfiguration Vorrang hat. Die Tabelle
+    wird nur einmal geladen.
+
+    Die Grenzen werden auf Daten im Long-Format vor dem Pivot angewendet: Jede
+    Zeile erhält über einen Join auf concept_id ihre Unter- und Obergrenze,
+    anschließend werden alle Werte in einem Vergleich geprüft. Je nach action
+    werden Werte außerhalb der Grenzen entfernt ('remove') oder auf die Grenze
+    gesetzt ('clip').
+    """
+
+    ACTIONS = ('remove', 'clip')
+
+    def __init__(self, outlier_config, load_table=None):
+        """
+        Initialisiert die Grenzen.
+
+        Args:
+            outlier_config (dict): Abschnitt 'outlier_handling' der Konfiguration.
+            load_table (callable, optional): Lädt die Grenztabelle als DataFrame
+                                             (concept_id, min_value, max_value).
+        """
+        self.action = outlier_config.get('action', 'remove')
+        if self.action not in self.ACTIONS:
+            raise ValueError(f"Ungültige Aktion für outlier_handling: {self.action}")
+
+        self.config_limits = outlier_config.get('outliers', []) or []
+        self.load_table = load_table if outlier_config.get('use_limits_table', True) else None
+        self._limits = None
+        self.last_report = None
+
+    @property
+    def limits(self):
+        """
+        Grenzen je concept_id.
+
+        Returns:
+            pandas.DataFrame: Index concept_id, Spalten 'low' und 'high' (NaN = keine Grenze).
+        """
+        if self._limits is None:
+            self._limits = self._build_limits()
+        return self._limits
+
+    def _build_limits(self):
+        """
+        Führt Grenztabelle und Konfiguration zusammen.
+        """
+        limits = pd.DataFrame({'low': pd.Series(dtype='float64'), 'high': pd.Series(dtype='float64')})
+        limits.index.name = 'concept_id'
+
+        if self.load_table is not None:
+            try:
+                table = self.load_table()
+            except Exception as e:
+                logger.warning(f"Tabelle der physiologischen Grenzen nicht lesbar, nur Konfiguration wird verwendet: {e}")
+            else:
+                limits = pd.DataFrame({
+                    'low': pd.to_numeric(table['min_value'], errors='coerce').to_numpy(dtype='float64'),
+                    'high': pd.to_numeric(table['max_value'], errors='coerce').to_numpy(dtype='float64'),
+                }, index=pd.Index(table['concept_id'].astype('int64'), name='concept_id'))
+
+        if self.config_limits:
+            configured = pd.DataFrame({
+                'low': [entry.get('valid_low', np.nan) for entry in self.config_limits],
+                'high': [entry.get('valid_high', np.nan) for entry in self.config_limits],
+            }, index=pd.Index([int(entry['concept_id']) for entry in self.config_limits], name='concept_id'),
+                dtype='float64')
+            limits = pd.concat([limits[~limits.index.isin(configured.index)], configured])
+
+        return limits[~limits.index.duplicated(keep='last')]
+
+    def apply(self, data, concept_col='concept_id', value_col='value'):
+        """
+        Wendet die Grenzen auf Daten im Long-Format an.
+
+        Args:
+            data (pandas.DataFrame): Daten im Long-Format mit concept_id und Wert.
+            concept_col (str, optional): Spalte mit der concept_id.
+            value_col (str, optional): Spalte mit dem Messwert.
+
+        Returns:
+            pandas.DataFrame: Daten ohne (bzw. mit begrenzten) Werte(n) außerhalb der Grenzen;
+                              die Anzahl je Konzept steht in self.last_report.
+        """
+        limits = self.limits
+        if concept_col not in data.columns or limits.empty:
+            if concept_col not in data.columns:
+                logger.warning(f"Spalte {concept_col} fehlt, Grenzen werden nicht angewendet")
+            return data
+
+        # Join auf concept_id: Position des Konzepts in der Grenztabelle (-1 = keine Grenzen)
+        concept_ids = pd.to_numeric(data[concept_col], errors='coerce').to_numpy(dtype='float64', na_value=np.nan)
+        position = limits.index.get_indexer(concept_ids)
+        known = position >= 0
+        low = np.where(known, limits['low'].to_numpy()[position], np.nan)
+        high = np.where(known, limits['high'].to_numpy()[position], np.nan)
+
+        values = data[value_col]
+        numeric = pd.to_numeric(values, errors='coerce').to_numpy(dtype='float64', na_value=np.nan)
+        below = numeric < low
+        above = numeric > high
+        rejected = below | above
+
+        self.last_report = self._report(concept_ids[rejected], below[rejected])
+        if self.last_report is not None:
+            action = 'entfernt' if self.action == 'remove' else 'begrenzt'
+            logger.info(f"{int(rejected.sum())} Werte außerhalb der physiologischen Grenzen {action}: "
+                        f"{self.last_report['rejected'].to_dict()}")
+
+        if not rejected.any():
+            return data
+
+        if self.action == 'remove':
+            return data[~rejected].reset_index(drop=True)
+
+        clipped = np.where(below, low, np.where(above, high, numeric))
+        if isinstance(values.dtype, np.dtype) and values.dtype.kind == 'f':
+            clipped = clipped.astype(values.dtype)
+        return data.assign(**{value_col: clipped})
+
+    def sql_condition(self, concept_col='concept_id', value_col='value', prefix='limit'):
+        """
+        Erzeugt die Grenzen als SQL für den Pushdown (siehe SqlPushdown).
+
+        Returns:
+            tuple: (Ausdruck für den Wert, Bedingung für die Zeilen oder None, gebundene Parameter).
+        """
+        limits = self.limits
+        value = f"{_quote(value_col)}::double precision"
+        if limits.empty:
+            return value, None, {}
+
+        params = {
+            f'{prefix}_ids': limits.index.astype(int).tolist(),
+            f'{prefix}_low': [None if np.isnan(value) else float(value) for value in limits['low']],
+            f'{prefix}_high': [None if np.isnan(value) else float(value) for value in limits['high']],
+        }
+        # Grenzen je Zeile über die Position der concept_id in der Parameterliste
+        position = f"array_position(CAST(:{prefix}_ids AS integer[]), {_quote(concept_col)})"
+        low = f"(CAST(:{prefix}_low AS double precision[]))[{position}]"
+        high = f"(CAST(:{prefix}_high AS double precision[]))[{position}]"
+
+        if self.action == 'clip':
+            return f"LEAST(GREATEST({value}, {low}), {high})", None, params
+        return value, f"({value} >= {low} OR {low} IS NULL) AND ({value} <= {high} OR {high} IS NULL)", params
+
+    def _report(self, concept_ids, below):
+        """
+        Zählt die Werte außerhalb der Grenzen je Konzept.
+
+        Returns:
+            pandas.DataFrame or None: Index concept_id, Spalten 'rejected', 'below', 'above'.
+        """
+        if len(concept_ids) == 0:
+            return None
+        report = pd.DataFrame({'concept_id': concept_ids.astype('int64'), 'below': below, 'above': ~below})
+        report = report.groupby('concept_id')[['below', 'above']].sum()
+        report.insert(0, 'rejected', report['below'] + report['above'])
+        return report
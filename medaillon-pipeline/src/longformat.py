@@ -0,0 +1,308 @@
+import logging
+import numpy as np
+import pandas as pd
+
+
+logger = logging.getLogger(__name__)
+
+
+class SparseGrid:
+    """
+    Zeitlich aggregierte Daten im Long-Format (performance.long_format).
+
+    Das Raster (keys) enthält je Zeile die ID-Spalten und das Zeitfenster,
+    sortiert nach IDs und Zeitfenster, und umfasst wie
+    aggregate_data(pivot_data(...)) alle Zeitfenster mit mindestens einer
+    Messung. Je Konzept werden nur die besetzten Zeilen als Paar
+    (Zeilenpositionen, Werte) gespeichert; die meist leeren Zellen des
+    Wide-Formats werden nie angelegt.
+
+    - aggregate(): Mittelwert je Zeitstempel (wie pivot_data), danach
+      Aggregation je Zeitfenster mit der Methode des Konzepts (wie
+      aggregate_data), beides als groupby über die Messungen.
+    - impute(): LOCF/NOCB mit maximaler Übertragungsdauer; je Messung wird der
+      Zeilenbereich bestimmt, den sie füllt, sodass der Aufwand nur von der
+      Zahl der Messungen und der gefüllten Zellen abhängt.
+    - to_wide(): Baut das Wide-Format einmal für das Ergebnis.
+
+    Gruppiert wird wie beim SQL-Pushdown nach den Indexspalten, deren Name
+    'id' enthält (z.B. subject_id), und dem Zeitfenster.
+    """
+
+    def __init__(self, keys, columns, id_cols, pivot_col=None):
+        """
+        Initialisiert das Raster.
+
+        Args:
+            keys (pandas.DataFrame): ID-Spalten und 'time_window' je Rasterzeile (sortiert).
+            columns (dict): Spaltenname -> (Zeilenpositionen, Werte), Zeilenpositionen aufsteigend.
+            id_cols (list): ID-Spalten des Rasters.
+            pivot_col (str, optional): Name der Pivot-Spalte (Name des Spaltenindex im Wide-Format).
+        """
+        self.keys = keys
+        self.columns = columns
+        self.id_cols = list(id_cols)
+        self.pivot_col = pivot_col
+
+    @property
+    def n_observations(self):
+        """
+        Anzahl der besetzten Zellen über alle Spalten.
+        """
+        return sum(len(rows) for rows, _ in self.columns.values())
+
+    @classmethod
+    def aggregate(cls, data, spec, index_cols, pivot_col='concept_name', value_col='value', concept_columns=None):
+        """
+        Pivotiert und aggregiert Daten im Long-Format, ohne das Wide-Format zu bilden.
+
+        Die Messungen werden einmal nach (IDs, Konzept, Zeitstempel) sortiert;
+        danach liegen sowohl die Messungen eines Zeitstempels als auch die
+        eines Zeitfensters je Konzept zusammenhängend und werden per
+        np.ufunc.reduceat reduziert. Mittelwerte und Summen können in der
+        letzten Stelle von der kompensierten Summation in pandas abweichen.
+
+        Args:
+            data (pandas.DataFrame): Daten im Long-Format.
+            spec (AggregationSpec): Zeitfenster und Methoden je Konzept.
+            index_cols (list): Indexspalten des Pivots (z.B. ['subject_id', 'charttime']).
+            pivot_col (str, optional): Spalte mit den Konzepten.
+            value_col (str, optional): Spalte mit den Messwerten.
+            concept_columns (dict, optional): concept_id -> Spaltenname für aggregate_functions.
+
+        Returns:
+            SparseGrid: Aggregierte Daten.
+        """
+        time_col = next((col for col in index_cols if pd.api.types.is_datetime64_any_dtype(data[col])), None)
+        if time_col is None:
+            time_col = next((col for col in ('charttime', 'time_window', 'timestamp') if col in index_cols), None)
+            if time_col is None:
+                raise ValueError("Keine Zeitstempelspalte gefunden.")
+            data = data.assign(**{time_col: pd.to_datetime(data[time_col])})
+        id_cols = [col for col in index_cols if col != time_col and col != 'concept_id' and 'id' in col.lower()]
+
+        # Wie pivot_table: Zeilen ohne Wert, Konzept oder Indexwert tragen nichts bei
+        values = pd.to_numeric(data[value_col], errors='coerce').to_numpy(dtype='float64', na_value=np.nan)
+        concept_codes, concepts = pd.factorize(data[pivot_col], sort=True)
+        keep = ~np.isnan(values) & (concept_codes >= 0)
+        for col in index_cols:
+            keep &= data[col].notna().to_numpy()
+        positions = np.flatnonzero(keep)
+        if not len(positions):
+            keys = data[id_cols].iloc[:0].reset_index(drop=True).assign(time_window=pd.Series(dtype='datetime64[ns]'))
+            return cls(keys, {}, id_cols, pivot_col)
+
+        values = values[positions]
+        times = data[time_col].iloc[positions]
+        windows = spec.windows(times).to_numpy(dtype='datetime64[ns]').view('int64')
+        times = times.to_numpy(dtype='datetime64[ns]').view('int64')
+        concept_codes = concept_codes[positions]
+        concepts = list(concepts)
+
+        # Fortlaufender Code je Kombination der ID-Spalten
+        entity, n_entities = np.zeros(len(positions), dtype='int64'), 1
+        for col in id_cols:
+            codes, uniques = pd.factorize(data[col].iloc[positions], sort=True)
+            entity, n_entities = entity * len(uniques) + codes, n_entities * len(uniques)
+            if len(id_cols) > 1:
+                entity, n_entities = _dense(entity)
+
+        time_codes, n_times = _dense(times)
+        order = _sort_order((entity, n_entities), (concept_codes, len(concepts)), (time_codes, n_times))
+        entity, concept_codes = entity[order], concept_codes[order]
+        times, windows, values, positions = times[order], windows[order], values[order], positions[order]
+
+        # Mittelwert je Zeitstempel und Konzept (pivot_data), Summe für Konzepte mit der Methode sum
+        methods = spec.methods(concepts, concept_columns)
+        starts = _run_starts(entity, concept_codes, times)
+        values = np.add.reduceat(values, starts)
+        summed = np.array([methods[concept] == 'sum' for concept in concepts], dtype=bool)[concept_codes[starts]]
+        values = np.where(summed, values, values / np.diff(np.append(starts, len(positions))))
+        entity, concept_codes = entity[starts], concept_codes[starts]
+        windows, positions = windows[starts], positions[starts]
+
+        # Aggregation je Zeitfenster mit der Methode des Konzepts (aggregate_data)
+        starts = _run_starts(entity, concept_codes, windows)
+        counts = np.diff(np.append(starts, len(values)))
+        method_names = list(dict.fromkeys(methods.values()))
+        group_methods = np.array([method_names.index(methods[concept]) for concept in concepts])[concept_codes[starts]]
+        aggregated = np.empty(len(starts))
+        for i, method in enumerate(method_names):
+            selected = group_methods == i
+            aggregated[selected] = _reduce(method, values, starts, counts)[selected]
+        entity, concept_codes = entity[starts], concept_codes[starts]
+        windows, positions = windows[starts], positions[starts]
+
+        # Rasterzeile je (IDs, Zeitfenster) und Spalte je Konzept
+        window_codes, n_windows = _dense(windows)
+        row_codes, n_rows = _dense(entity * n_windows + window_codes)
+        first = np.empty(n_rows, dtype='int64')
+        first[row_codes[::-1]] = np.arange(len(row_codes))[::-1]
+        # Innerhalb eines Konzepts sind die Zeilen bereits aufsteigend (Sortierung nach IDs, Zeitfenster)
+        order = np.argsort(concept_codes, kind='stable')
+        row_codes, concept_codes, aggregated = row_codes[order], concept_codes[order], aggregated[order]
+        bounds = np.searchsorted(concept_codes, np.arange(len(concepts) + 1))
+        columns = {concept: (row_codes[start:end], aggregated[start:end])
+                   for concept, start, end in zip(concepts, bounds[:-1], bounds[1:])}
+
+        keys = data[id_cols].iloc[positions[first]].reset_index(drop=True)
+        keys['time_window'] = windows[first].view('datetime64[ns]')
+
+        logger.debug(f"{len(order)} Werte zu {len(keys)} Zeitfenstern und {len(columns)} Konzepten aggregiert")
+        return cls(keys, columns, id_cols, pivot_col)
+
+    def impute(self, engine):
+        """
+        Überträgt Werte je Gruppe nach den Einstellungen einer ImputationEngine ('locf' oder 'nocb').
+
+        Entspricht ImputationEngine.impute auf dem Wide-Format, wenn nach den
+        ID-Spalten des Rasters gruppiert wird: Jede Messung füllt die folgenden
+        (bzw. vorangehenden) Zeilen ihrer Gruppe bis zur nächsten Messung des
+        Konzepts, höchstens aber max_age weit.
+
+        Args:
+            engine (ImputationEngine): Methode, max_age und column_max_age.
+
+        Returns:
+            SparseGrid: Raster mit gefüllten Spalten.
+        """
+        if engine.method not in ('locf', 'nocb'):
+            raise ValueError(f"Imputationsmethode {engine.method} wird im Long-Format nicht unterstützt")
+        backward = engine.method == 'nocb'
+
+        n = len(self.keys)
+        changed = np.zeros(n, dtype=bool)
+        changed[:1] = True
+        for col in self.id_cols:
+            keys = self.keys[col].to_numpy()
+            changed[1:] |= keys[1:] != keys[:-1]
+        group = np.cumsum(changed) - 1
+        group_start = np.flatnonzero(changed)[group]
+        group_end = np.append(np.flatnonzero(changed)[1:] - 1, n - 1)[group] if n else group_start
+
+        # Aufsteigender Schlüssel (Gruppe, Zeitfenster) für die Suche nach der maximalen Übertragungsdauer
+        times = self.keys['time_window'].to_numpy(dtype='datetime64[ns]').view('int64')
+        steps = np.diff(np.unique(times))
+        unit = int(np.gcd.reduce(steps)) if len(steps) else 1
+        offset = (times - times.min()) // unit if n else times
+        key = group * (int(offset.max()) + 1 if n else 1) + offset
+
+        columns = {}
+        for col, (observed, values) in self.columns.items():
+            max_age = engine.column_max_age.get(col, engine.max_age)
+            # Abstand in Vielfachen von unit; Zeitfenster liegen immer auf diesem Raster
+            max_steps = None if max_age is None else max_age.value // unit
+            if backward:
+                previous = np.append(-1, observed[:-1])
+                start = np.maximum(previous + 1, group_start[observed])
+                end = observed
+                if max_steps is not None:
+                    start = np.maximum(start, np.searchsorted(key, key[observed] - max_steps, side='left'))
+            else:
+                following = np.append(observed[1:], n)
+                start = observed
+                end = np.minimum(following - 1, group_end[observed])
+                if max_steps is not None:
+                    end = np.minimum(end, np.searchsorted(key, key[observed] + max_steps, side='right') - 1)
+            columns[col] = _expand(start, end, values)
+
+        logger.debug(f"{engine.method.upper()} im Long-Format: {self.n_observations} -> "
+                     f"{sum(len(rows) for rows, _ in columns.values())} besetzte Zellen")
+        return SparseGrid(self.keys, columns, self.id_cols, self.pivot_col)
+
+    def to_wide(self, columns=None):
+        """
+        Baut das Wide-Format (eine Spalte je Konzept, fehlende Zellen NaN).
+
+        Args:
+            columns (list, optional): Spalten in dieser Reihenfolge (fehlende Konzepte als leere
+                                      Spalten). Wenn None, alle Konzepte des Rasters.
+
+        Returns:
+            pandas.DataFrame: ID-Spalten, 'time_window' und eine Spalte je Konzept.
+        """
+        if columns is None:
+            columns = list(self.columns)
+        n = len(self.keys)
+        wide = {}
+        for col in columns:
+            values = np.full(n, np.nan)
+            if col in self.columns:
+                rows, column_values = self.columns[col]
+                values[rows] = column_values
+            wide[col] = values
+        result = pd.concat([self.keys, pd.DataFrame(wide, index=self.keys.index, columns=columns)], axis=1)
+        result.columns.name = self.pivot_col
+        return result
+
+
+def _expand(start, end, values):
+    """
+    Wiederholt jeden Wert über seinen Zeilenbereich [start, end].
+
+    Returns:
+        tuple: (Zeilenpositionen, Werte), nach Zeilenposition sortiert.
+    """
+    lengths = np.maximum(end - start + 1, 0)
+    total = int(lengths.sum())
+    rows = np.repeat(start - np.cumsum(lengths) + lengths, lengths) + np.arange(total)
+    return rows, np.repeat(values, lengths)
+
+
+def _dense(values):
+    """
+    Fortlaufende Codes (0..n-1) in sortierter Reihenfolge der Werte.
+
+    Returns:
+        tuple: (Codes, Anzahl verschiedener Werte).
+    """
+    codes, uniques = pd.factorize(values, sort=True)
+    return codes.astype('int64'), len(uniques)
+
+
+def _sort_order(*keys):
+    """
+    Stabile Sortierreihenfolge nach mehreren fortlaufenden Codes (erster Schlüssel zuerst).
+
+    Args:
+        *keys: Paare (Codes, Anzahl verschiedener Codes).
+
+    Returns:
+        numpy.ndarray: Sortierreihenfolge. Passen alle Codes zusammen in int64,
+                       wird nur ein kombinierter Schlüssel sortiert, sonst per np.lexsort.
+    """
+    if np.prod([float(max(size, 1)) for _, size in keys]) >= np.iinfo('int64').max:
+        return np.lexsort([codes for codes, _ in keys][::-1])
+    combined = np.zeros(len(keys[0][0]), dtype='int64')
+    for codes, size in keys:
+        combined = combined * max(size, 1) + codes
+    return np.argsort(combined, kind='stable')
+
+
+def _run_starts(*keys):
+    """
+    Anfangspositionen der Abschnitte gleicher Schlüssel in sortierten Arrays.
+    """
+    changed = np.zeros(len(keys[0]), dtype=bool)
+    changed[:1] = True
+    for key in keys:
+        changed[1:] |= key[1:] != key[:-1]
+    return np.flatnonzero(changed)
+
+
+def _reduce(method, values, starts, counts):
+    """
+    Reduziert zusammenhängende Abschnitte mit einer Aggregationsmethode (siehe aggregation.METHODS).
+    """
+    if method == 'mean':
+        return np.add.reduceat(values, starts) / counts
+    if method == 'sum':
+        return np.add.reduceat(values, starts)
+    if method == 'max':
+        return np.maximum.reduceat(values, starts)
+    if method == 'min':
+        return np.minimum.reduceat(values, starts)
+    # Median: Werte je Abschnitt sortieren, mittleres Element bzw. Mittel der beiden mittleren
+    group = np.repeat(np.arange(len(starts)), counts)
+    ordered = values[np.lexsort((values, group))]
+    return (ordered[starts + (counts - 1) // 2] + ordered[starts + counts // 2]) / 2
@@ -0,0 +1,327 @@
+import logging
+import numpy as np
+import pandas as pd
+from .aggregation import AggregationSpec
+from .imputation import MultiLevelImputation
+from .pipeline import DataPipeline
+from . import instrumentation
+
+
+logger = logging.getLogger(__name__)
+
+# Imputationsmethoden, deren Ergebnis je Zeitfenster nur von früheren Fenstern abhängt
+ONLINE_IMPUTATION_METHODS = ('locf', 'last', 'zero', 'constant')
+
+# Methoden, die letzte Werte aus geschlossenen Fenstern übertragen (Zustand carry)
+CARRY_METHODS = ('locf', 'last')
+
+
+class OnlineOperator:
+    """
+    Zustandsbehaftete Berechnung der Gold-Zeilen für laufend eintreffende Beobachtungen.
+
+    Statt bei jeder neuen Messung die gesamte Historie eines Patienten neu zu
+    berechnen, hält der Operator je Patient einen kleinen Zustand:
+
+    - die Beobachtungen der noch offenen Zeitfenster als Akkumulatoren der
+      Aggregation (Einzelwerte, da das Pivot Duplikate je Zeitstempel mittelt
+      und Median, Minimum und Maximum nicht aus Summen folgen),
+    - je Konzept den letzten aggregierten Wert vor den offenen Fenstern mit
+      seinem Zeitfenster (für LOCF, auch mit max_age),
+    - die zuletzt ausgegebenen Gold-Zeilen der offenen Fenster einschließlich
+      der Score-Komponenten.
+
+    update() führt die regulären Pipeline-Schritte nur für die offenen Fenster
+    der betroffenen Patienten aus. Die letzten Werte werden dabei als
+    zusätzliche Zeilen vor die Imputation gestellt und danach wieder entfernt.
+    Zurückgegeben werden nur neue oder geänderte Zeilen. Das Ergebnis
+    entspricht damit dem von run_pipeline() auf allen bisherigen
+    Beobachtungen, der Aufwand hängt aber nur von den neuen Beobachtungen und
+    den offenen Fenstern ab, nicht von der Länge der Historie.
+
+    Die Zustände liegen je Patient in dicts subject_id -> {Spalte: Array}
+    (observations, rows, carry). update() liest und ersetzt nur die Einträge
+    der betroffenen Patienten; der Aufwand hängt damit nicht von der Zahl der
+    übrigen verfolgten Patienten ab. Spaltenarrays statt kleiner DataFrames
+    halten den Aufwand je Patient gering, wenn ein Update viele Patienten
+    betrifft.
+
+    Ein Zeitfenster wird geschlossen, sobald es mehr als online.allowed_lateness
+    (Standard: ein Zeitfenster) vor dem neuesten Fenster des Patienten
+    beginnt; Beobachtungen für geschlossene Fenster werden abgewiesen.
+    Unterstützt werden LOCF, 'last', 'zero' und 'constant' sowie Läufe ohne
+    Imputation. 'last' ist eine LOCF je Gruppe, bei der auch Werte desselben
+    Zeitfensters zählen (siehe ImputationEngine._last_value); da ein
+    Zeitfenster nur als Ganzes geschlossen wird, reicht dafür wie bei LOCF der
+    letzte Wert vor den offenen Fenstern. Methoden, die spätere oder alle Werte
+    eines Patienten verwenden (z.B. NOCB oder Median), lassen sich nicht
+    inkrementell berechnen.
+    """
+
+    def __init__(self, config_path=None, db_connection=None, pipeline=None, pivot_values=None):
+        """
+        Initialisiert den Operator.
+
+        Args:
+            config_path (str, optional): Pfad zur Pipeline-Konfiguration. Standard: config/gold/pipeline.yaml.
+            db_connection (DatabaseConnection, optional): Datenbankverbindungsobjekt.
+                                                         Wenn None, wird eine neue Verbindung erstellt.
+            pipeline (DataPipeline, optional): Zu verwendende Pipeline; config_path und db_connection
+                                               werden dann ignoriert.
+            pivot_values (list, optional): Pivot-Spalten der Ergebnisse. Wenn None, werden sie einmal
+                                           aus der Eingabetabelle ermittelt.
+
+        Raises:
+            ValueError: Wenn sich die Konfiguration nicht inkrementell berechnen lässt.
+        """
+        if pipeline is None:
+            pipeline = DataPipeline(config_path, db_connection=db_connection)
+        self.pipeline = pipeline
+        config = pipeline.config
+
+        if not (config.get('pivot_data', True) and config.get('aggregate_data', True)):
+            raise ValueError("Die Online-Berechnung benötigt Pivot und Aggregation in Zeitfenstern.")
+
+        pivot_config = config.get('pivot', {})
+        index_cols = pivot_config.get('index_cols', ['subject_id', 'charttime'])
+        self.id_cols = [col for col in index_cols if 'id' in col.lower() and col != 'concept_id']
+        self.time_col = next(col for col in index_cols if col not in self.id_cols)
+        self.value_col = pivot_config.get('value_col', 'value')
+        self.pivot_col = pivot_config.get('pivot_col', 'concept_name')
+        self.keys = self.id_cols + ['time_window']
+        if 'subject_id' not in self.id_cols:
+            raise ValueError("Die Online-Berechnung benötigt subject_id in pivot.index_cols.")
+
+        self.spec = AggregationSpec(config.get('aggregation', {}))
+        lateness = config.get('online', {}).get('allowed_lateness') or self.spec.time_window
+        self.allowed_lateness = pd.Timedelta(pd.tseries.frequencies.to_offset(lateness))
+
+        self.method, self.group_by = self._imputation(config)
+
+        if pivot_values is None:
+            pivot_values = pipeline._load_pivot_values()
+        self.pivot_values = pivot_values
+
+        # Zustand je Patient: subject_id -> {Spalte: Array} (siehe Klassenbeschreibung)
+        self.observations = {}
+        self.rows = {}
+        self.carry = {}
+        # Beginn des ältesten offenen Zeitfensters je Patient; frühere Fenster sind geschlossen
+        self.closed_before = {}
+
+    def _imputation(self, config):
+        """
+        Prüft die Imputation und gibt Methode und Gruppierung zurück.
+
+        Returns:
+            tuple: Methode (None ohne Imputation) und Gruppierungsspalten.
+        """
+        if not config.get('impute_missing_values', True):
+            return None, []
+
+        imputation_config = config.get('imputation', {})
+        if MultiLevelImputation.configured(imputation_config):
+            raise ValueError("Mehrstufige Imputation wird in der Online-Berechnung nicht unterstützt.")
+
+        method = imputation_config.get('method', 'locf')
+        if method not in ONLINE_IMPUTATION_METHODS:
+            raise ValueError(f"Imputationsmethode '{method}' benötigt die gesamte Historie und wird in der "
+                             f"Online-Berechnung nicht unterstützt (möglich: {', '.join(ONLINE_IMPUTATION_METHODS)}).")
+
+        group_by = [col for col in imputation_config.get('group_by', ['subject_id']) if col in self.id_cols]
+        if method in CARRY_METHODS and 'subject_id' not in group_by:
+            raise ValueError(f"Imputationsmethode '{method}' muss in der Online-Berechnung je subject_id "
+                             f"gruppieren (imputation.group_by).")
+        return method, group_by
+
+    def update(self, observations):
+        """
+        Verarbeitet neue Beobachtungen und gibt die neuen oder geänderten Gold-Zeilen zurück.
+
+        Args:
+            observations (pandas.DataFrame): Neue Beobachtungen im Long-Format (Spalten wie die Eingabetabelle).
+
+        Returns:
+            pandas.DataFrame: Neue oder geänderte Gold-Zeilen, sortiert nach Patient und Zeitfenster.
+
+        Raises:
+            ValueError: Wenn Beobachtungen in bereits geschlossene Zeitfenster fallen. Der Zustand
+                        bleibt dann unverändert.
+        """
+        with instrumentation.disabled():
+            observations = self._prepare(observations)
+            windows = self.spec.windows(observations[self.time_col])
+
+            closed = pd.to_datetime(observations['subject_id'].map(self.closed_before))
+            late = (windows < closed).to_numpy()
+            if late.any():
+                raise ValueError(f"{int(late.sum())} Beobachtungen fallen in bereits geschlossene Zeitfenster "
+                                 f"(online.allowed_lateness: {self.allowed_lateness}).")
+
+            subjects = observations['subject_id'].unique()
+            if not len(subjects):
+                return self._compute(observations, None)[1]
+
+            data = self._select(self.observations, subjects, observations)
+            carry = self._select(self.carry, subjects)
+            wide, result = self._compute(data, carry)
+            emitted = self._changed(result, self._select(self.rows, subjects))
+            self._advance(subjects, data, wide, result, carry)
+            return emitted
+
+    def discard(self, subject_ids):
+        """
+        Entfernt den Zustand von Patienten (z.B. nach Entlassung).
+
+        Args:
+            subject_ids (list): Patienten-IDs.
+        """
+        for subject_id in subject_ids:
+            for state in (self.observations, self.rows, self.carry, self.closed_before):
+                state.pop(subject_id, None)
+
+    @staticmethod
+    def _select(state, subjects, *frames):
+        """
+        Setzt die Zustände der angegebenen Patienten und weitere Zeilen zu einem DataFrame zusammen
+        (None ohne Zeilen).
+        """
+        parts = [state[subject_id] for subject_id in subjects if subject_id in state]
+        parts += [_columns(frame) for frame in frames]
+        if not parts:
+            return None
+        return pd.DataFrame({col: _concat([part[col] for part in parts]) for col in parts[0]})
+
+    @staticmethod
+    def _store(state, subjects, rows):
+        """
+        Ersetzt die Zustände der angegebenen Patienten durch ihre Zeilen in rows.
+        """
+        for subject_id in subjects:
+            state.pop(subject_id, None)
+        if not len(rows):
+            return
+
+        # Einmal stabil nach Patient sortieren und die Spalten in zusammenhängende Abschnitte teilen
+        rows = rows.sort_values('subject_id', kind='stable', ignore_index=True)
+        columns = _columns(rows)
+        ids = rows['subject_id'].to_numpy()
+        starts = np.flatnonzero(np.r_[True, ids[1:] != ids[:-1]])
+        stops = np.r_[starts[1:], len(ids)]
+        for subject_id, start, stop in zip(ids[starts], starts, stops):
+            state[subject_id] = {col: values[start:stop].copy() for col, values in columns.items()}
+
+    def _prepare(self, observations):
+        """
+        Wendet die physiologischen Grenzen an und verwirft Beobachtungen, die
+        run_pipeline beim Pivot ebenfalls verwirft (fehlender Wert, Zeitpunkt,
+        Konzept oder fehlende ID).
+        """
+        if self.pipeline._physiological_limits():
+            observations = self.pipeline.apply_limits(observations)
+        observations = observations.dropna(subset=self.id_cols + [self.time_col, self.pivot_col, self.value_col])
+        if not pd.api.types.is_datetime64_any_dtype(observations[self.time_col]):
+            observations = observations.assign(**{self.time_col: pd.to_datetime(observations[self.time_col])})
+        return observations
+
+    def _compute(self, data, carry):
+        """
+        Führt Aggregation, Imputation, abgeleitete Parameter und Scores aus.
+
+        Die letzten Werte vor den offenen Fenstern (carry) werden für die
+        Imputation mit negativen Indizes angehängt und danach wieder entfernt.
+
+        Returns:
+            tuple: Aggregierte Daten vor der Imputation und Gold-Zeilen (pandas.DataFrame).
+        """
+        pipeline = self.pipeline
+        wide = pipeline.build_wide(pipeline.aggregate_long(data), columns=self.pivot_values)
+
+        result = wide
+        if self.method is not None:
+            if carry is not None and len(carry) and self.method in CARRY_METHODS:
+                previous = carry.astype(wide.dtypes.to_dict())
+                previous.index = -1 - np.arange(len(previous))
+                result = pd.concat([wide, previous])
+            result = pipeline.impute_missing_values(result)
+            result = result[result.index >= 0]
+        result = result.reset_index(drop=True)
+
+        if pipeline.config.get('calculate_derived_parameters', True):
+            result = pipeline.calculate_derived_parameters(result)
+        if pipeline.config.get('calculate_clinical_scores', True):
+            result = pipeline.calculate_clinical_scores(result, skip_empty_components=False,
+                                                        available=pipeline._available_columns(self.pivot_values))
+        return wide, result
+
+    def _changed(self, result, previous):
+        """
+        Wählt die Zeilen aus, die neu sind oder sich gegenüber der letzten Ausgabe geändert haben.
+        """
+        if previous is None or not len(previous):
+            return result
+
+        current = result.set_index(self.keys)
+        previous = previous.set_index(self.keys)
+        before = previous.reindex(current.index)
+        unchanged = ((current == before) | (current.isna() & before.isna())).all(axis=1)
+        unchanged &= current.index.isin(previous.index)
+        return result[~unchanged.to_numpy()].reset_index(drop=True)
+
+    def _advance(self, subjects, data, wide, result, carry):
+        """
+        Schließt Zeitfenster, die mehr als allowed_lateness vor dem neuesten Fenster
+        des Patienten liegen, und ersetzt den Zustand der betroffenen Patienten.
+        """
+        for subject_id, latest in result.groupby('subject_id', sort=False)['time_window'].max().items():
+            limit = latest - self.allowed_lateness
+            previous = self.closed_before.get(subject_id)
+            if previous is None or limit > previous:
+                self.closed_before[subject_id] = limit
+        cutoff = pd.to_datetime(pd.Series({subject_id: self.closed_before[subject_id] for subject_id in subjects},
+                                          dtype=object))
+
+        open_data = self.spec.windows(data[self.time_col]) >= data['subject_id'].map(cutoff)
+        open_rows = result['time_window'] >= result['subject_id'].map(cutoff)
+        self._store(self.observations, subjects, data[open_data.to_numpy()])
+        self._store(self.rows, subjects, result[open_rows.to_numpy()])
+
+        if self.method in CARRY_METHODS:
+            closing = wide[(wide['time_window'] < wide['subject_id'].map(cutoff)).to_numpy()]
+            if len(closing):
+                frames = [closing] if carry is None else [carry, closing]
+                self._store(self.carry, subjects, self._last_values(pd.concat(frames, ignore_index=True)))
+
+    def _last_values(self, frame):
+        """
+        Ermittelt je Imputationsgruppe und Konzept den letzten aggregierten Wert mit seinem Zeitfenster.
+
+        Returns:
+            pandas.DataFrame: Eine Zeile je Gruppe und Zeitfenster mit mindestens einem letzten Wert.
+        """
+        columns = [col for col in frame.columns if col not in self.keys]
+        values = frame.melt(id_vars=self.keys, value_vars=columns, var_name='_column', value_name='_value')
+        values = values[values['_value'].notna()].sort_values('time_window', kind='stable')
+        values = values.drop_duplicates(self.group_by + ['_column'], keep='last')
+
+        last = values.set_index(self.keys + ['_column'])['_value'].unstack('_column')
+        last = last.reindex(columns=columns).reset_index()
+        last.columns.name = None
+        return last.astype(frame.dtypes.to_dict())
+
+
+def _columns(frame):
+    """
+    Gibt die Spalten eines DataFrames als Arrays zurück (numpy-Array bzw. ExtensionArray).
+    """
+    return {col: series.to_numpy() if isinstance(series.dtype, np.dtype) else series.array
+            for col, series in frame.items()}
+
+
+def _concat(arrays):
+    """
+    Verkettet die Abschnitte einer Spalte; numpy-Arrays direkt, ExtensionArrays über pandas.
+    """
+    if all(isinstance(array, np.ndarray) for array in arrays):
+        return np.concatenate(arrays)
+    return pd.concat([pd.Series(array) for array in arrays], ignore_index=True)
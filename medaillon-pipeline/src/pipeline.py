@@ -1,10 +1,27 @@
+import logging
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
 import yaml
 import os
+import copy
+from concurrent.futures import ProcessPoolExecutor
 from sqlalchemy import text
-from .database import DatabaseConnection
+from .database import DatabaseConnection, OfflineConnection
+from .expressions import DerivedParameterEngine
+from .imputation import ImputationEngine, MultiLevelImputation
+from .limits import PhysiologicalLimits
+from . import instrumentation
+from .incremental import WatermarkStore
+from .pushdown import SqlPushdown
+from .scores import ScoreEngine, PARAMETER_MAPPINGS
+from .compact import CompactDtypes
+from .aggregation import AggregationSpec, entry_columns, entry_concept_ids
+from .longformat import SparseGrid
+from .writer import BulkWriter, _information_schema_types, _quote
+
+
+logger = logging.getLogger(__name__)
 
 
 class DataPipeline:
@@ -12,7 +29,7 @@ class DataPipeline:
     Klasse zur Implementierung der Datenaufbereitungspipeline für die Gold-Ebene.
     """
     
-    def __init__(self, config_path=None, db_connection=None):
+    def __init__(self, config_path=None, db_connection=None, config=None):
         """
         Initialisiert die Pipeline mit den Konfigurationsparametern.
         
@@ -21,17 +38,42 @@ class DataPipeline:
                                          Wenn None, wird die Standardkonfiguration verwendet.
             db_connection (DatabaseConnection, optional): Datenbankverbindungsobjekt.
                                                          Wenn None, wird eine neue Verbindung erstellt.
+            config (dict, optional): Bereits geladene Konfiguration. Wenn angegeben, wird config_path ignoriert.
         """
-        if config_path is None:
-            # Standardpfad zur Konfigurationsdatei
-            base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-            config_path = os.path.join(base_dir, 'config', 'gold', 'pipeline.yaml')
-        
-        # Konfiguration laden
-        self.config = self._load_config(config_path)
+        if config is not None:
+            self.config = config
+        else:
+            if config_path is None:
+                # Standardpfad zur Konfigurationsdatei
+                base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+                config_path = os.path.join(base_dir, 'config', 'gold', 'pipeline.yaml')
+            
+            # Konfiguration laden
+            self.config = self._load_config(config_path)
         
         # Datenbankverbindung
         self.db = db_connection if db_connection else DatabaseConnection()
+        
+        # Zwischengespeicherte Engines je Konfigurationsabschnitt (Konfiguration, Engine)
+        self._engines = {}
+        
+        # Spaltennamen je concept_id (siehe _concept_columns)
+        self._concept_names = {}
+        
+        # Geladene Tabelle der physiologischen Grenzen (siehe _physiological_limits)
+        self._limits_table = None
+        
+        # Herkunft der Werte der letzten mehrstufigen Imputation (siehe _impute_levels)
+        self.last_imputation_provenance = None
+        
+        # Werte außerhalb der physiologischen Grenzen je Konzept (siehe apply_limits)
+        self.last_limits_report = None
+        
+        # Bericht des letzten Laufs (siehe instrumentation.RunReport)
+        self.last_report = None
+        
+        if 'logging' in self.config:
+            instrumentation.configure_logging(self.config['logging'])
     
     def _load_config(self, config_path):
         """
@@ -46,34 +88,311 @@ class DataPipeline:
         with open(config_path, 'r') as file:
             return yaml.safe_load(file)
     
-    def load_data(self, table=None, schema=None, query=None):
+    @instrumentation.stage()
+    def load_data(self, table=None, schema=None, query=None, params=None,
+                  subject_ids=None, stay_ids=None, start_time=None, end_time=None):
         """
         Lädt Daten aus der Datenbank.
         
+        Ohne benutzerdefinierte Abfrage werden nur die für Pivot und Aggregation
+        benötigten Spalten geladen und, sofern load.required_concepts_only gesetzt
+        ist, nur die Konzepte, die von abgeleiteten Parametern und klinischen
+        Scores verwendet werden (siehe required_concepts). Das Zeitraster der
+        Gold-Tabelle enthält dann nur Zeitfenster mit mindestens einer Messung
+        eines benötigten Konzepts. Alle Filter werden als gebundene Parameter an
+        die Datenbank übergeben. Ist der Abfrage-Cache aktiviert (cache in
+        database.yaml), wird das Ergebnis lokal zwischengespeichert, bis sich
+        die Eingabetabelle ändert.
+        
         Args:
             table (str, optional): Name der Tabelle. Wenn None, wird die Tabelle aus der Konfiguration verwendet.
             schema (str, optional): Name des Schemas. Wenn None, wird das Eingabeschema aus der Konfiguration verwendet.
-            query (str, optional): Benutzerdefinierte SQL-Abfrage. Wenn angegeben, werden table und schema ignoriert.
+            query (str, optional): Benutzerdefinierte SQL-Abfrage. Wenn angegeben, werden table, schema und alle Filter ignoriert.
+            params (dict, optional): Gebundene Parameter für die benutzerdefinierte Abfrage.
+            subject_ids (list, optional): Nur diese Patienten laden.
+            stay_ids (list, optional): Nur diese ICU-Aufenthalte laden.
+            start_time (datetime, optional): Nur Messungen ab diesem Zeitpunkt (einschließlich) laden.
+            end_time (datetime, optional): Nur Messungen vor diesem Zeitpunkt laden.
             
         Returns:
             pandas.DataFrame: Geladene Daten.
         """
         if query:
-            return self.db.execute_query(query)
+            return self._compact_long(self.db.execute_query(query, params=params))
+        
+        if table is None:
+            table = self.config.get('input_table', 'standardized_parameters')
+        
+        if schema is None:
+            schema = self.db.get_input_schema()
+        
+        query, params = self._build_load_query(
+            table=table, schema=schema, subject_ids=subject_ids, stay_ids=stay_ids,
+            start_time=start_time, end_time=end_time
+        )
+        data = self.db.execute_query(query, params=params, sources=[f"{schema}.{table}"])
+        return self._compact_long(data)
+    
+    def required_concepts(self):
+        """
+        Ermittelt die Konzepte, die von der Konfiguration tatsächlich verwendet werden.
+        
+        Berücksichtigt werden die required_columns der abgeleiteten Parameter sowie
+        die Parameter der Score-Komponenten, sofern diese nicht selbst abgeleitete
+        Parameter sind. Numerische Einträge gelten als concept_id.
+        
+        Returns:
+            dict: 'names' (exakte Konzeptnamen), 'patterns' (Score-Parameter, die wie in
+                  calculate_clinical_scores auch als Teil eines Spaltennamens oder über
+                  PARAMETER_MAPPINGS gefunden werden) und 'concept_ids'.
+        """
+        derived_params = self.config.get('derived_parameters', [])
+        derived_names = {param.get('name') for param in derived_params}
+        
+        names, patterns, concept_ids = set(), set(), set()
+        
+        def add(entry, target):
+            if isinstance(entry, int) or (isinstance(entry, str) and entry.isdigit()):
+                concept_ids.add(int(entry))
+            elif entry:
+                target.add(str(entry))
+        
+        for param in derived_params:
+            for col in param.get('required_columns', []):
+                add(col, names)
+        
+        for score in self.config.get('clinical_scores', []):
+            for component in score.get('components', []):
+                parameter = component.get('parameter')
+                if parameter in derived_names:
+                    continue
+                add(parameter, patterns)
+                names.update(PARAMETER_MAPPINGS.get(parameter, []))
         
+        return {
+            'names': sorted(names),
+            'patterns': sorted(patterns),
+            'concept_ids': sorted(concept_ids),
+        }
+    
+    def _build_load_query(self, table=None, schema=None, subject_ids=None, stay_ids=None,
+                          start_time=None, end_time=None, columns=None, order_by=None):
+        """
+        Erstellt die Abfrage zum Laden der Eingabedaten mit Spaltenprojektion und Filtern.
+        
+        Returns:
+            tuple: SQL-Abfrage (str) und gebundene Parameter (dict).
+        """
         if table is None:
             table = self.config.get('input_table', 'standardized_parameters')
         
         if schema is None:
             schema = self.db.get_input_schema()
         
-        query = f"SELECT * FROM {schema}.{table}"
-        return self.db.execute_query(query)
+        pivot_config = self.config.get('pivot', {})
+        pivot_col = pivot_config.get('pivot_col', 'concept_name')
+        
+        if columns is None and self.config.get('pivot_data', True):
+            columns = list(dict.fromkeys(
+                pivot_config.get('index_cols', ['subject_id', 'charttime'])
+                + [pivot_col, pivot_config.get('value_col', 'value')]
+                # concept_id für den Join mit den physiologischen Grenzen
+                + (['concept_id'] if self._physiological_limits() else [])
+            ))
+        select = ', '.join(columns) if columns else '*'
+        
+        conditions, params = [], {}
+        
+        concept_condition, concept_params = self._concept_filter()
+        if concept_condition:
+            conditions.append(concept_condition)
+            params.update(concept_params)
+        
+        if subject_ids is not None:
+            conditions.append("subject_id = ANY(:subject_ids)")
+            params['subject_ids'] = [int(subject_id) for subject_id in subject_ids]
+        
+        if stay_ids is not None:
+            conditions.append("stay_id = ANY(:stay_ids)")
+            params['stay_ids'] = [int(stay_id) for stay_id in stay_ids]
+        
+        if start_time is not None:
+            conditions.append("charttime >= :start_time")
+            params['start_time'] = start_time
+        
+        if end_time is not None:
+            conditions.append("charttime < :end_time")
+            params['end_time'] = end_time
+        
+        query = f"SELECT {select} FROM {schema}.{table}"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        if order_by:
+            query += f" ORDER BY {order_by}"
+        
+        return query, params
     
+    def _concept_filter(self, prefix=''):
+        """
+        Erstellt die Filterbedingung auf die benötigten Konzepte (load.required_concepts_only).
+        
+        Args:
+            prefix (str, optional): Präfix für die Namen der gebundenen Parameter, damit mehrere
+                                    Filter in einer Abfrage kombiniert werden können.
+            
+        Returns:
+            tuple: SQL-Bedingung (str oder None, wenn nicht gefiltert wird) und gebundene Parameter (dict).
+        """
+        if not self.config.get('load', {}).get('required_concepts_only', False):
+            return None, {}
+        
+        pivot_col = self.config.get('pivot', {}).get('pivot_col', 'concept_name')
+        concepts = self.required_concepts()
+        conditions, params = [], {}
+        
+        if concepts['names']:
+            conditions.append(f"{pivot_col} = ANY(:{prefix}concept_names)")
+            params[f'{prefix}concept_names'] = concepts['names']
+        if concepts['patterns']:
+            conditions.append(f"{pivot_col} LIKE ANY(:{prefix}concept_patterns)")
+            params[f'{prefix}concept_patterns'] = [f"%{pattern}%" for pattern in concepts['patterns']]
+        if concepts['concept_ids']:
+            conditions.append(f"concept_id = ANY(:{prefix}concept_ids)")
+            params[f'{prefix}concept_ids'] = concepts['concept_ids']
+        
+        if not conditions:
+            return None, {}
+        return '(' + ' OR '.join(conditions) + ')', params
+    
+    def load_data_partitioned(self, chunk_size=None, table=None, schema=None, partition_col='subject_id'):
+        """
+        Lädt Daten blockweise über einen serverseitigen Cursor, sortiert nach Patient.
+        
+        Jeder gelieferte Block enthält nur vollständige Patienten: Die Zeilen des
+        letzten Patienten eines Blocks werden zurückgehalten und dem nächsten Block
+        vorangestellt. Der Speicherbedarf ist damit durch die Blockgröße (plus die
+        Daten eines einzelnen Patienten) begrenzt, nicht durch die Kohortengröße.
+        
+        Args:
+            chunk_size (int, optional): Zeilen pro Block. Wenn None, wird der Wert aus der Konfiguration verwendet.
+            table (str, optional): Name der Tabelle. Wenn None, wird die Tabelle aus der Konfiguration verwendet.
+            schema (str, optional): Name des Schemas. Wenn None, wird das Eingabeschema aus der Konfiguration verwendet.
+            partition_col (str, optional): Spalte, nach der partitioniert wird.
+            
+        Yields:
+            pandas.DataFrame: Daten einer Gruppe vollständiger Patienten im Long-Format.
+        """
+        if chunk_size is None:
+            chunk_size = self.config.get('performance', {}).get('chunk_size', 500000)
+        
+        query, params = self._build_load_query(table=table, schema=schema, order_by=partition_col)
+        
+        carry = None
+        for chunk in self.db.iter_query(query, chunk_size=chunk_size, params=params):
+            if carry is not None:
+                chunk = pd.concat([carry, chunk], ignore_index=True)
+            
+            # Letzten (möglicherweise unvollständigen) Patienten zurückhalten
+            is_last = (chunk[partition_col] == chunk[partition_col].iloc[-1]).to_numpy()
+            carry = chunk[is_last]
+            complete = chunk[~is_last]
+            if not complete.empty:
+                yield self._compact_long(complete.reset_index(drop=True))
+        
+        if carry is not None and not carry.empty:
+            yield self._compact_long(carry.reset_index(drop=True))
+    
+    @instrumentation.stage()
+    def load_aggregated_data(self, table=None, schema=None):
+        """
+        Lädt bereits pivotierte und zeitlich aggregierte Daten (SQL-Pushdown).
+        
+        Pivot und Aggregation werden in PostgreSQL ausgeführt (siehe SqlPushdown);
+        das Ergebnis entspricht aggregate_data(pivot_data(load_data())).
+        
+        Args:
+            table (str, optional): Name der Tabelle. Wenn None, wird die Tabelle aus der Konfiguration verwendet.
+            schema (str, optional): Name des Schemas. Wenn None, wird das Eingabeschema aus der Konfiguration verwendet.
+            
+        Returns:
+            pandas.DataFrame: Aggregierte Daten im Wide-Format.
+        """
+        if table is None:
+            table = self.config.get('input_table', 'standardized_parameters')
+        
+        if schema is None:
+            schema = self.db.get_input_schema()
+        
+        pivot_values = self._load_pivot_values(table=table, schema=schema)
+        if not pivot_values:
+            raise ValueError(f"Keine Werte in {schema}.{table} gefunden.")
+        
+        pushdown = SqlPushdown(self.config)
+        concept_ids = pushdown.aggregation.concept_ids
+        concept_columns = self._concept_columns(concept_ids) if concept_ids else None
+        query, params = pushdown.build_query(f"{schema}.{table}", pivot_values, concept_columns=concept_columns,
+                                             limits=self._physiological_limits())
+        data = self.db.execute_query(query, params=params, sources=[f"{schema}.{table}"])
+        
+        compact = self._compact_dtypes()
+        return compact.wide(data) if compact else data
+    
+    @instrumentation.stage()
+    def apply_limits(self, data):
+        """
+        Entfernt oder begrenzt Werte außerhalb der physiologischen Grenzen (outlier_handling).
+        
+        Die Grenzen aus silver_schema.physiological_limits und outlier_handling.outliers werden
+        einmal geladen und per Join auf concept_id auf die Daten im Long-Format angewendet
+        (siehe PhysiologicalLimits). Die Anzahl der betroffenen Werte je Konzept steht
+        anschließend in self.last_limits_report.
+        
+        Args:
+            data (pandas.DataFrame): Daten im Long-Format (mit concept_id).
+            
+        Returns:
+            pandas.DataFrame: Bereinigte Daten im Long-Format.
+        """
+        limits = self._physiological_limits()
+        if limits is None:
+            return data
+        
+        value_col = self.config.get('pivot', {}).get('value_col', 'value')
+        result = limits.apply(data, value_col=value_col)
+        self.last_limits_report = limits.last_report
+        return result
+    
+    def _physiological_limits(self):
+        """
+        Gibt die physiologischen Grenzen zurück, falls outlier_handling konfiguriert und aktiviert ist.
+        
+        Returns:
+            PhysiologicalLimits or None: Grenzen (Tabelle wird nur einmal geladen) oder None.
+        """
+        outlier_config = self.config.get('outlier_handling')
+        if not outlier_config or not outlier_config.get('enabled', True):
+            return None
+        
+        def load_table():
+            if self._limits_table is None:
+                table = outlier_config.get('limits_table', 'physiological_limits')
+                schema = self.db.get_input_schema()
+                self._limits_table = self.db.execute_query(
+                    f"SELECT concept_id, min_value, max_value FROM {schema}.{table}", sources=[f"{schema}.{table}"]
+                )
+            return self._limits_table
+        
+        return self._engine('outlier_handling', lambda section: PhysiologicalLimits(section, load_table))
+    
+    @instrumentation.stage()
     def pivot_data(self, data, index_cols=None, value_col=None, pivot_col=None):
         """
         Wandelt Daten vom Long-Format ins Wide-Format um.
         
+        Mehrere Messungen eines Konzepts mit demselben Zeitstempel werden
+        gemittelt; für Konzepte mit der Aggregationsmethode sum (z.B.
+        Urinausscheidung) werden sie addiert, sofern aggregate_data aktiviert ist.
+        
         Args:
             data (pandas.DataFrame): Daten im Long-Format.
             index_cols (list, optional): Spalten für den Index. Wenn None, werden die Spalten aus der Konfiguration verwendet.
@@ -92,16 +411,43 @@ class DataPipeline:
         if pivot_col is None:
             pivot_col = self.config.get('pivot', {}).get('pivot_col', 'concept_name')
         
+        compact = self._compact_dtypes()
+        
         # Pivot-Operation durchführen
         pivot_data = data.pivot_table(
             index=index_cols,
             columns=pivot_col,
             values=value_col,
-            aggfunc='mean'  # Standardaggregation: Mittelwert
-        ).reset_index()
+            aggfunc='mean',  # Standardaggregation: Mittelwert
+            observed=True    # Nur vorhandene Kategorien (kompakte Konzeptnamen)
+        )
+        
+        sums = self._sum_concepts(list(pivot_data.columns))
+        if sums:
+            observations = data[data[pivot_col].isin(sums) & data[value_col].notna()]
+            summed = observations.pivot_table(index=index_cols, columns=pivot_col, values=value_col,
+                                              aggfunc='sum', observed=True)
+            for concept in summed.columns:
+                pivot_data[concept] = summed[concept]
+        
+        if compact:
+            # Kategorische Spaltennamen in normale Spaltennamen umwandeln
+            pivot_data.columns = pivot_data.columns.astype(object)
+            return compact.wide(pivot_data.reset_index())
         
-        return pivot_data
+        return pivot_data.reset_index()
+    
+    def _sum_concepts(self, concepts):
+        """
+        Konzepte, deren Messungen mit demselben Zeitstempel addiert werden (siehe AggregationSpec.sum_concepts).
+        """
+        if not self.config.get('aggregate_data', True):
+            return []
+        spec = AggregationSpec(self.config.get('aggregation', {}))
+        concept_columns = self._concept_columns(spec.concept_ids) if spec.concept_ids else None
+        return spec.sum_concepts(concepts, concept_columns)
     
+    @instrumentation.stage()
     def aggregate_data(self, data, time_window=None, agg_method=None):
         """
         Aggregiert Daten in Zeitfenstern.
@@ -109,18 +455,23 @@ class DataPipeline:
         Args:
             data (pandas.DataFrame): Daten, die aggregiert werden sollen.
             time_window (str, optional): Größe des Zeitfensters (z.B. '1H', '30min'). 
-                                         Wenn None, wird das Zeitfenster aus der Konfiguration verwendet.
-            agg_method (str, optional): Aggregationsmethode (z.B. 'mean', 'median', 'max'). 
-                                        Wenn None, wird die Methode aus der Konfiguration verwendet.
+                                         Wenn None, wird das Zeitfenster aus der Konfiguration verwendet
+                                         (time_window bzw. windowsize, verschoben um offset).
+            agg_method (str, optional): Aggregationsmethode für alle Spalten (z.B. 'mean', 'median', 'max'). 
+                                        Wenn None, werden die Methode und die aggregate_functions
+                                        (Methode je Konzept) aus der Konfiguration verwendet.
             
         Returns:
             pandas.DataFrame: Aggregierte Daten.
         """
-        if time_window is None:
-            time_window = self.config.get('aggregation', {}).get('time_window', '1H')
-        
-        if agg_method is None:
-            agg_method = self.config.get('aggregation', {}).get('method', 'mean')
+        aggregation_config = dict(self.config.get('aggregation', {}))
+        if time_window is not None:
+            aggregation_config['time_window'] = time_window
+        if agg_method is not None:
+            # Explizite Methode gilt für alle Spalten
+            aggregation_config['method'] = agg_method
+            aggregation_config.pop('aggregate_functions', None)
+        spec = AggregationSpec(aggregation_config)
         
         # Kopie der Daten erstellen
         result = data.copy()
@@ -143,7 +494,7 @@ class DataPipeline:
             raise ValueError("Keine Zeitstempelspalte gefunden.")
         
         # Zeitfenster erstellen
-        result['time_window'] = result[time_col].dt.floor(time_window)
+        result['time_window'] = spec.windows(result[time_col])
         
         # Spalten für die Gruppierung identifizieren
         id_cols = [col for col in result.columns if 'id' in col.lower() and col != 'concept_id']
@@ -157,30 +508,132 @@ class DataPipeline:
         numeric_cols = result.select_dtypes(include=['number']).columns.tolist()
         numeric_cols = [col for col in numeric_cols if col not in group_cols]
         
-        # Aggregationsfunktion auswählen
-        if agg_method == 'mean':
-            agg_func = np.mean
-        elif agg_method == 'median':
-            agg_func = np.median
-        elif agg_method == 'max':
-            agg_func = np.max
-        elif agg_method == 'min':
-            agg_func = np.min
-        else:
-            agg_func = np.mean  # Standardmäßig Mittelwert verwenden
+        # Aggregationsmethode je Spalte (Standardmethode oder aggregate_functions)
+        concept_columns = self._concept_columns(spec.concept_ids) if spec.concept_ids else None
+        methods = spec.methods(numeric_cols, concept_columns)
+        
+        # Aggregation aller Spalten in einem Durchlauf
+        aggregated = spec.aggregate(result, group_cols, methods)
+        
+        compact = self._compact_dtypes()
+        return compact.wide(aggregated) if compact else aggregated
+    
+    @instrumentation.stage()
+    def aggregate_long(self, data):
+        """
+        Pivotiert und aggregiert Daten im Long-Format, ohne das Wide-Format zu bilden (performance.long_format).
+        
+        Entspricht aggregate_data(pivot_data(data)), speichert je Konzept aber nur
+        die besetzten Zeitfenster (siehe SparseGrid). Speicher und Laufzeit hängen
+        damit von der Zahl der Messungen ab, nicht von Patienten x Stunden x Konzepten.
+        
+        Args:
+            data (pandas.DataFrame): Daten im Long-Format.
+            
+        Returns:
+            SparseGrid: Aggregierte Daten.
+        """
+        pivot_config = self.config.get('pivot', {})
+        spec = AggregationSpec(self.config.get('aggregation', {}))
+        concept_columns = self._concept_columns(spec.concept_ids) if spec.concept_ids else None
+        return SparseGrid.aggregate(
+            data, spec,
+            index_cols=pivot_config.get('index_cols', ['subject_id', 'charttime']),
+            pivot_col=pivot_config.get('pivot_col', 'concept_name'),
+            value_col=pivot_config.get('value_col', 'value'),
+            concept_columns=concept_columns
+        )
+    
+    @instrumentation.stage()
+    def impute_long(self, grid, engine):
+        """
+        Führt LOCF/NOCB auf den aggregierten Daten im Long-Format aus (siehe SparseGrid.impute).
+        
+        Args:
+            grid (SparseGrid): Aggregierte Daten.
+            engine (ImputationEngine): Einstellungen der Imputation (siehe _long_imputation).
+            
+        Returns:
+            SparseGrid: Daten mit imputierten Werten.
+        """
+        return grid.impute(engine)
+    
+    @instrumentation.stage()
+    def build_wide(self, grid, columns=None):
+        """
+        Baut aus den Daten im Long-Format das Wide-Format für die weiteren Schritte und die Gold-Tabelle.
         
-        # Aggregation durchführen
-        aggregated = result.groupby(group_cols)[numeric_cols].agg(agg_func).reset_index()
+        Args:
+            grid (SparseGrid): Aggregierte (und ggf. imputierte) Daten.
+            columns (list, optional): Vollständige Liste der Pivot-Spalten (blockweise Verarbeitung).
+            
+        Returns:
+            pandas.DataFrame: Daten im Wide-Format wie nach aggregate_data bzw. impute_missing_values.
+        """
+        data = grid.to_wide(columns)
+        compact = self._compact_dtypes()
+        return compact.wide(data) if compact else data
+    
+    def _long_to_wide(self, grid, columns=None):
+        """
+        Imputiert die aggregierten Daten im Long-Format, sofern die Imputation dort
+        möglich ist (siehe _long_imputation), und baut das Wide-Format.
         
-        return aggregated
+        Args:
+            grid (SparseGrid): Aggregierte Daten (siehe aggregate_long).
+            columns (list, optional): Vollständige Liste der Pivot-Spalten (blockweise Verarbeitung).
+            
+        Returns:
+            tuple: (pandas.DataFrame im Wide-Format, bool ob bereits imputiert wurde).
+        """
+        engine = self._long_imputation(grid) if self.config.get('impute_missing_values', True) else None
+        if engine is not None:
+            grid = self.impute_long(grid, engine)
+        return self.build_wide(grid, columns=columns), engine is not None
     
+    def _long_format(self):
+        """
+        Prüft, ob Pivot und Aggregation im Long-Format ausgeführt werden (performance.long_format).
+        
+        Das setzt voraus, dass beide Schritte aktiviert sind.
+        """
+        return (self.config.get('performance', {}).get('long_format', False)
+                and self.config.get('pivot_data', True) and self.config.get('aggregate_data', True))
+    
+    def _long_imputation(self, grid):
+        """
+        Liefert die Einstellungen für impute_long, sofern die konfigurierte Imputation im
+        Long-Format ausgeführt werden kann: LOCF oder NOCB ohne Imputationsstufen, gruppiert
+        nach den ID-Spalten des Rasters. Andere Methoden laufen wie bisher auf dem Wide-Format.
+        
+        Returns:
+            ImputationEngine or None: Einstellungen oder None.
+        """
+        imputation_config = self.config.get('imputation', {})
+        if MultiLevelImputation.configured(imputation_config):
+            return None
+        
+        method = imputation_config.get('method', 'locf')
+        group_by = [col for col in imputation_config.get('group_by', ['subject_id']) if col in grid.keys.columns]
+        if method not in ('locf', 'nocb') or group_by != grid.id_cols:
+            return None
+        
+        return self._imputation_engine(imputation_config, method, group_by, list(grid.columns))
+    
+    @instrumentation.stage()
     def impute_missing_values(self, data, method=None, group_by=None):
         """
         Imputiert fehlende Werte in den Daten.
         
+        LOCF und NOCB übertragen Werte höchstens imputation.max_age (z.B. '24h') weit;
+        imputation.max_age_per_concept legt abweichende Dauern je Konzept fest.
+        Enthält die Konfiguration Imputationsstufen (first_level, second_level,
+        third_level), werden diese statt einer einzelnen Methode ausgeführt
+        (siehe MultiLevelImputation).
+        
         Args:
             data (pandas.DataFrame): Daten mit fehlenden Werten.
-            method (str, optional): Imputationsmethode ('locf', 'nocb', 'mean', 'median', 'zero', 'constant').
+            method (str, optional): Imputationsmethode ('locf', 'nocb', 'last', 'mean', 'median', 'zero', 'constant').
                                     Wenn None, wird die Methode aus der Konfiguration verwendet.
             group_by (list, optional): Spalten für die Gruppierung bei der Imputation.
                                       Wenn None, werden die Spalten aus der Konfiguration verwendet.
@@ -188,409 +641,210 @@ class DataPipeline:
         Returns:
             pandas.DataFrame: Daten mit imputierten Werten.
         """
-        if method is None:
-            method = self.config.get('imputation', {}).get('method', 'locf')
+        imputation_config = self.config.get('imputation', {})
         
         if group_by is None:
-            group_by = self.config.get('imputation', {}).get('group_by', ['subject_id'])
+            group_by = imputation_config.get('group_by', ['subject_id'])
             group_by = [col for col in group_by if col in data.columns]
         
-        # Kopie der Daten erstellen
-        result = data.copy()
+        # Mehrstufige Imputation (first_level, second_level, third_level), sofern keine Methode übergeben wurde
+        if method is None and MultiLevelImputation.configured(imputation_config):
+            return self._impute_levels(data, imputation_config, group_by)
         
-        # Zeitstempelspalte identifizieren
-        time_cols = [col for col in result.columns if pd.api.types.is_datetime64_any_dtype(result[col])]
-        if time_cols:
-            time_col = time_cols[0]
-            # Nach Zeit sortieren
-            result = result.sort_values(by=group_by + [time_col])
+        if method is None:
+            method = imputation_config.get('method', 'locf')
         
-        # Numerische Spalten identifizieren
-        numeric_cols = result.select_dtypes(include=['number']).columns.tolist()
-        numeric_cols = [col for col in numeric_cols if col not in group_by and col not in time_cols]
+        engine = self._imputation_engine(imputation_config, method, group_by, data.columns)
+        return engine.impute(data)
+    
+    def _imputation_engine(self, imputation_config, method, group_by, columns):
+        """
+        Erstellt die ImputationEngine für eine einzelne Methode.
         
-        # Imputation durchführen
-        if method == 'locf':  # Last Observation Carried Forward
-            if group_by:
-                result[numeric_cols] = result.groupby(group_by)[numeric_cols].ffill()
-            else:
-                result[numeric_cols] = result[numeric_cols].ffill()
+        Args:
+            imputation_config (dict): Abschnitt 'imputation' der Konfiguration.
+            method (str): Imputationsmethode.
+            group_by (list): Spalten für die Gruppierung.
+            columns (list): Spalten der Daten (für imputation.max_age_per_concept).
+            
+        Returns:
+            ImputationEngine: Engine mit maximaler Übertragungsdauer global und je Spalte.
+        """
+        constant_value = imputation_config.get('constant_value', 0)
         
-        elif method == 'nocb':  # Next Observation Carried Backward
-            if group_by:
-                result[numeric_cols] = result.groupby(group_by)[numeric_cols].bfill()
-            else:
-                result[numeric_cols] = result[numeric_cols].bfill()
+        # Maximale Übertragungsdauer für LOCF/NOCB (global und je Konzept)
+        max_age_entries = imputation_config.get('max_age_per_concept', []) or []
+        concept_ids = entry_concept_ids(max_age_entries)
+        concept_columns = self._concept_columns(concept_ids) if concept_ids else None
+        column_max_age = {column: entry.get('max_age')
+                          for column, entry in entry_columns(max_age_entries, columns, concept_columns)}
         
-        elif method == 'mean':  # Mittelwert
-            if group_by:
-                for col in numeric_cols:
-                    means = result.groupby(group_by)[col].transform('mean')
-                    result[col] = result[col].fillna(means)
-            else:
-                for col in numeric_cols:
-                    result[col] = result[col].fillna(result[col].mean())
-        
-        elif method == 'median':  # Median
-            if group_by:
-                for col in numeric_cols:
-                    medians = result.groupby(group_by)[col].transform('median')
-                    result[col] = result[col].fillna(medians)
-            else:
-                for col in numeric_cols:
-                    result[col] = result[col].fillna(result[col].median())
-        
-        elif method == 'zero':  # Nullen
-            result[numeric_cols] = result[numeric_cols].fillna(0)
-        
-        elif method == 'constant':  # Konstanter Wert
-            constant_value = self.config.get('imputation', {}).get('constant_value', 0)
-            result[numeric_cols] = result[numeric_cols].fillna(constant_value)
-        
-        elif method == 'last':  # Letzter verfügbarer Wert
-            # Für jeden Patienten den letzten verfügbaren Wert für jede Spalte finden
-            if group_by:
-                # Sortieren nach Zeit (absteigend) innerhalb jeder Gruppe
-                time_cols = [col for col in result.columns if pd.api.types.is_datetime64_any_dtype(result[col])]
-                if time_cols:
-                    time_col = time_cols[0]
-                    # Für jede Gruppe separat verarbeiten
-                    for _, group_df in result.groupby(group_by):
-                        # Letzte nicht-NaN Werte für jede Spalte finden
-                        last_values = {}
-                        for col in numeric_cols:
-                            # Nicht-NaN Werte in zeitlich absteigender Reihenfolge
-                            valid_values = group_df.sort_values(by=time_col, ascending=False)[[time_col, col]].dropna()
-                            if not valid_values.empty:
-                                # Für jede eindeutige Zeit den letzten Wert nehmen
-                                last_values[col] = valid_values.drop_duplicates(subset=[time_col]).set_index(time_col)[col]
-                        
-                        # Für jede Zeile in der Gruppe
-                        for idx, row in group_df.iterrows():
-                            for col in numeric_cols:
-                                if pd.isna(result.at[idx, col]) and col in last_values:
-                                    # Finde den letzten Wert vor diesem Zeitpunkt
-                                    last_times = last_values[col].index
-                                    valid_times = last_times[last_times <= row[time_col]]
-                                    if not valid_times.empty:
-                                        result.at[idx, col] = last_values[col][valid_times[0]]
-            else:
-                # Ohne Gruppierung einfach den letzten nicht-NaN Wert verwenden
-                for col in numeric_cols:
-                    last_valid = None
-                    for idx in result.index:
-                        if not pd.isna(result.at[idx, col]):
-                            last_valid = result.at[idx, col]
-                        elif last_valid is not None:
-                            result.at[idx, col] = last_valid
-        
-        elif method == 'last':  # Letzter verfügbarer Wert
-            # Für jeden Patienten den letzten verfügbaren Wert für jede Spalte finden
-            if group_by:
-                # Sortieren nach Zeit (absteigend) innerhalb jeder Gruppe
-                time_cols = [col for col in result.columns if pd.api.types.is_datetime64_any_dtype(result[col])]
-                if time_cols:
-                    time_col = time_cols[0]
-                    # Für jede Gruppe separat verarbeiten
-                    for _, group_df in result.groupby(group_by):
-                        # Letzte nicht-NaN Werte für jede Spalte finden
-                        last_values = {}
-                        for col in numeric_cols:
-                            # Nicht-NaN Werte in zeitlich absteigender Reihenfolge
-                            valid_values = group_df.sort_values(by=time_col, ascending=False)[[time_col, col]].dropna()
-                            if not valid_values.empty:
-                                # Für jede eindeutige Zeit den letzten Wert nehmen
-                                last_values[col] = valid_values.drop_duplicates(subset=[time_col]).set_index(time_col)[col]
-                        
-                        # Für jede Zeile in der Gruppe
-                        for idx, row in group_df.iterrows():
-                            for col in numeric_cols:
-                                if pd.isna(result.at[idx, col]) and col in last_values:
-                                    # Finde den letzten Wert vor diesem Zeitpunkt
-                                    last_times = last_values[col].index
-                                    valid_times = last_times[last_times <= row[time_col]]
-                                    if not valid_times.empty:
-                                        result.at[idx, col] = last_values[col][valid_times[0]]
-            else:
-                # Ohne Gruppierung einfach den letzten nicht-NaN Wert verwenden
-                for col in numeric_cols:
-                    last_valid = None
-                    for idx in result.index:
-                        if not pd.isna(result.at[idx, col]):
-                            last_valid = result.at[idx, col]
-                        elif last_valid is not None:
-                            result.at[idx, col] = last_valid
+        return ImputationEngine(method=method, group_by=group_by, constant_value=constant_value,
+                                max_age=imputation_config.get('max_age'), column_max_age=column_max_age)
+    
+    def _impute_levels(self, data, imputation_config, group_by):
+        """
+        Führt die mehrstufige Imputation aus und speichert die Herkunft je Zelle.
+        
+        Die Herkunft (0 = gemessen, 1-3 = Stufe, -1 = fehlend) steht anschließend in
+        self.last_imputation_provenance; mit imputation.provenance_columns wird sie
+        zusätzlich als Spalten '<Spalte>_imputation_level' an die Daten angehängt.
+        """
+        engine = MultiLevelImputation(imputation_config, group_by=group_by)
+        concept_ids = engine.concept_ids
+        engine.concept_columns = self._concept_columns(concept_ids) if concept_ids else {}
         
+        result = engine.impute(data)
+        self.last_imputation_provenance = engine.provenance
+        
+        if imputation_config.get('provenance_columns', False):
+            result = result.assign(**{
+                f"{col}_imputation_level": engine.provenance[col].astype('Int8') for col in engine.provenance.columns
+            })
         return result
     
+    @instrumentation.stage()
     def calculate_derived_parameters(self, data):
         """
         Berechnet abgeleitete Parameter basierend auf den vorhandenen Daten.
         
+        Die Formeln werden einmalig kompiliert (siehe DerivedParameterEngine);
+        erlaubt sind nur Spaltenreferenzen, Zahlen und arithmetische Operatoren.
+        
         Args:
             data (pandas.DataFrame): Eingabedaten.
             
         Returns:
             pandas.DataFrame: Daten mit abgeleiteten Parametern.
         """
-        result = data.copy()
-        
-        # Abgeleitete Parameter aus der Konfiguration laden
-        derived_params = self.config.get('derived_parameters', [])
-        
-        for param in derived_params:
-            name = param.get('name')
-            formula = param.get('formula')
-            required_columns = param.get('required_columns', [])
-            
-            # Prüfen, ob alle erforderlichen Spalten vorhanden sind
-            required_columns_present = True
-            for col in required_columns:
-                if isinstance(col, str) and not col.isdigit():
-                    # Wenn es ein Spaltenname ist
-                    if col not in result.columns:
-                        print(f"Warnung: Erforderliche Spalte {col} für {name} nicht gefunden")
-                        required_columns_present = False
-                else:
-                    # Wenn es eine concept_id ist
-                    col_str = str(col)
-                    if col_str not in result.columns:
-                        print(f"Warnung: Erforderliche concept_id {col} für {name} nicht gefunden")
-                        required_columns_present = False
-            
-            if required_columns_present:
-                try:
-                    # Formel auswerten
-                    # Für Spalten mit Namen statt concept_ids
-                    if '$["' in formula:
-                        formula_with_df = formula.replace('$["', 'result["').replace('"]', '"]')
-                    elif '$[' in formula:
-                        # Für concept_ids
-                        formula_with_df = formula.replace('$[', 'result["').replace(']', '"]')
-                    else:
-                        # Für einfache Variablen oder direkte Werte
-                        try:
-                            # Versuchen, die Formel direkt auszuwerten (für konstante Werte)
-                            formula_value = eval(formula)
-                            formula_with_df = str(formula_value)
-                        except:
-                            # Ansonsten als Spaltennamen behandeln
-                            formula_with_df = formula
-                    
-                    print(f"Berechne {name} mit Formel: {formula_with_df}")
-                    
-                    # Überprüfen, ob die Spalten numerische Werte enthalten
-                    for col in required_columns:
-                        col_str = str(col)
-                        if col_str in result.columns and result[col_str].dtype == 'object':
-                            print(f"Konvertiere Spalte {col_str} zu numerischen Werten")
-                            result[col_str] = pd.to_numeric(result[col_str], errors='coerce')
-                    
-                    # Berechnung durchführen
-                    result[name] = eval(formula_with_df)
-                    
-                    # Ergebnisse anzeigen
-                    if not result[name].empty:
-                        print(f"Ergebnis für {name}: Min={result[name].min()}, Max={result[name].max()}, Mittelwert={result[name].mean()}")
-                    else:
-                        print(f"Keine Ergebnisse für {name} berechnet")
-                except Exception as e:
-                    print(f"Fehler bei der Berechnung von {name}: {e}")
-            else:
-                print(f"Überspringe Berechnung von {name} wegen fehlender Spalten")
+        return self._derived_engine().compute(data)
+    
+    def _derived_engine(self):
+        """
+        Gibt die DerivedParameterEngine des Abschnitts 'derived_parameters' zurück.
+        """
+        use_numexpr = self.config.get('performance', {}).get('use_numexpr', True)
+        return self._engine('derived_parameters', lambda params: DerivedParameterEngine(params, use_numexpr=use_numexpr))
+    
+    def _available_columns(self, pivot_values):
+        """
+        Gibt die Spalten zurück, die im gesamten Lauf Werte enthalten: die Pivot-Spalten und
+        die daraus berechenbaren abgeleiteten Parameter (blockweise Läufe, siehe _run_stages).
         
-        return result
+        Args:
+            pivot_values (list): Vollständige Liste der Pivot-Spalten.
+            
+        Returns:
+            set: Spaltennamen.
+        """
+        columns = set(pivot_values)
+        if self.config.get('calculate_derived_parameters', True):
+            columns = self._derived_engine().available(columns)
+        return columns
     
-    def calculate_clinical_scores(self, data):
+    @instrumentation.stage()
+    def calculate_clinical_scores(self, data, skip_empty_components=True, available=None):
         """
         Berechnet klinische Scores basierend auf den vorhandenen Daten.
         
+        Die Berechnung erfolgt vektorisiert über ScoreEngine; die Zuordnung der
+        Parameter zu Spalten wird je Spaltensatz zwischengespeichert.
+        
         Args:
             data (pandas.DataFrame): Eingabedaten.
+            skip_empty_components (bool, optional): Ob Komponenten übersprungen werden, deren Parameterspalte
+                                                    keine Werte enthält. Die Pipeline-Läufe verwenden False,
+                                                    damit das Ergebnis nicht von der Blockeinteilung abhängt.
+            available (set, optional): Parameterspalten, die im gesamten Lauf Werte enthalten
+                                       (siehe ScoreEngine.compute und _available_columns).
             
         Returns:
             pandas.DataFrame: Daten mit klinischen Scores.
         """
-        result = data.copy()
+        engine = self._engine('clinical_scores', ScoreEngine)
+        compact = self._compact_dtypes()
+        return engine.compute(data, skip_empty_components=skip_empty_components, available=available,
+                              score_dtype=compact.SCORE_DTYPE if compact else None)
+    
+    def get_output_table(self):
+        """
+        Gibt den Namen der Ausgabetabelle zurück.
         
-        # Klinische Scores aus der Konfiguration laden
-        clinical_scores = self.config.get('clinical_scores', [])
+        Neben output_table werden auch die in einzelnen Konfigurationen verwendeten
+        Angaben pipeline.output_table und database.table_output berücksichtigt.
         
-        for score in clinical_scores:
-            name = score.get('name')
-            components = score.get('components', [])
-            
-            # Score-Spalte initialisieren
-            result[name] = 0
+        Returns:
+            str: Name der Ausgabetabelle.
+        """
+        for section in (self.config, self.config.get('pipeline', {}), self.config.get('database', {})):
+            for key in ('output_table', 'table_output'):
+                if section.get(key):
+                    return section[key]
+        return 'gold_parameters'
+    
+    def get_run_report(self, path=None):
+        """
+        Gibt den Bericht des letzten Laufs (Zeiten, Zeilen, Spalten, Speicher je Schritt) als JSON zurück.
+        
+        Args:
+            path (str, optional): Wenn angegeben, wird der Bericht zusätzlich in diese Datei geschrieben.
             
-            # Für jeden SOFA-Teilscore
-            for component in components:
-                component_name = component.get('name')
-                parameter = component.get('parameter')
-                thresholds = component.get('thresholds', [])
-                scores = component.get('scores', [])
-                
-                # Parameter kann entweder ein Spaltenname oder eine concept_id sein
-                param_col = parameter
-                if isinstance(parameter, int) or (isinstance(parameter, str) and parameter.isdigit()):
-                    # Wenn parameter eine concept_id ist, suchen wir die entsprechende Spalte
-                    concept_id = str(parameter)
-                    print(f"Suche nach Spalte für concept_id {concept_id}")
-                    print(f"Verfügbare Spalten: {result.columns.tolist()}")
-                    
-                    # Exakte Übereinstimmung
-                    if concept_id in result.columns:
-                        param_col = concept_id
-                        print(f"Exakte Übereinstimmung gefunden: {param_col}")
-                    else:
-                        # Suche nach Spalten mit dem Namen statt der concept_id
-                        if isinstance(parameter, str) and parameter in result.columns:
-                            param_col = parameter
-                            print(f"Parameter als Name gefunden: {param_col}")
-                        else:
-                            print(f"Warnung: Parameter {parameter} nicht in Daten gefunden oder Thresholds/Scores ungültig")
-                            continue
-                else:
-                    # Wenn parameter ein Name ist, prüfen wir, ob er in den Spalten existiert
-                    if parameter not in result.columns:
-                        # Versuchen, ähnliche Spalten zu finden
-                        if parameter == "MAP" and "Mean arterial pressure" in result.columns:
-                            param_col = "Mean arterial pressure"
-                            print(f"Parameter {parameter} als 'Mean arterial pressure' gefunden")
-                        # Erweiterte Suche nach Parametern mit ähnlichen Namen
-                        else:
-                            # Suche nach Spalten, die den Parameternamen enthalten
-                            matching_cols = [col for col in result.columns if parameter in col]
-                            if matching_cols:
-                                param_col = matching_cols[0]  # Erste Übereinstimmung verwenden
-                                print(f"Parameter {parameter} als '{param_col}' gefunden (Teilübereinstimmung)")
-                            else:
-                                # Spezielle Zuordnungen für bekannte Parameter
-                                parameter_mappings = {
-                                    "Platelets": ["Platelets [#/volume] in Blood", "Thrombocytes", "Platelet count"],
-                                    "Bilirubin.total": ["Bilirubin.total [Mass/volume] in Serum or Plasma", "Total bilirubin", "Bilirubin"],
-                                    "Creatinine": ["Creatinine [Mass/volume] in Serum or Plasma", "Serum creatinine", "Creatinine level"],
-                                    "PaO2_FiO2_ratio": ["PaO2/FiO2", "P/F ratio", "Oxygen [Partial pressure] in Arterial blood", "PaO2"]
-                                }
-                                
-                                found = False
-                                if parameter in parameter_mappings:
-                                    for alt_name in parameter_mappings[parameter]:
-                                        if alt_name in result.columns:
-                                            param_col = alt_name
-                                            print(f"Parameter {parameter} als '{param_col}' gefunden (Mapping)")
-                                            found = True
-                                            break
-                                
-                                if not found:
-                                    print(f"Warnung: Parameter {parameter} nicht in Daten gefunden oder Thresholds/Scores ungültig")
-                                    continue
-                
-                if param_col in result.columns and len(thresholds) + 1 == len(scores):
-                    # Überprüfen, ob die Spalte Werte enthält
-                    if result[param_col].notna().sum() == 0:
-                        print(f"Warnung: Spalte {param_col} enthält keine Werte")
-                        continue
-                
-                    # Überprüfen, ob die Werte im erwarteten Bereich liegen
-                    if component_name == 'respiratory' and result[param_col].max() > 1000:
-                        print(f"Warnung: PaO2/FiO2-Werte ungewöhnlich hoch (max={result[param_col].max()})")
-                    elif component_name == 'coagulation' and result[param_col].max() > 1000:
-                        print(f"Warnung: Thrombozytenwerte ungewöhnlich hoch (max={result[param_col].max()})")
-                    elif component_name == 'liver' and result[param_col].max() > 50:
-                        print(f"Warnung: Bilirubinwerte ungewöhnlich hoch (max={result[param_col].max()})")
-                    elif component_name == 'cardiovascular' and result[param_col].max() > 200:
-                        print(f"Warnung: MAP-Werte ungewöhnlich hoch (max={result[param_col].max()})")
-                    elif component_name == 'renal' and result[param_col].max() > 20:
-                        print(f"Warnung: Kreatininwerte ungewöhnlich hoch (max={result[param_col].max()})")
-                    
-                    print(f"Berechne SOFA-Komponente {component_name} mit Parameter {param_col}")
-                    print(f"Werte in {param_col}: Min={result[param_col].min()}, Max={result[param_col].max()}, Median={result[param_col].median()}")
-                    
-                    # Score-Komponente berechnen
-                    # Standardmäßig mit dem niedrigsten Score (0) initialisieren
-                    component_score = pd.Series(scores[0], index=result.index)
-                    
-                    # Richtung der Schwellenwerte aus der Konfiguration lesen
-                    direction = component.get('direction', 'descending')
-                    
-                    # Standardrichtungen für bekannte SOFA-Komponenten festlegen, falls nicht angegeben
-                    if 'direction' not in component:
-                        if component_name == 'respiratory' or component_name == 'coagulation' or component_name == 'cardiovascular' or component_name == 'cns':
-                            direction = 'descending'  # Niedrigere Werte sind schlechter
-                        elif component_name == 'liver' or component_name == 'renal':
-                            direction = 'ascending'   # Höhere Werte sind schlechter
-                    
-                    print(f"Komponente {component_name} verwendet Richtung: {direction}")
-                    
-                    # SOFA-spezifische Logik basierend auf der Richtung der Schwellenwerte
-                    if direction == 'ascending':  # Höhere Werte sind schlechter (z.B. Bilirubin, Kreatinin)
-                        # Initialisiere mit dem niedrigsten Score (0)
-                        component_score = pd.Series(scores[0], index=result.index)
-                        
-                        # Für jeden Schwellenwert und Score
-                        for i in range(len(thresholds)):
-                            # Wert > Schwellenwert bedeutet höherer SOFA-Score
-                            mask = result[param_col] > thresholds[i]
-                            component_score[mask] = scores[i+1]
-                    else:  # direction == 'descending', Niedrigere Werte sind schlechter (z.B. PaO2/FiO2, Thrombozyten, MAP, GCS)
-                        # Initialisiere mit dem niedrigsten Score (0)
-                        component_score = pd.Series(scores[0], index=result.index)
-                        
-                        # Für jeden Schwellenwert und Score
-                        for i in range(len(thresholds)):
-                            # Wert < Schwellenwert bedeutet höherer SOFA-Score
-                            mask = result[param_col] < thresholds[i]
-                            component_score[mask] = scores[i+1]
-                    
-                    # Spezielle Behandlung für GCS
-                    if component_name == 'cns':
-                        # Überprüfen, ob der GCS-Wert plausibel ist
-                        # GCS sollte zwischen 3 und 15 liegen
-                        invalid_gcs = (result[param_col] < 3) | (result[param_col] > 15)
-                        if invalid_gcs.any():
-                            print(f"Warnung: {invalid_gcs.sum()} GCS-Werte außerhalb des gültigen Bereichs (3-15)")
-                            # Setze ungültige Werte auf NaN, um sie später zu imputieren
-                            component_score[invalid_gcs] = np.nan
-                    
-                    # Komponente zum Gesamtscore hinzufügen
-                    if name not in result.columns:
-                        result[name] = 0
-                    
-                    # Überprüfen, ob die Komponente gültige Werte hat
-                    if not component_score.isna().all():
-                        result[name] += component_score
-                        print(f"Komponente {component_name} zum Gesamtscore hinzugefügt")
-                    else:
-                        print(f"Warnung: Komponente {component_name} hat keine gültigen Werte und wird nicht zum Gesamtscore hinzugefügt")
-                    
-                    # Komponente als separate Spalte speichern
-                    result[f"{name}_{component_name}"] = component_score
-                    print(f"Komponente {component_name} berechnet: Min={component_score.min()}, Max={component_score.max()}, Mittelwert={component_score.mean()}")
-                else:
-                    print(f"Warnung: Parameter {param_col} nicht in Daten gefunden oder Thresholds/Scores ungültig")
-            
-            # Überprüfen des Gesamtscores
-            if name in result.columns:
-                # Begrenze den SOFA-Score auf maximal 24 Punkte
-                result[name] = result[name].clip(upper=24)
-                
-                # Überprüfen auf ungewöhnlich hohe Werte
-                high_scores = result[result[name] > 15]
-                if not high_scores.empty:
-                    print(f"Warnung: {len(high_scores)} Einträge haben einen SOFA-Score > 15")
-                    print(f"Beispiel für hohe Scores: {high_scores[name].head()}")
-                
-                print(f"SOFA-Gesamtscore berechnet: Min={result[name].min()}, Max={result[name].max()}, Mittelwert={result[name].mean()}")
-            else:
-                print(f"Warnung: {name} wurde nicht berechnet, da keine Komponenten gefunden wurden")
+        Returns:
+            str or None: Bericht als JSON oder None, wenn noch kein Lauf ausgeführt wurde.
+        """
+        if self.last_report is None:
+            return None
+        return self.last_report.to_json(path)
+    
+    def _compact_dtypes(self):
+        """
+        Gibt die kompakte Typumwandlung zurück, falls performance.compact_dtypes aktiviert ist.
         
-        return result
+        Returns:
+            CompactDtypes or None: Umwandlung oder None, wenn deaktiviert.
+        """
+        if not self.config.get('performance', {}).get('compact_dtypes', False):
+            return None
+        pivot_config = self.config.get('pivot', {})
+        return CompactDtypes(pivot_col=pivot_config.get('pivot_col', 'concept_name'),
+                             value_col=pivot_config.get('value_col', 'value'))
     
+    def _compact_long(self, data):
+        """
+        Wandelt geladene Long-Format-Daten in kompakte Datentypen um, falls aktiviert.
+        """
+        compact = self._compact_dtypes()
+        return compact.long(data) if compact else data
+    
+    def _engine(self, section, factory):
+        """
+        Liefert die Engine für einen Konfigurationsabschnitt.
+        
+        Die Engine wird nur neu erstellt, wenn sich der Abschnitt seit dem
+        letzten Aufruf geändert hat.
+        
+        Args:
+            section (str): Name des Konfigurationsabschnitts (z.B. 'clinical_scores').
+            factory (callable): Erstellt die Engine aus dem Abschnitt.
+            
+        Returns:
+            object: Engine für den aktuellen Abschnitt.
+        """
+        section_config = self.config.get(section, [])
+        cached = self._engines.get(section)
+        if cached is None or cached[0] != section_config:
+            cached = (copy.deepcopy(section_config), factory(section_config))
+            self._engines[section] = cached
+        return cached[1]
+    
+    @instrumentation.run()
     def run_pipeline(self, data=None, save_to_db=False):
         """
         Führt die gesamte Pipeline aus.
         
+        Laufzeit, Zeilen, Spalten und Speicherbedarf jedes Schritts werden in einem
+        Laufbericht erfasst (self.last_report, siehe get_run_report).
+        
         Args:
             data (pandas.DataFrame, optional): Eingabedaten. Wenn None, werden die Daten aus der Datenbank geladen.
             save_to_db (bool, optional): Ob die Ergebnisse in der Datenbank gespeichert werden sollen.
@@ -598,36 +852,458 @@ class DataPipeline:
         Returns:
             pandas.DataFrame: Ergebnis der Pipeline.
         """
-        # Daten laden, falls nicht bereitgestellt
+        # Pivot und Aggregation in der Datenbank ausführen, falls konfiguriert
+        if data is None and self.config.get('pushdown', False):
+            data = self._run_stages(self.load_aggregated_data(), aggregated=True)
+        else:
+            # Daten laden, falls nicht bereitgestellt
+            if data is None:
+                data = self.load_data()
+            
+            data = self._run_stages(data)
+        
+        # Ergebnisse in der Datenbank speichern
+        if save_to_db:
+            self._save_to_database(data)
+        
+        return data
+    
+    def iter_pipeline(self, chunk_size=None):
+        """
+        Führt die Pipeline blockweise für Gruppen vollständiger Patienten aus.
+        
+        Alle Schritte (Pivot, Aggregation, Imputation, abgeleitete Parameter,
+        Scores) gruppieren nach Patient, daher benötigen die Blöcke keinen
+        gemeinsamen Zustand. Damit alle Blöcke dieselben Spalten haben, wird die
+        Menge der Pivot-Spalten vorab aus der Datenbank ermittelt, und
+        Score-Komponenten werden auch dann berechnet, wenn ihr Parameter in einem
+        Block keine Werte hat.
+        
+        Args:
+            chunk_size (int, optional): Zeilen pro Block. Wenn None, wird der Wert aus der Konfiguration verwendet.
+            
+        Yields:
+            pandas.DataFrame: Ergebnis der Pipeline für einen Block von Patienten.
+        """
+        pivot_values = self._load_pivot_values() if self.config.get('pivot_data', True) else None
+        
+        for partition in self.load_data_partitioned(chunk_size=chunk_size):
+            yield self._run_stages(partition, pivot_values=pivot_values)
+    
+    @instrumentation.run()
+    def run_pipeline_streaming(self, chunk_size=None, save_to_db=True):
+        """
+        Führt die Pipeline mit begrenztem Speicherbedarf aus.
+        
+        Die Eingabetabelle wird in nach Patienten partitionierten Blöcken gelesen,
+        jeder Block durchläuft die gesamte Pipeline und wird anschließend in die
+        Staging-Tabelle der Zieltabelle geladen. Der Speicherbedarf hängt nur von
+        der Blockgröße ab. Die Zieltabelle wird erst nach dem letzten Block
+        getauscht (siehe BulkWriter.write_chunks), lesende Zugriffe sehen bis
+        dahin die bisherige Tabelle vollständig.
+        
+        Args:
+            chunk_size (int, optional): Zeilen pro Block. Wenn None, wird der Wert aus der Konfiguration verwendet.
+            save_to_db (bool, optional): Ob die Ergebnisse in der Datenbank gespeichert werden sollen.
+            
+        Returns:
+            int: Anzahl der erzeugten Zeilen.
+        """
+        chunks = self.iter_pipeline(chunk_size=chunk_size)
+        if not save_to_db:
+            return sum(len(gold) for gold in chunks)
+        
+        layout = self._output_layout()
+        partitioning = layout['partitioning']
+        value_range = None
+        if partitioning and partitioning.get('method') == 'range':
+            value_range = self._value_range(partitioning.get('column', 'subject_id'))
+        
+        writer = BulkWriter(self.db)
+        return writer.write_chunks((self._output_frame(gold) for gold in chunks), table=self.get_output_table(),
+                                   schema=self.db.get_output_schema(), value_range=value_range, **layout)
+    
+    def _value_range(self, column, table=None, schema=None):
+        """
+        Ermittelt kleinsten und größten Wert einer Spalte der Eingabetabelle (z.B. für die
+        Bereichspartitionierung der Ausgabetabelle beim blockweisen Schreiben).
+        
+        Returns:
+            tuple: Kleinster und größter Wert (None, None bei leerer Tabelle).
+        """
+        if table is None:
+            table = self.config.get('input_table', 'standardized_parameters')
+        
+        if schema is None:
+            schema = self.db.get_input_schema()
+        
+        bounds = self.db.execute_query(
+            f"SELECT MIN({_quote(column)}) AS lower, MAX({_quote(column)}) AS upper FROM {schema}.{table}"
+        )
+        return bounds['lower'].iloc[0], bounds['upper'].iloc[0]
+    
+    @instrumentation.run()
+    def run_pipeline_incremental(self, batch_size=None):
+        """
+        Aktualisiert die Gold-Tabelle inkrementell anhand von Watermarks.
+        
+        Es werden nur Patienten neu berechnet, für die seit dem letzten Lauf neue
+        Zeilen in der Eingabetabelle hinzugekommen sind (höhere id als die
+        gespeicherte Watermark). Für diese Patienten wird die vollständige Historie
+        geladen, damit LOCF, Zeitfenster und patientenbezogene Mittelwerte exakt
+        dem vollständigen Lauf entsprechen; ihre Zeilen in der Gold-Tabelle werden
+        anschließend in einer Transaktion ersetzt.
+        
+        Existiert die Gold-Tabelle noch nicht oder weichen ihre Spalten oder deren
+        Datentypen vom neuen Ergebnis ab (z.B. durch ein neues Konzept in der
+        Eingabetabelle, das auch Imputation und Scores der übrigen Patienten
+        verändern kann, oder durch geänderte Score-Datentypen), wird die Tabelle
+        vollständig neu aufgebaut (siehe _rebuild_incremental).
+        
+        Args:
+            batch_size (int, optional): Anzahl der Patienten pro Verarbeitungsblock. Wenn None,
+                                        wird incremental.batch_size aus der Konfiguration verwendet.
+            
+        Returns:
+            int: Anzahl der neu geschriebenen Zeilen.
+        """
+        incremental_config = self.config.get('incremental', {})
+        if batch_size is None:
+            batch_size = incremental_config.get('batch_size', 1000)
+        
+        table = self.config.get('input_table', 'standardized_parameters')
+        schema = self.db.get_input_schema()
+        output_table = self.get_output_table()
+        output_schema = self.db.get_output_schema()
+        source = f"{schema}.{table}"
+        id_col = incremental_config.get('watermark_column', 'id')
+        
+        store = WatermarkStore(self.db, output_schema, incremental_config.get('watermark_table', 'pipeline_watermarks'))
+        store.ensure_table()
+        pivot_values = self._load_pivot_values() if self.config.get('pivot_data', True) else None
+        
+        existing = self.db.get_column_types(output_table, output_schema)
+        if not existing:
+            return self._rebuild_incremental(store, source, id_col, batch_size, pivot_values)
+        
+        changed = store.changed_subjects(output_table, source, id_col=id_col)
+        if changed.empty:
+            return 0
+        
+        writer = BulkWriter(self.db)
+        layout = self._output_layout()
+        
+        n_rows = 0
+        for start in range(0, len(changed), batch_size):
+            marks = changed.iloc[start:start + batch_size]
+            subject_ids = marks['subject_id'].astype(int).tolist()
+            
+            data = self.load_data(table=table, schema=schema, subject_ids=subject_ids)
+            gold = self._output_frame(self._run_stages(data, pivot_values=pivot_values))
+            
+            if set(gold.columns) != set(existing):
+                logger.warning(f"Spalten von {output_schema}.{output_table} weichen vom Ergebnis ab "
+                               f"(neu: {sorted(map(str, set(gold.columns) - set(existing)))}, "
+                               f"entfallen: {sorted(map(str, set(existing) - set(gold.columns)))}), "
+                               f"Tabelle wird vollständig neu aufgebaut")
+                return self._rebuild_incremental(store, source, id_col, batch_size, pivot_values)
+            
+            types = _information_schema_types(gold)
+            drifted = sorted(str(col) for col in types if types[col] != existing[col])
+            if drifted:
+                logger.warning(f"Datentypen von {output_schema}.{output_table} weichen vom Ergebnis ab "
+                               f"({drifted}), Tabelle wird vollständig neu aufgebaut")
+                return self._rebuild_incremental(store, source, id_col, batch_size, pivot_values)
+            
+            writer.upsert(gold, table=output_table, schema=output_schema, keys=subject_ids,
+                          key_column='subject_id', **layout)
+            
+            # Watermarks erst nach erfolgreichem Schreiben setzen; ein Abbruch führt
+            # beim nächsten Lauf lediglich zur erneuten Berechnung dieser Patienten.
+            store.update(output_table, marks)
+            n_rows += len(gold)
+        
+        store.complete(output_table, changed)
+        return n_rows
+    
+    def _rebuild_incremental(self, store, source, id_col, batch_size, pivot_values):
+        """
+        Baut die Gold-Tabelle blockweise vollständig neu auf und setzt die Watermarks aller Patienten.
+        
+        Die Blöcke werden in die Staging-Tabelle geladen und erst am Ende gegen die
+        Zieltabelle getauscht (siehe BulkWriter.write_chunks).
+        
+        Returns:
+            int: Anzahl der geschriebenen Zeilen.
+        """
+        output_table = self.get_output_table()
+        schema, table = source.split('.')
+        
+        store.reset(output_table)
+        changed = store.changed_subjects(output_table, source, id_col=id_col)
+        
+        def batches():
+            for start in range(0, len(changed), batch_size):
+                subject_ids = changed['subject_id'].iloc[start:start + batch_size].astype(int).tolist()
+                data = self.load_data(table=table, schema=schema, subject_ids=subject_ids)
+                yield self._output_frame(self._run_stages(data, pivot_values=pivot_values))
+        
+        writer = BulkWriter(self.db)
+        n_rows = writer.write_chunks(batches(), table=output_table, schema=self.db.get_output_schema(),
+                                     **self._output_layout())
+        store.update(output_table, changed)
+        store.complete(output_table, changed)
+        return n_rows
+    
+    @instrumentation.run()
+    def run_pipeline_parallel(self, data=None, save_to_db=False, n_workers=None):
+        """
+        Führt die Pipeline parallel in einem Prozesspool aus.
+        
+        Die Patienten werden nach subject_id sortiert in zusammenhängende Teilmengen
+        aufgeteilt; jeder Prozess führt alle Pipeline-Schritte für seine Teilmenge
+        aus. Die Teilergebnisse werden in der Reihenfolge der Teilmengen
+        zusammengeführt, sodass das Ergebnis dem seriellen Lauf entspricht.
+        Pivot-Spalten, physiologische Grenzen und Spaltennamen der Konzepte
+        werden vorab einmal ermittelt und als Daten übergeben (siehe _lookups),
+        die Arbeitsprozesse benötigen keine Datenbankverbindung.
+        
+        Args:
+            data (pandas.DataFrame, optional): Eingabedaten. Wenn None, werden die Daten aus der Datenbank geladen.
+            save_to_db (bool, optional): Ob die Ergebnisse in der Datenbank gespeichert werden sollen.
+            n_workers (int, optional): Anzahl der Prozesse. Wenn None, wird performance.parallel_tasks
+                                       aus der Konfiguration verwendet.
+            
+        Returns:
+            pandas.DataFrame: Ergebnis der Pipeline.
+        """
+        if n_workers is None:
+            n_workers = self.config.get('performance', {}).get('parallel_tasks', 1)
+        
         if data is None:
             data = self.load_data()
         
-        # Pipeline-Schritte ausführen
+        if n_workers <= 1:
+            return self.run_pipeline(data=data, save_to_db=save_to_db)
+        
+        pivot_values = None
         if self.config.get('pivot_data', True):
-            data = self.pivot_data(data)
+            pivot_values = self._pivot_values_from_data(data)
+        
+        # Nachschlagedaten einmal laden; die Arbeitsprozesse greifen nicht auf die Datenbank zu
+        lookups = self._lookups()
         
-        if self.config.get('aggregate_data', True):
-            data = self.aggregate_data(data)
+        # Mehr Teilmengen als Prozesse, damit ungleich große Patienten ausgeglichen werden
+        partitions = self._split_by_subject(data, n_workers * 4)
         
-        if self.config.get('impute_missing_values', True):
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            results = list(executor.map(
+                _run_partition,
+                [self.config] * len(partitions),
+                partitions,
+                [pivot_values] * len(partitions),
+                [lookups] * len(partitions)
+            ))
+        
+        result = pd.concat(results, ignore_index=True)
+        
+        if save_to_db:
+            self._save_to_database(result)
+        
+        return result
+    
+    def _split_by_subject(self, data, n_partitions, partition_col='subject_id'):
+        """
+        Teilt Long-Format-Daten in zusammenhängende Bereiche von Patienten auf.
+        
+        Args:
+            data (pandas.DataFrame): Daten im Long-Format.
+            n_partitions (int): Gewünschte Anzahl an Teilmengen.
+            partition_col (str, optional): Spalte, nach der partitioniert wird.
+            
+        Returns:
+            list: Liste von DataFrames, aufsteigend nach Patient geordnet.
+        """
+        data = data.sort_values(partition_col, kind='stable')
+        subjects = data[partition_col].to_numpy()
+        unique_subjects = pd.unique(subjects)
+        
+        # Grenzen so legen, dass jeder Patient vollständig in einer Teilmenge liegt
+        bounds = [chunk[0] for chunk in np.array_split(unique_subjects, min(n_partitions, len(unique_subjects))) if len(chunk)]
+        starts = np.searchsorted(subjects, bounds, side='left').tolist() + [len(data)]
+        
+        return [data.iloc[start:end].reset_index(drop=True) for start, end in zip(starts[:-1], starts[1:])]
+    
+    def _pivot_values_from_data(self, data):
+        """
+        Ermittelt alle Werte der Pivot-Spalte in bereits geladenen Long-Format-Daten.
+        
+        Returns:
+            list: Sortierte Liste der Pivot-Werte (z.B. Konzeptnamen).
+        """
+        pivot_col = self.config.get('pivot', {}).get('pivot_col', 'concept_name')
+        value_col = self.config.get('pivot', {}).get('value_col', 'value')
+        return sorted(data.loc[data[value_col].notna(), pivot_col].dropna().unique().tolist())
+    
+    def _run_stages(self, data, pivot_values=None, aggregated=False):
+        """
+        Führt die aktivierten Pipeline-Schritte auf den übergebenen Daten aus.
+        
+        Score-Komponenten, deren Parameterspalte keine Werte enthält, werden als
+        Spalte ohne Werte ausgegeben und nicht zum Gesamtscore addiert (wie beim
+        Überspringen der Komponente). Bei blockweisen Läufen (mit pivot_values)
+        gilt das nur für Parameter, die auch im gesamten Lauf keine Werte haben
+        können (siehe _available_columns); die übrigen Komponenten werden auch in
+        Blöcken ohne Werte wie im Gesamtlauf berechnet. Vollständige, blockweise,
+        parallele und inkrementelle Läufe liefern so dieselben Spalten und Scores.
+        
+        Args:
+            data (pandas.DataFrame): Eingabedaten im Long-Format.
+            pivot_values (list, optional): Vollständige Liste der Pivot-Spalten. Wenn angegeben,
+                                           werden im Block fehlende Spalten als leere Spalten ergänzt.
+            aggregated (bool, optional): Ob die Daten bereits pivotiert und aggregiert sind (SQL-Pushdown).
+            
+        Returns:
+            pandas.DataFrame: Ergebnis der Pipeline.
+        """
+        imputed = False
+        if not aggregated:
+            if self._physiological_limits():
+                data = self.apply_limits(data)
+            
+            if self._long_format():
+                # Aggregation und Imputation im Long-Format, Wide-Format nur für die weiteren Schritte
+                data, imputed = self._long_to_wide(self.aggregate_long(data), columns=pivot_values)
+            else:
+                if self.config.get('pivot_data', True):
+                    data = self.pivot_data(data)
+                    if pivot_values is not None:
+                        data = self._complete_pivot_columns(data, pivot_values)
+                
+                if self.config.get('aggregate_data', True):
+                    data = self.aggregate_data(data)
+        
+        if self.config.get('impute_missing_values', True) and not imputed:
             data = self.impute_missing_values(data)
         
         if self.config.get('calculate_derived_parameters', True):
             data = self.calculate_derived_parameters(data)
         
         if self.config.get('calculate_clinical_scores', True):
-            data = self.calculate_clinical_scores(data)
-        
-        # Ergebnisse in der Datenbank speichern
-        if save_to_db:
-            self._save_to_database(data)
+            available = self._available_columns(pivot_values) if pivot_values is not None else None
+            data = self.calculate_clinical_scores(data, skip_empty_components=False, available=available)
         
         return data
     
+    def _load_pivot_values(self, table=None, schema=None):
+        """
+        Ermittelt alle Werte der Pivot-Spalte in der Eingabetabelle.
+        
+        Returns:
+            list: Sortierte Liste der Pivot-Werte (z.B. Konzeptnamen).
+        """
+        if table is None:
+            table = self.config.get('input_table', 'standardized_parameters')
+        
+        if schema is None:
+            schema = self.db.get_input_schema()
+        
+        pivot_col = self.config.get('pivot', {}).get('pivot_col', 'concept_name')
+        value_col = self.config.get('pivot', {}).get('value_col', 'value')
+        query, params = self._build_load_query(table=table, schema=schema, columns=[f"DISTINCT {pivot_col}"])
+        query += (" AND " if " WHERE " in query else " WHERE ") + f"{value_col} IS NOT NULL"
+        result = self.db.execute_query(query, params=params, sources=[f"{schema}.{table}"])
+        return sorted(result[pivot_col].dropna().tolist())
+    
+    def _concept_columns(self, concept_ids):
+        """
+        Ermittelt die Spaltennamen (Werte der Pivot-Spalte) zu concept_ids, z.B. für aggregate_functions.
+        
+        Die Zuordnung wird einmal je Pipeline aus der Eingabetabelle geladen.
+        
+        Args:
+            concept_ids (list): Gesuchte concept_ids.
+            
+        Returns:
+            dict: concept_id -> Spaltenname.
+        """
+        pivot_col = self.config.get('pivot', {}).get('pivot_col', 'concept_name')
+        if pivot_col == 'concept_id':
+            return {concept_id: concept_id for concept_id in concept_ids}
+        
+        missing = [concept_id for concept_id in concept_ids if concept_id not in self._concept_names]
+        if missing:
+            table = self.config.get('input_table', 'standardized_parameters')
+            schema = self.db.get_input_schema()
+            result = self.db.execute_query(
+                f"SELECT DISTINCT concept_id, {pivot_col} FROM {schema}.{table} WHERE concept_id = ANY(:concept_ids)",
+                params={'concept_ids': [int(concept_id) for concept_id in missing]},
+                sources=[f"{schema}.{table}"]
+            )
+            self._concept_names.update({concept_id: None for concept_id in missing})
+            self._concept_names.update(zip(result['concept_id'].astype(int), result[pivot_col]))
+        
+        return {concept_id: self._concept_names[concept_id] for concept_id in concept_ids
+                if self._concept_names[concept_id] is not None}
+    
+    def _configured_concept_ids(self):
+        """
+        Gibt alle concept_ids zurück, deren Spaltennamen die Pipeline-Schritte nachschlagen
+        (aggregate_functions, max_age_per_concept und mehrstufige Imputation).
+        
+        Returns:
+            list: concept_ids.
+        """
+        imputation_config = self.config.get('imputation', {})
+        concept_ids = set(AggregationSpec(self.config.get('aggregation', {})).concept_ids)
+        concept_ids.update(entry_concept_ids(imputation_config.get('max_age_per_concept', []) or []))
+        if MultiLevelImputation.configured(imputation_config):
+            concept_ids.update(MultiLevelImputation(imputation_config).concept_ids)
+        return sorted(concept_ids)
+    
+    def _lookups(self):
+        """
+        Lädt alle Nachschlagedaten, die die Pipeline-Schritte aus der Datenbank benötigen,
+        z.B. für Arbeitsprozesse ohne Datenbankverbindung (siehe _run_partition).
+        
+        Returns:
+            dict: Schemanamen, Tabelle der physiologischen Grenzen und Spaltennamen je concept_id.
+        """
+        # Grenzen einmal zusammenführen; lädt dabei die Grenztabelle (self._limits_table)
+        limits = self._physiological_limits()
+        if limits is not None:
+            limits.limits
+        
+        concept_ids = self._configured_concept_ids()
+        if concept_ids:
+            self._concept_columns(concept_ids)
+        
+        return {
+            'schemas': (self.db.get_input_schema(), self.db.get_output_schema()),
+            'limits_table': self._limits_table,
+            'concept_names': dict(self._concept_names),
+        }
+    
+    def _complete_pivot_columns(self, data, pivot_values):
+        """
+        Ergänzt im Wide-Format fehlende Pivot-Spalten, sodass jeder Block
+        dieselben Spalten in derselben Reihenfolge wie ein Gesamtlauf hat.
+        """
+        index_cols = [col for col in data.columns if col not in pivot_values]
+        missing = [col for col in pivot_values if col not in data.columns]
+        if not missing:
+            return data
+        return data.reindex(columns=index_cols + list(pivot_values))
+    
+    @instrumentation.stage('save_to_database')
     def _save_to_database(self, data, table=None, schema=None, if_exists='replace'):
         """
         Speichert die Daten in der Datenbank.
         
+        Die Daten werden per COPY in eine Staging-Tabelle mit expliziten Spaltentypen
+        geladen, indiziert und anschließend atomar gegen die Zieltabelle getauscht
+        (siehe BulkWriter).
+        
         Args:
             data (pandas.DataFrame): Zu speichernde Daten.
             table (str, optional): Name der Zieltabelle. Wenn None, wird die Tabelle aus der Konfiguration verwendet.
@@ -635,19 +1311,87 @@ class DataPipeline:
             if_exists (str, optional): Verhalten, wenn die Tabelle bereits existiert ('fail', 'replace', 'append').
         """
         if table is None:
-            table = self.config.get('output_table', 'gold_parameters')
+            table = self.get_output_table()
         
         if schema is None:
             schema = self.db.get_output_schema()
         
-        # Verbindung zur Datenbank herstellen
-        engine = self.db.connect()
-        
         # Daten in der Datenbank speichern
-        data.to_sql(
-            name=table,
-            schema=schema,
-            con=engine,
-            if_exists=if_exists,
-            index=False
-        )
+        writer = BulkWriter(self.db)
+        writer.write(self._output_frame(data), table=table, schema=schema, if_exists=if_exists,
+                     **self._output_layout())
+    
+    def _output_frame(self, data):
+        """
+        Bringt Score- und Komponentenspalten vor dem Schreiben auf feste Datentypen.
+        
+        Die Datentypen folgen aus der Konfiguration (siehe ScoreEngine.output_dtypes),
+        sodass alle Blöcke eines Laufs und spätere inkrementelle Aktualisierungen
+        dieselben Spaltentypen wie die Zieltabelle haben.
+        
+        Args:
+            data (pandas.DataFrame): Zu speichernde Daten.
+            
+        Returns:
+            pandas.DataFrame: Daten mit festen Datentypen der Score-Spalten.
+        """
+        if not self.config.get('calculate_clinical_scores', True):
+            return data
+        
+        compact = self._compact_dtypes()
+        engine = self._engine('clinical_scores', ScoreEngine)
+        dtypes = engine.output_dtypes(integer_dtype=compact.SCORE_DTYPE if compact else 'Int64')
+        dtypes = {col: dtype for col, dtype in dtypes.items() if col in data.columns and data[col].dtype != dtype}
+        return data.astype(dtypes) if dtypes else data
+    
+    def _output_layout(self):
+        """
+        Gibt Indizes und Partitionierung der Ausgabetabelle aus der Konfiguration zurück.
+        
+        Standardmäßig wird die Tabelle per Hash nach subject_id partitioniert und erhält
+        einen B-Tree-Index auf (subject_id, time_window) sowie einen BRIN-Index auf time_window.
+        
+        Returns:
+            dict: Argumente index_columns, brin_columns und partitioning des BulkWriter.
+        """
+        return {
+            'index_columns': self.config.get('output_indexes', [['subject_id', 'time_window']]),
+            'brin_columns': self.config.get('output_brin_indexes', [['time_window']]),
+            'partitioning': self.config.get('output_partitioning',
+                                            {'method': 'hash', 'column': 'subject_id', 'partitions': 8})
+        }
+    
+    def query_output(self, subject_ids=None, start_time=None, end_time=None, columns=None, table=None, schema=None):
+        """
+        Lädt Ergebnisse (z.B. Scores) ausgewählter Patienten und eines Zeitbereichs aus der
+        Ausgabetabelle, ohne die gesamte Tabelle zu lesen (siehe DatabaseConnection.fetch_subjects).
+        
+        Args:
+            subject_ids (list, optional): Patienten-IDs. Wenn None, werden alle Patienten geladen.
+            start_time (datetime, optional): Beginn des Zeitbereichs (einschließlich).
+            end_time (datetime, optional): Ende des Zeitbereichs (ausschließlich).
+            columns (list, optional): Zu ladende Spalten (z.B. ['SOFA_score']). Wenn None, alle Spalten.
+            table (str, optional): Name der Tabelle. Wenn None, wird die Ausgabetabelle der Konfiguration verwendet.
+            schema (str, optional): Name des Schemas. Wenn None, wird das Ausgabeschema verwendet.
+            
+        Returns:
+            pandas.DataFrame: Zeilen sortiert nach subject_id und time_window.
+        """
+        if table is None:
+            table = self.get_output_table()
+        
+        return self.db.fetch_subjects(table, schema=schema, subject_ids=subject_ids, start_time=start_time,
+                                      end_time=end_time, columns=columns)
+
+
+def _run_partition(config, partition, pivot_values, lookups):
+    """
+    Führt alle Pipeline-Schritte für eine Teilmenge von Patienten in einem
+    Arbeitsprozess aus (siehe DataPipeline.run_pipeline_parallel). Die
+    Nachschlagedaten stammen aus DataPipeline._lookups; der Prozess öffnet
+    keine Datenbankverbindung.
+    """
+    pipeline = DataPipeline(config=config, db_connection=OfflineConnection(*lookups['schemas']))
+    pipeline._limits_table = lookups['limits_table']
+    pipeline._concept_names.update(lookups['concept_names'])
+    return pipeline._run_stages(partition, pivot_values=pivot_values)
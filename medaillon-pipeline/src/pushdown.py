@@ -0,0 +1,121 @@
+import pandas as pd
+from .writer import _quote
+from .aggregation import AggregationSpec
+
+
+# Aggregationsfunktionen des Zeitfensters als SQL-Ausdruck (Platzhalter {value})
+SQL_AGGREGATES = {
+    'mean': 'AVG({value})',
+    'median': 'percentile_cont(0.5) WITHIN GROUP (ORDER BY {value})',
+    'max': 'MAX({value})',
+    'min': 'MIN({value})',
+    'sum': 'SUM({value})',
+}
+
+
+class SqlPushdown:
+    """
+    Erzeugt aus den Abschnitten 'pivot' und 'aggregation' der Konfiguration eine
+    SQL-Abfrage, die das zeitlich aggregierte Wide-Format direkt in PostgreSQL
+    berechnet.
+
+    Die Abfrage bildet die pandas-Schritte pivot_data (Mittelwert je Zeitstempel
+    und Konzept) und aggregate_data (Aggregation je Zeitfenster) nach: Eine
+    innere Abfrage mittelt je Index und Konzept, die äußere fasst die Zeitstempel
+    per date_bin zu Fenstern zusammen (Ursprung um offset verschoben) und
+    erzeugt je Konzept eine Spalte über AGG(...) FILTER (WHERE concept_name = ...)
+    mit der Methode des Konzepts (aggregate_functions). Statt aller Messwerte
+    wird nur noch eine Zeile je Patient und Zeitfenster übertragen.
+    """
+
+    # Ursprung der Zeitfenster wie bei pandas' dt.floor
+    ORIGIN = pd.Timestamp('1970-01-01')
+
+    def __init__(self, config):
+        """
+        Initialisiert den Abfragegenerator.
+
+        Args:
+            config (dict): Pipeline-Konfiguration.
+        """
+        pivot_config = config.get('pivot', {})
+        self.index_cols = pivot_config.get('index_cols', ['subject_id', 'charttime'])
+        self.value_col = pivot_config.get('value_col', 'value')
+        self.pivot_col = pivot_config.get('pivot_col', 'concept_name')
+        self.aggregation = AggregationSpec(config.get('aggregation', {}))
+
+    def build_query(self, source, pivot_values, time_col=None, concept_columns=None, limits=None):
+        """
+        Erzeugt die Pushdown-Abfrage.
+
+        Args:
+            source (str): Vollständiger Name der Eingabetabelle (schema.table).
+            pivot_values (list): Konzepte, für die eine Spalte erzeugt wird.
+            time_col (str, optional): Zeitstempelspalte der Eingabetabelle. Wenn None, die erste
+                                      Spalte von pivot.index_cols, die keine ID-Spalte ist.
+            concept_columns (dict, optional): concept_id -> Pivot-Wert für aggregate_functions.
+            limits (PhysiologicalLimits, optional): Physiologische Grenzen, die vor der Aggregation
+                                                    angewendet werden.
+
+        Returns:
+            tuple: SQL-Abfrage (str) und gebundene Parameter (dict).
+        """
+        # Wie in aggregate_data: Gruppierung nach ID-Spalten und Zeitfenster
+        id_cols = [col for col in self.index_cols if 'id' in col.lower() and col != 'concept_id']
+        if time_col is None:
+            time_col = next((col for col in self.index_cols if col not in id_cols), None)
+        if time_col is None:
+            raise ValueError("Keine Zeitstempelspalte in pivot.index_cols gefunden.")
+        id_cols = [col for col in id_cols if col != time_col]
+
+        # Spaltenlisten als Listen zusammensetzen, damit ein Index ohne ID-Spalten kein führendes Komma erzeugt
+        inner_cols = [_quote(col) for col in self.index_cols]
+        group_cols = [_quote(col) for col in id_cols] + ['time_window']
+        not_null = ' AND '.join(f"{_quote(col)} IS NOT NULL" for col in self.index_cols)
+
+        methods = self.aggregation.methods(pivot_values, concept_columns)
+        params = {
+            'stride': pd.Timedelta(pd.tseries.frequencies.to_offset(self.aggregation.time_window)).to_pytimedelta(),
+            'origin': (self.ORIGIN + self.aggregation.offset).to_pydatetime(),
+        }
+
+        value = f"{_quote(self.value_col)}::double precision"
+        limit_condition = ''
+        if limits is not None:
+            value, condition, limit_params = limits.sql_condition(value_col=self.value_col)
+            params.update(limit_params)
+            if condition:
+                limit_condition = f"AND {condition}"
+
+        value_columns = []
+        for i, concept in enumerate(pivot_values):
+            params[f"concept_{i}"] = concept
+            expression = SQL_AGGREGATES[methods[concept]].format(value='value')
+            value_columns.append(f"{expression} FILTER (WHERE pivot = :concept_{i}) AS {_quote(concept)}")
+
+        # Mittelwert je Zeitstempel wie pivot_data, Summe für Konzepte mit der Methode sum
+        sums = [f":concept_{i}" for i, concept in enumerate(pivot_values) if methods[concept] == 'sum']
+        observed = f"AVG({value})"
+        if sums:
+            observed = f"CASE WHEN {_quote(self.pivot_col)} IN ({', '.join(sums)}) THEN SUM({value}) ELSE AVG({value}) END"
+        inner_select = ', '.join(inner_cols + [f"{_quote(self.pivot_col)} AS pivot", f"{observed} AS value"])
+        outer_select = ', '.join([_quote(col) for col in id_cols]
+                                 + [f"date_bin(:stride, {_quote(time_col)}, :origin) AS time_window"]
+                                 + value_columns)
+
+        query = f"""
+        WITH pivoted AS (
+            SELECT {inner_select}
+            FROM {source}
+            WHERE {_quote(self.value_col)} IS NOT NULL
+            AND {not_null}
+            {limit_condition}
+            AND {_quote(self.pivot_col)} IN ({', '.join(f':concept_{i}' for i in range(len(pivot_values)))})
+            GROUP BY {', '.join(inner_cols + [_quote(self.pivot_col)])}
+        )
+        SELECT {outer_select}
+        FROM pivoted
+        GROUP BY {', '.join(group_cols)}
+        ORDER BY {', '.join(group_cols)}
+        """
+        return query, params
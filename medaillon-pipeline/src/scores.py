@@ -0,0 +1,348 @@
+import logging
+import numpy as np
+import pandas as pd
+
+
+logger = logging.getLogger(__name__)
+
+# Alternative Spaltennamen für bekannte Score-Parameter
+PARAMETER_MAPPINGS = {
+    "MAP": ["Mean arterial pressure"],
+    "Platelets": ["Platelets [#/volume] in Blood", "Thrombocytes", "Platelet count"],
+    "Bilirubin.total": ["Bilirubin.total [Mass/volume] in Serum or Plasma", "Total bilirubin", "Bilirubin"],
+    "Creatinine": ["Creatinine [Mass/volume] in Serum or Plasma", "Serum creatinine", "Creatinine level"],
+    "PaO2_FiO2_ratio": ["PaO2/FiO2", "P/F ratio", "Oxygen [Partial pressure] in Arterial blood", "PaO2"]
+}
+
+# Standardrichtungen für bekannte SOFA-Komponenten, falls in der Konfiguration nicht angegeben
+DEFAULT_DIRECTIONS = {
+    'respiratory': 'descending',     # Niedrigere Werte sind schlechter
+    'coagulation': 'descending',
+    'cardiovascular': 'descending',
+    'cns': 'descending',
+    'liver': 'ascending',            # Höhere Werte sind schlechter
+    'renal': 'ascending',
+}
+
+# Plausibilitätsgrenzen (Maximum) je Komponente für Warnungen
+PLAUSIBILITY_LIMITS = {
+    'respiratory': (1000, 'PaO2/FiO2-Werte'),
+    'coagulation': (1000, 'Thrombozytenwerte'),
+    'liver': (50, 'Bilirubinwerte'),
+    'cardiovascular': (200, 'MAP-Werte'),
+    'renal': (20, 'Kreatininwerte'),
+}
+
+# Obergrenze des SOFA-Gesamtscores
+MAX_SCORE = 24
+
+
+class ScoreEngine:
+    """
+    Vektorisierte Berechnung klinischer Scores (z.B. SOFA) aus Schwellenwerten.
+
+    Die Zuordnung der Komponenten zu Spalten wird einmal je Spaltensatz
+    aufgelöst und zwischengespeichert, sodass Blöcke mit identischen Spalten
+    (Streaming, parallele Läufe) sie nicht erneut suchen. Jede Komponente wird
+    mit einem einzigen np.searchsorted über ein zusammenhängendes Werte-Array
+    berechnet statt mit einer Maskenzuweisung pro Schwellenwert. Das Ergebnis
+    entspricht exakt der bisherigen Berechnung: fehlende Werte erhalten den
+    niedrigsten Score, ungültige GCS-Werte werden NaN, Komponenten ohne gültige
+    Werte werden nicht summiert und der Gesamtscore wird auf 24 begrenzt.
+    """
+
+    def __init__(self, clinical_scores):
+        """
+        Initialisiert die Engine.
+
+        Args:
+            clinical_scores (list): Abschnitt 'clinical_scores' der Konfiguration.
+        """
+        self.clinical_scores = clinical_scores
+        self._plans = {}
+
+    def output_dtypes(self, integer_dtype='Int64'):
+        """
+        Gibt die Datentypen aller konfigurierten Score- und Komponentenspalten zurück.
+
+        Die Typen folgen allein aus der Konfiguration: ganzzahlige Scores als
+        nullable Ganzzahl (fehlende und ungültige Werte als NA), sonst float64.
+        Im Ergebnis von compute() hängt der Typ dagegen von den Daten ab (z.B.
+        float64 bei ungültigen GCS-Werten), beim Schreiben mehrerer Blöcke in
+        dieselbe Tabelle müssen die Spaltentypen aber übereinstimmen.
+
+        Args:
+            integer_dtype (str, optional): Datentyp ganzzahliger Scores (z.B. 'Int8' für kompakte Frames).
+
+        Returns:
+            dict: Spaltenname -> Datentyp.
+        """
+        dtypes = {}
+        for score in self.clinical_scores:
+            name = score.get('name')
+            integral = True
+            for component in score.get('components', []):
+                component_integral = all(float(value).is_integer() for value in component.get('scores', []))
+                dtypes[f"{name}_{component.get('name')}"] = integer_dtype if component_integral else 'float64'
+                integral &= component_integral
+            dtypes[name] = integer_dtype if integral else 'float64'
+        return dtypes
+
+    def resolve(self, columns):
+        """
+        Ordnet allen Komponenten ihre Parameterspalte zu.
+
+        Args:
+            columns (list): Spalten der Eingabedaten.
+
+        Returns:
+            list: Je Score ein dict mit 'name' und den auflösbaren 'components'.
+        """
+        key = tuple(columns)
+        if key not in self._plans:
+            self._plans[key] = self._build_plan(list(columns))
+        return self._plans[key]
+
+    def _build_plan(self, columns):
+        """
+        Löst die Parameter aller Komponenten gegen die Spalten auf.
+
+        Später berechnete Score-Spalten stehen nachfolgenden Scores wie bisher
+        als Parameter zur Verfügung.
+        """
+        plan = []
+        available = list(columns)
+
+        def add(column):
+            if column not in available:
+                available.append(column)
+
+        for score in self.clinical_scores:
+            name = score.get('name')
+            add(name)
+            components = []
+
+            for component in score.get('components', []):
+                component_name = component.get('name')
+                thresholds = component.get('thresholds', [])
+                scores = component.get('scores', [])
+
+                param_col = self._resolve_parameter(component.get('parameter'), available)
+                if param_col is None:
+                    continue
+
+                if param_col not in available or len(thresholds) + 1 != len(scores):
+                    logger.warning(f"Parameter {param_col} nicht in Daten gefunden oder Thresholds/Scores ungültig")
+                    continue
+
+                direction = component.get('direction', DEFAULT_DIRECTIONS.get(component_name, 'descending'))
+                logger.debug(f"Komponente {component_name} verwendet Parameter {param_col} und Richtung: {direction}")
+
+                components.append({
+                    'name': component_name,
+                    'column': param_col,
+                    'output': f"{name}_{component_name}",
+                    'thresholds': list(thresholds),
+                    'scores': np.asarray(scores),
+                    'ascending': direction == 'ascending',
+                })
+                add(f"{name}_{component_name}")
+
+            plan.append({'name': name, 'components': components})
+
+        return plan
+
+    def _resolve_parameter(self, parameter, columns):
+        """
+        Sucht die Spalte eines Parameters (concept_id, Name, Teilübereinstimmung oder Mapping).
+
+        Returns:
+            str or None: Spaltenname oder None, wenn der Parameter nicht gefunden wurde.
+        """
+        if isinstance(parameter, int) or (isinstance(parameter, str) and parameter.isdigit()):
+            # Parameter ist eine concept_id
+            concept_id = str(parameter)
+            if concept_id in columns:
+                return concept_id
+            logger.warning(f"Parameter {parameter} nicht in Daten gefunden oder Thresholds/Scores ungültig")
+            return None
+
+        if parameter in columns:
+            return parameter
+
+        if parameter == "MAP" and "Mean arterial pressure" in columns:
+            logger.info(f"Parameter {parameter} als 'Mean arterial pressure' gefunden")
+            return "Mean arterial pressure"
+
+        # Suche nach Spalten, die den Parameternamen enthalten
+        if isinstance(parameter, str):
+            matching_cols = [col for col in columns if isinstance(col, str) and parameter in col]
+            if matching_cols:
+                logger.info(f"Parameter {parameter} als '{matching_cols[0]}' gefunden (Teilübereinstimmung)")
+                return matching_cols[0]
+
+        # Spezielle Zuordnungen für bekannte Parameter
+        for alt_name in PARAMETER_MAPPINGS.get(parameter, []):
+            if alt_name in columns:
+                logger.info(f"Parameter {parameter} als '{alt_name}' gefunden (Mapping)")
+                return alt_name
+
+        logger.warning(f"Parameter {parameter} nicht in Daten gefunden oder Thresholds/Scores ungültig")
+        return None
+
+    def compute(self, data, skip_empty_components=True, score_dtype=None, available=None):
+        """
+        Berechnet alle Scores und ihre Komponenten.
+
+        Args:
+            data (pandas.DataFrame): Eingabedaten im Wide-Format.
+            skip_empty_components (bool, optional): Komponenten ohne Werte in der Parameterspalte überspringen.
+                                                    Wenn False, wird die Komponente als Spalte ohne Werte
+                                                    ausgegeben und nicht zum Gesamtscore addiert.
+            available (set, optional): Parameterspalten, die in den gesamten Daten Werte enthalten
+                                       (blockweise Läufe). Ihre Komponenten werden auch in Blöcken ohne
+                                       Werte berechnet (fehlende Werte erhalten wie im Gesamtlauf den
+                                       ersten Score). Wenn None, entscheiden die übergebenen Daten.
+            score_dtype (str, optional): Datentyp der Score-Spalten (z.B. 'Int8' für kompakte Frames).
+                                         Wenn None, int64 bzw. float64 bei fehlenden Werten.
+
+        Returns:
+            pandas.DataFrame: Daten mit Score-Spalten.
+        """
+        new_columns = {}
+        # Diagnosestatistiken (Plausibilität, hohe Scores) nur im Debug-Modus
+        debug = logger.isEnabledFor(logging.DEBUG)
+
+        def values_of(column):
+            if column in new_columns:
+                return new_columns[column]
+            return _as_array(data[column])
+
+        for score in self.resolve(data.columns):
+            name = score['name']
+            total = np.zeros(len(data), dtype='int64')
+            new_columns[name] = total
+
+            for component in score['components']:
+                values = values_of(component['column'])
+
+                # Überprüfen, ob die Spalte Werte enthält
+                missing = np.isnan(values) if values.dtype.kind == 'f' else np.zeros(len(values), dtype=bool)
+                if missing.all() and (available is None or component['column'] not in available):
+                    logger.warning(f"Spalte {component['column']} enthält keine Werte")
+                    if not skip_empty_components:
+                        new_columns[component['output']] = np.full(len(data), np.nan)
+                    continue
+
+                if debug:
+                    self._check_plausibility(component, values, missing)
+
+                component_score = self._component_scores(component, values, missing)
+
+                # Spezielle Behandlung für GCS: Werte außerhalb von 3-15 sind ungültig
+                if component['name'] == 'cns':
+                    invalid_gcs = (values < 3) | (values > 15)
+                    if invalid_gcs.any():
+                        logger.warning(f"{int(invalid_gcs.sum())} GCS-Werte außerhalb des gültigen Bereichs (3-15)")
+                        component_score = component_score.astype('float64')
+                        component_score[invalid_gcs] = np.nan
+
+                # Komponenten ohne gültige Werte werden nicht zum Gesamtscore hinzugefügt; bei
+                # blockweisen Läufen entscheidet wie oben der gesamte Lauf (available)
+                valid = component_score.dtype.kind != 'f' or not np.isnan(component_score).all()
+                if valid or (available is not None and component['column'] in available):
+                    total = total + component_score
+                else:
+                    logger.warning(f"Komponente {component['name']} hat keine gültigen Werte und wird nicht zum Gesamtscore hinzugefügt")
+
+                new_columns[component['output']] = component_score
+
+            # Begrenze den Score auf maximal 24 Punkte
+            total = np.minimum(total, MAX_SCORE)
+            new_columns[name] = total
+
+            if debug:
+                high_scores = int(np.count_nonzero(total > 15))
+                if high_scores:
+                    logger.warning(f"{high_scores} Einträge haben einen SOFA-Score > 15")
+
+        result = data.assign(**{
+            column: _score_series(values, data.index, score_dtype) for column, values in new_columns.items()
+        })
+
+        return result
+
+    def _component_scores(self, component, values, missing):
+        """
+        Bildet die Werte einer Komponente auf ihre Scores ab.
+
+        Der Score entspricht dem letzten überschrittenen Schwellenwert
+        (aufsteigend: Wert > Schwelle, absteigend: Wert < Schwelle). Bei
+        monoton sortierten Schwellenwerten ist das die Anzahl überschrittener
+        Schwellen und wird per np.searchsorted bestimmt.
+        """
+        scores = component['scores']
+        # Vergleich im Datentyp der Spalte, wie bei den bisherigen Masken
+        thresholds = np.asarray(component['thresholds'], dtype=values.dtype if values.dtype.kind == 'f' else 'float64')
+        if values.dtype.kind != 'f':
+            values = values.astype('float64')
+
+        if component['ascending']:
+            if np.all(thresholds[1:] >= thresholds[:-1]):
+                index = np.searchsorted(thresholds, values, side='left')
+            else:
+                index = _last_exceeded(values, thresholds, np.greater)
+        else:
+            if np.all(thresholds[1:] <= thresholds[:-1]):
+                index = len(thresholds) - np.searchsorted(thresholds[::-1], values, side='right')
+            else:
+                index = _last_exceeded(values, thresholds, np.less)
+
+        if missing.any():
+            index[missing] = 0
+
+        return scores[index]
+
+    def _check_plausibility(self, component, values, missing):
+        """
+        Warnt bei ungewöhnlich hohen Werten einer bekannten SOFA-Komponente.
+        """
+        if component['name'] not in PLAUSIBILITY_LIMITS or missing.all():
+            return
+        limit, label = PLAUSIBILITY_LIMITS[component['name']]
+        maximum = np.nanmax(values) if values.dtype.kind == 'f' else values.max()
+        if maximum > limit:
+            logger.warning(f"{label} ungewöhnlich hoch (max={maximum})")
+
+
+def _last_exceeded(values, thresholds, compare):
+    """
+    Index des letzten überschrittenen Schwellenwerts plus eins (0, wenn keiner)
+    für nicht sortierte Schwellenwerte.
+    """
+    index = np.zeros(len(values), dtype='intp')
+    for i, threshold in enumerate(thresholds):
+        index[compare(values, threshold)] = i + 1
+    return index
+
+
+def _score_series(values, index, dtype=None):
+    """
+    Erstellt die Score-Spalte; mit dtype werden ganzzahlige Scores kompakt gespeichert.
+    """
+    series = pd.Series(values, index=index)
+    if dtype is None:
+        return series
+    return series.astype(dtype)
+
+
+def _as_array(series):
+    """
+    Liefert die Werte einer Spalte als zusammenhängendes numpy-Array; nullable
+    und nicht-numerische Spalten werden zu float mit NaN.
+    """
+    if series.dtype == 'object':
+        series = pd.to_numeric(series, errors='coerce')
+    if isinstance(series.dtype, np.dtype) and series.dtype.kind in 'iuf':
+        return np.ascontiguousarray(series.to_numpy())
+    return series.to_numpy(dtype='float64', na_value=np.nan)
@@ -0,0 +1,137 @@
+import copy
+import logging
+from .pipeline import DataPipeline
+from . import instrumentation
+
+
+logger = logging.getLogger(__name__)
+
+
+class SubjectScorer:
+    """
+    Berechnet die Gold-Zeilen (z.B. den stündlichen SOFA-Verlauf) eines einzelnen
+    Patienten oder ICU-Aufenthalts mit geringer Latenz, z.B. für ein Dashboard.
+
+    Alles, was nicht vom Patienten abhängt, wird einmal beim Erstellen
+    vorbereitet: Die Konfiguration wird kopiert und eingefroren, die
+    Ladeabfragen (Spaltenprojektion und Konzeptfilter) werden erstellt, die
+    Pivot-Spalten und die physiologischen Grenzen geladen, und ein Lauf auf
+    leeren Daten kompiliert Formeln, Spaltenzuordnungen und Schwellenwerte der
+    abgeleiteten Parameter und Scores. Je Aufruf bleiben eine parametrisierte
+    Abfrage über den Verbindungspool (Index auf subject_id bzw. stay_id) und die
+    Pipeline-Schritte auf den Zeilen des Patienten, ohne Messung und
+    Protokollierung (siehe instrumentation.disabled).
+
+    Aggregation und Imputation laufen im Long-Format (performance.long_format),
+    das bei wenigen Zeilen ein Vielfaches schneller ist als das Pivot und
+    dieselben Ergebnisse liefert. Da alle Aufrufe dieselben Pivot-Spalten
+    verwenden, hat das Ergebnis immer dieselben Spalten.
+    """
+
+    def __init__(self, config_path=None, db_connection=None, pipeline=None, pivot_values=None, sample=None):
+        """
+        Initialisiert den Scorer.
+
+        Args:
+            config_path (str, optional): Pfad zur Pipeline-Konfiguration. Standard: config/gold/pipeline.yaml.
+            db_connection (DatabaseConnection, optional): Datenbankverbindungsobjekt.
+                                                         Wenn None, wird eine neue Verbindung erstellt.
+            pipeline (DataPipeline, optional): Zu übernehmende Pipeline; config_path und db_connection
+                                               werden dann ignoriert. Die Pipeline sollte danach nicht
+                                               mehr anderweitig verwendet werden.
+            pivot_values (list, optional): Pivot-Spalten der Ergebnisse. Wenn None, werden sie einmal
+                                           aus der Eingabetabelle ermittelt.
+            sample (pandas.DataFrame, optional): Daten im Long-Format für den vorbereitenden Lauf (z.B.
+                                                 ohne Datenbank). Wenn None, wird das leere Ergebnis
+                                                 der Ladeabfrage verwendet.
+        """
+        if pipeline is None:
+            pipeline = DataPipeline(config_path, db_connection=db_connection)
+
+        config = copy.deepcopy(pipeline.config)
+        config['performance'] = {**config.get('performance', {}), 'long_format': True}
+        pipeline.config = config
+        self.pipeline = pipeline
+
+        pivot_config = config.get('pivot', {})
+        self.index_cols = list(pivot_config.get('index_cols', ['subject_id', 'charttime']))
+        if pivot_values is None and config.get('pivot_data', True):
+            pivot_values = pipeline._load_pivot_values()
+        self.pivot_values = pivot_values
+
+        # Ladeabfragen je Filterspalte; die IDs werden je Aufruf gebunden
+        self._queries = {key: pipeline._build_load_query(**{key: []}) for key in ('subject_ids', 'stay_ids')}
+
+        # Grenzen laden und Engines kompilieren
+        if sample is None:
+            query, params = self._queries['subject_ids']
+            sample = pipeline._compact_long(pipeline.db.execute_query(query, params=params))
+        self.columns = list(self.score_frame(sample.iloc[:0]).columns)
+
+        logger.info(f"Scorer vorbereitet: {len(self.columns)} Spalten")
+
+    def score(self, subject_id=None, stay_id=None, start_time=None, end_time=None, columns=None):
+        """
+        Berechnet die Gold-Zeilen eines Patienten oder eines ICU-Aufenthalts.
+
+        Der Zeitbereich begrenzt nur die zurückgegebenen Zeitfenster; Aggregation
+        und Imputation berücksichtigen alle Messungen, damit z.B. LOCF auch Werte
+        von vor start_time fortschreibt.
+
+        Args:
+            subject_id (int, optional): Patienten-ID.
+            stay_id (int, optional): ID des ICU-Aufenthalts (statt subject_id).
+            start_time (datetime, optional): Erstes zurückgegebenes Zeitfenster (einschließlich).
+            end_time (datetime, optional): Ende der zurückgegebenen Zeitfenster (ausschließlich).
+            columns (list, optional): Zurückgegebene Spalten zusätzlich zu den Index- und
+                                      Zeitspalten (z.B. ['SOFA_score']). Wenn None, alle Spalten.
+
+        Returns:
+            pandas.DataFrame: Gold-Zeilen des Patienten bzw. Aufenthalts.
+        """
+        with instrumentation.disabled():
+            result = self.score_frame(self.fetch(subject_id=subject_id, stay_id=stay_id))
+
+        if 'time_window' in result.columns:
+            if start_time is not None:
+                result = result[result['time_window'] >= start_time]
+            if end_time is not None:
+                result = result[result['time_window'] < end_time]
+
+        if columns is not None:
+            keys = [col for col in result.columns if col in self.index_cols or col == 'time_window']
+            result = result[list(dict.fromkeys(keys + list(columns)))]
+
+        return result.reset_index(drop=True)
+
+    def fetch(self, subject_id=None, stay_id=None):
+        """
+        Lädt die benötigten Messungen eines Patienten oder eines ICU-Aufenthalts.
+
+        Args:
+            subject_id (int, optional): Patienten-ID.
+            stay_id (int, optional): ID des ICU-Aufenthalts (statt subject_id).
+
+        Returns:
+            pandas.DataFrame: Messungen im Long-Format.
+        """
+        if (subject_id is None) == (stay_id is None):
+            raise ValueError("Es muss genau eine von subject_id und stay_id angegeben werden.")
+
+        key, value = ('subject_ids', subject_id) if stay_id is None else ('stay_ids', stay_id)
+        query, params = self._queries[key]
+        data = self.pipeline.db.execute_query(query, params={**params, key: [int(value)]})
+        return self.pipeline._compact_long(data)
+
+    def score_frame(self, data):
+        """
+        Führt die Pipeline-Schritte auf bereits geladenen Messungen aus.
+
+        Args:
+            data (pandas.DataFrame): Messungen im Long-Format (z.B. aus fetch()).
+
+        Returns:
+            pandas.DataFrame: Gold-Zeilen.
+        """
+        with instrumentation.disabled():
+            return self.pipeline._run_stages(data, pivot_values=self.pivot_values)
@@ -0,0 +1 @@
+# Silver-Ebene: Standardisierung
@@ -0,0 +1,371 @@
+import argparse
+import logging
+import os
+import sys
+import time
+import pandas as pd
+import yaml
+from sqlalchemy import text
+from ..database import DatabaseConnection
+from ..instrumentation import measure
+
+
+logger = logging.getLogger(f"{__package__}.builder")
+
+# Spalten der Silver-Tabelle (ohne id) mit ihren Datentypen
+COLUMNS = {
+    'subject_id': 'INTEGER NOT NULL',
+    'hadm_id': 'INTEGER',
+    'stay_id': 'INTEGER',
+    'charttime': 'TIMESTAMP NOT NULL',
+    'concept_id': 'INTEGER NOT NULL',
+    'concept_name': 'VARCHAR(255) NOT NULL',
+    'value': 'NUMERIC',
+    'unit': 'VARCHAR(50)',
+    'is_error': 'BOOLEAN DEFAULT FALSE',
+    'is_outlier': 'BOOLEAN DEFAULT FALSE',
+    'source_itemid': 'INTEGER NOT NULL',
+    'source_table': 'VARCHAR(50) NOT NULL',
+}
+
+# Indizierte Spalten der Silver-Tabelle; source_itemid für die Neuzuordnung einzelner itemids,
+# stay_id für Einzelabfragen je Aufenthalt (siehe SubjectScorer)
+INDEX_COLUMNS = ['subject_id', 'stay_id', 'concept_id', 'charttime', 'source_itemid']
+
+
+class SilverBuilder:
+    """
+    Inkrementelle Standardisierung der Bronze-Daten (siehe docs/silver/README.md, Abschnitt 4.2).
+
+    Statt die Silver-Tabelle bei jeder Änderung vollständig neu zu befüllen,
+    wird die höchste verarbeitete id der Bronze-Tabelle gespeichert
+    (watermark_table):
+
+    - Neue Bronze-Zeilen werden in id-Bereichen (batch_size) standardisiert und
+      in derselben Transaktion wie die neue Hochwassermarke eingefügt.
+    - Für jede itemid wird ein Fingerabdruck ihrer Zuordnung (Zielkonzept und
+      physiologische Grenzen des Konzepts) gespeichert (mapping_state_table).
+      Geänderte, neue oder entfernte Zuordnungen werden erkannt, und nur die
+      Zeilen dieser itemids werden gelöscht und neu zugeordnet.
+    - Wurde die Bronze-Tabelle neu aufgebaut (andere Tabellen-OID, z.B. durch
+      den BronzeLoader) oder fehlt die Hochwassermarke, wird die Silver-Tabelle
+      einmal vollständig neu aufgebaut.
+
+    Die Standardisierung läuft vollständig in PostgreSQL (INSERT ... SELECT
+    je id-Bereich), da Bronze- und Silver-Schema in derselben Datenbank liegen.
+    """
+
+    def __init__(self, config_path=None, db_connection=None):
+        """
+        Initialisiert den Builder.
+
+        Args:
+            config_path (str, optional): Pfad zur Konfiguration. Standard: config/silver/standardization.yaml.
+            db_connection (DatabaseConnection, optional): Datenbankverbindungsobjekt.
+                                                         Standard: Verbindung aus config/silver/database.yaml.
+        """
+        base_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        if config_path is None:
+            config_path = os.path.join(base_dir, 'config', 'silver', 'standardization.yaml')
+        with open(config_path, 'r') as file:
+            self.config = yaml.safe_load(file)
+
+        if db_connection is None:
+            db_connection = DatabaseConnection(os.path.join(base_dir, 'config', 'silver', 'database.yaml'))
+        self.db = db_connection
+
+        schema = self.db.get_output_schema()
+        self.target_table = self.config.get('target_table', 'standardized_parameters')
+        self.source = f"{self.db.get_input_schema()}.{self.config.get('source_table', 'clinical_parameters')}"
+        self.target = f"{schema}.{self.target_table}"
+        self.mapping = f"{schema}.{self.config.get('mapping_table', 'parameter_mapping')}"
+        self.limits = f"{schema}.{self.config.get('limits_table', 'physiological_limits')}"
+        self.watermarks = f"{schema}.{self.config.get('watermark_table', 'silver_watermarks')}"
+        self.mapping_state = f"{schema}.{self.config.get('mapping_state_table', 'silver_mapping_state')}"
+        self.batch_size = int(self.config.get('batch_size', 5000000))
+
+    def ensure_tables(self):
+        """
+        Erstellt Silver-Tabelle, Indizes und Metadatentabellen, falls sie noch nicht existieren.
+        """
+        schema, table = self.target.split('.')
+        columns = ',\n            '.join(f"{name} {definition}" for name, definition in COLUMNS.items())
+        self.db.execute_statement(f"CREATE SCHEMA IF NOT EXISTS {schema}")
+        self.db.execute_statement(f"""
+        CREATE TABLE IF NOT EXISTS {self.target} (
+            id SERIAL PRIMARY KEY,
+            {columns}
+        )
+        """)
+        for column in INDEX_COLUMNS:
+            self.db.execute_statement(f"CREATE INDEX IF NOT EXISTS idx_{table}_{column} ON {self.target}({column})")
+
+        self.db.execute_statement(f"""
+        CREATE TABLE IF NOT EXISTS {self.watermarks} (
+            target_table VARCHAR(255) PRIMARY KEY,
+            source_table VARCHAR(255) NOT NULL,
+            source_oid BIGINT NOT NULL,
+            max_id BIGINT NOT NULL,
+            updated_at TIMESTAMP NOT NULL DEFAULT now()
+        )
+        """)
+        self.db.execute_statement(f"""
+        CREATE TABLE IF NOT EXISTS {self.mapping_state} (
+            target_table VARCHAR(255) NOT NULL,
+            source_itemid INTEGER NOT NULL,
+            fingerprint CHAR(32) NOT NULL,
+            updated_at TIMESTAMP NOT NULL DEFAULT now(),
+            PRIMARY KEY (target_table, source_itemid)
+        )
+        """)
+
+    def run(self, rebuild=False):
+        """
+        Bringt die Silver-Tabelle auf den Stand der Bronze-Tabelle und der Zuordnungen.
+
+        Args:
+            rebuild (bool, optional): Silver-Tabelle vollständig neu aufbauen.
+
+        Returns:
+            dict: Verarbeitete Zeilen ('remapped_itemids', 'removed_rows', 'remapped_rows',
+                  'new_rows') und neue Hochwassermarke ('watermark').
+        """
+        start = time.perf_counter()
+        self.ensure_tables()
+
+        source = self.db.execute_query(
+            f"SELECT to_regclass(:source)::oid AS oid, (SELECT MAX(id) FROM {self.source}) AS max_id",
+            params={'source': self.source}
+        ).iloc[0]
+        source_oid = int(source['oid'])
+        max_id = 0 if pd.isna(source['max_id']) else int(source['max_id'])
+
+        watermark = self._watermark()
+        mapping = self._fingerprints()
+        summary = {'remapped_itemids': [], 'removed_rows': 0, 'remapped_rows': 0, 'new_rows': 0}
+
+        if rebuild or watermark is None or watermark['source_oid'] != source_oid or watermark['max_id'] > max_id:
+            if not rebuild:
+                logger.info(f"Keine gültige Hochwassermarke für {self.source}, Silver-Tabelle wird neu aufgebaut")
+            self._reset(source_oid, mapping)
+            processed = 0
+        else:
+            processed = watermark['max_id']
+            changed = self._changed_itemids(mapping)
+            if changed:
+                summary.update(self._remap(changed, processed, mapping))
+
+        summary['new_rows'] = self._process(processed, max_id)
+        summary['watermark'] = max_id
+
+        logger.info(f"Silver-Tabelle {self.target} aktualisiert in {time.perf_counter() - start:.1f}s: {summary}")
+        return summary
+
+    def _watermark(self):
+        """
+        Gespeicherte Hochwassermarke der Silver-Tabelle.
+
+        Returns:
+            dict or None: 'source_oid' und 'max_id' oder None, wenn noch keine existiert.
+        """
+        result = self.db.execute_query(
+            f"SELECT source_oid, max_id FROM {self.watermarks} WHERE target_table = :target",
+            params={'target': self.target}
+        )
+        if result.empty:
+            return None
+        return {'source_oid': int(result['source_oid'].iloc[0]), 'max_id': int(result['max_id'].iloc[0])}
+
+    def _fingerprints(self):
+        """
+        Fingerabdruck der aktuellen Zuordnung je itemid (Zielkonzept und physiologische Grenzen).
+
+        Returns:
+            pandas.DataFrame: source_itemid, fingerprint.
+        """
+        return self.db.execute_query(f"""
+        SELECT
+            pm.source_itemid,
+            md5(ROW(pm.target_concept_id, pm.target_concept_name, pl.min_value, pl.max_value)::text) AS fingerprint
+        FROM {self.mapping} pm
+        LEFT JOIN {self.limits} pl ON pm.target_concept_id = pl.concept_id
+        """)
+
+    def _changed_itemids(self, mapping):
+        """
+        Ermittelt itemids, deren Zuordnung sich seit dem letzten Lauf geändert hat
+        (einschließlich neuer und entfernter Zuordnungen).
+
+        Returns:
+            list: Sortierte itemids.
+        """
+        stored = self.db.execute_query(
+            f"SELECT source_itemid, fingerprint FROM {self.mapping_state} WHERE target_table = :target",
+            params={'target': self.target}
+        )
+        current = dict(zip(mapping['source_itemid'].astype(int), mapping['fingerprint']))
+        previous = dict(zip(stored['source_itemid'].astype(int), stored['fingerprint'].str.strip()))
+        return sorted(itemid for itemid in current.keys() | previous.keys()
+                      if current.get(itemid) != previous.get(itemid))
+
+    def _standardize(self, condition):
+        """
+        INSERT ... SELECT der Standardisierung für die Bronze-Zeilen einer Bedingung (Alias bp).
+
+        Entspricht der Befüllung aus docs/silver/README.md: Zuordnung zum
+        OMOP-Konzept, Umrechnung von Fahrenheit in Celsius und Markierung von
+        Werten außerhalb der physiologischen Grenzen.
+        """
+        return f"""
+        INSERT INTO {self.target} ({', '.join(COLUMNS)})
+        SELECT
+            bp.subject_id,
+            bp.hadm_id,
+            bp.stay_id,
+            bp.charttime,
+            pm.target_concept_id AS concept_id,
+            pm.target_concept_name AS concept_name,
+            v.value,
+            CASE WHEN v.fahrenheit THEN '°C' ELSE bp.valueuom END AS unit,
+            bp.error AS is_error,
+            COALESCE(pl.min_value IS NOT NULL AND pl.max_value IS NOT NULL
+                     AND (v.value < pl.min_value OR v.value > pl.max_value), FALSE) AS is_outlier,
+            bp.itemid AS source_itemid,
+            bp.source_table
+        FROM {self.source} bp
+        JOIN {self.mapping} pm ON bp.itemid = pm.source_itemid
+        LEFT JOIN {self.limits} pl ON pm.target_concept_id = pl.concept_id
+        CROSS JOIN LATERAL (
+            SELECT
+                bp.itemid = 223762 AND bp.valueuom = '°F' AS fahrenheit,
+                CASE
+                    WHEN bp.itemid = 223762 AND bp.valueuom = '°F' THEN ((bp.valuenum - 32) * 5/9)
+                    ELSE bp.valuenum
+                END AS value
+        ) v
+        WHERE bp.valuenum IS NOT NULL
+        AND {condition}
+        """
+
+    def _reset(self, source_oid, mapping):
+        """
+        Leert die Silver-Tabelle und setzt Hochwassermarke und Zuordnungszustand zurück.
+        """
+        with measure('query', 'silver_reset'):
+            with self.db.connect().begin() as connection:
+                connection.execute(text(f"TRUNCATE {self.target} RESTART IDENTITY"))
+                self._save_watermark(connection, source_oid, 0)
+                self._save_mapping_state(connection, mapping, None)
+
+    def _remap(self, itemids, processed, mapping):
+        """
+        Ordnet die bereits verarbeiteten Zeilen geänderter itemids in einer Transaktion neu zu.
+
+        Returns:
+            dict: 'remapped_itemids', 'removed_rows', 'remapped_rows'.
+        """
+        start = time.perf_counter()
+        params = {'itemids': itemids, 'processed': processed}
+        with measure('query', 'silver_remap'):
+            with self.db.connect().begin() as connection:
+                removed = connection.execute(
+                    text(f"DELETE FROM {self.target} WHERE source_itemid = ANY(:itemids)"), params
+                ).rowcount
+                inserted = connection.execute(
+                    text(self._standardize("bp.itemid = ANY(:itemids) AND bp.id <= :processed")), params
+                ).rowcount
+                self._save_mapping_state(connection, mapping, itemids)
+
+        logger.info(f"Zuordnung geändert für itemids {itemids}: {removed} Zeilen entfernt, "
+                    f"{inserted} neu zugeordnet in {time.perf_counter() - start:.1f}s")
+        return {'remapped_itemids': itemids, 'removed_rows': removed, 'remapped_rows': inserted}
+
+    def _process(self, processed, max_id):
+        """
+        Standardisiert die Bronze-Zeilen mit processed < id <= max_id in id-Bereichen.
+
+        Jeder Bereich wird zusammen mit der neuen Hochwassermarke festgeschrieben,
+        ein abgebrochener Lauf setzt daher nach dem letzten vollständigen Bereich fort.
+
+        Returns:
+            int: Eingefügte Zeilen.
+        """
+        rows = 0
+        total = max_id - processed
+        while processed < max_id:
+            upper = min(processed + self.batch_size, max_id)
+            start = time.perf_counter()
+            with measure('query', 'silver_batch'):
+                with self.db.connect().begin() as connection:
+                    inserted = connection.execute(
+                        text(self._standardize("bp.id > :lower AND bp.id <= :upper")),
+                        {'lower': processed, 'upper': upper}
+                    ).rowcount
+                    connection.execute(
+                        text(f"UPDATE {self.watermarks} SET max_id = :upper, updated_at = now() "
+                             f"WHERE target_table = :target"),
+                        {'upper': upper, 'target': self.target}
+                    )
+            rows += inserted
+            logger.info(f"Bronze-ids ({processed}, {upper}] verarbeitet ({upper - max_id + total} von {total}): "
+                        f"{inserted} Zeilen in {time.perf_counter() - start:.1f}s")
+            processed = upper
+        return rows
+
+    def _save_watermark(self, connection, source_oid, max_id):
+        """
+        Setzt die Hochwassermarke (innerhalb einer laufenden Transaktion).
+        """
+        connection.execute(text(f"""
+        INSERT INTO {self.watermarks} (target_table, source_table, source_oid, max_id, updated_at)
+        VALUES (:target, :source, :source_oid, :max_id, now())
+        ON CONFLICT (target_table) DO UPDATE
+        SET
+            source_table = EXCLUDED.source_table,
+            source_oid = EXCLUDED.source_oid,
+            max_id = EXCLUDED.max_id,
+            updated_at = EXCLUDED.updated_at
+        """), {'target': self.target, 'source': self.source, 'source_oid': source_oid, 'max_id': max_id})
+
+    def _save_mapping_state(self, connection, mapping, itemids):
+        """
+        Speichert die Fingerabdrücke der Zuordnung (innerhalb einer laufenden Transaktion).
+
+        Args:
+            connection: Verbindung der laufenden Transaktion.
+            mapping (pandas.DataFrame): Aktuelle Fingerabdrücke (siehe _fingerprints).
+            itemids (list or None): Nur diese itemids aktualisieren. Wenn None, alle.
+        """
+        condition, params = "", {'target': self.target}
+        if itemids is not None:
+            condition, params['itemids'] = " AND source_itemid = ANY(:itemids)", itemids
+            mapping = mapping[mapping['source_itemid'].isin(itemids)]
+        connection.execute(text(f"DELETE FROM {self.mapping_state} WHERE target_table = :target{condition}"), params)
+
+        rows = [{'target': self.target, 'itemid': int(row.source_itemid), 'fingerprint': row.fingerprint}
+                for row in mapping.itertuples(index=False)]
+        if rows:
+            connection.execute(text(f"""
+            INSERT INTO {self.mapping_state} (target_table, source_itemid, fingerprint)
+            VALUES (:target, :itemid, :fingerprint)
+            """), rows)
+
+
+def main(argv=None):
+    """
+    Kommandozeile: python -m src.silver.builder [--rebuild]
+    """
+    parser = argparse.ArgumentParser(description="Inkrementelle Standardisierung der Silver-Tabelle")
+    parser.add_argument('--config', help="Pfad zur Konfiguration (Standard: config/silver/standardization.yaml)")
+    parser.add_argument('--database', help="Pfad zur Datenbankkonfiguration (Standard: config/silver/database.yaml)")
+    parser.add_argument('--rebuild', action='store_true', help="Silver-Tabelle vollständig neu aufbauen")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+    db_connection = DatabaseConnection(args.database) if args.database else None
+    SilverBuilder(args.config, db_connection=db_connection).run(rebuild=args.rebuild)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,206 @@
+from collections import namedtuple
+import numpy as np
+import pandas as pd
+
+
+# Dokumentationsereignisse, bei denen mehrere Konzepte gemeinsam erfasst werden
+# (z.B. eine Vitalzeichenrunde oder eine Blutgasanalyse):
+# rate = erwartete Ereignisse pro Stunde, coverage = Anteil der Patienten mit solchen Ereignissen
+SamplingGroup = namedtuple('SamplingGroup', ['name', 'rate', 'coverage'])
+
+# Konzept für die synthetische Datenerzeugung:
+# group = Dokumentationsereignis, probability = Anteil der Ereignisse, bei denen das Konzept erfasst wird,
+# mean/sd_between = Verteilung des Patientenmittelwerts, sd_within = Streuung innerhalb eines Patienten,
+# low/high = Wertebereich, decimals = Nachkommastellen
+SyntheticConcept = namedtuple('SyntheticConcept', [
+    'concept_id', 'concept_name', 'unit', 'group', 'probability',
+    'mean', 'sd_between', 'sd_within', 'low', 'high', 'decimals', 'source_itemid', 'source_table'
+])
+
+# Typische Dokumentationsfrequenzen auf der Intensivstation: Vitalzeichen stündlich,
+# GCS alle 4 Stunden, Blutgase bei etwa zwei Dritteln der Patienten alle 6-8 Stunden,
+# Laborwerte ein- bis zweimal täglich, Bilanzierung stündlich bis zweistündlich
+DEFAULT_GROUPS = (
+    SamplingGroup('vitals', 1.0, 1.0),
+    SamplingGroup('neuro', 0.25, 0.95),
+    SamplingGroup('blood_gas', 0.15, 0.65),
+    SamplingGroup('lab', 0.06, 0.98),
+    SamplingGroup('output', 0.7, 0.9),
+)
+
+DEFAULT_CONCEPTS = (
+    SyntheticConcept(3004249, 'Systolic blood pressure', 'mmHg', 'vitals', 0.97, 120, 15, 12, 40, 250, 0, 220179, 'chartevents'),
+    SyntheticConcept(3012888, 'Diastolic blood pressure', 'mmHg', 'vitals', 0.97, 65, 10, 8, 20, 150, 0, 220180, 'chartevents'),
+    SyntheticConcept(37168599, 'Mean arterial pressure', 'mmHg', 'vitals', 0.9, 80, 10, 8, 30, 180, 0, 220181, 'chartevents'),
+    SyntheticConcept(3027018, 'Heart rate', 'bpm', 'vitals', 0.99, 85, 15, 8, 30, 200, 0, 220045, 'chartevents'),
+    SyntheticConcept(4313591, 'Respiratory rate', 'breaths/min', 'vitals', 0.95, 19, 4, 3, 4, 60, 0, 220210, 'chartevents'),
+    SyntheticConcept(4020553, 'Oxygen saturation measurement', '%', 'vitals', 0.97, 96, 2, 2, 70, 100, 0, 220277, 'chartevents'),
+    SyntheticConcept(45771331, 'Temperature', '°C', 'vitals', 0.25, 37.0, 0.5, 0.4, 33, 42, 1, 223762, 'chartevents'),
+    SyntheticConcept(3007194, 'Glasgow Coma Scale total', 'score', 'neuro', 0.6, 13, 3, 1, 3, 15, 0, 226755, 'chartevents'),
+    SyntheticConcept(3016335, 'Glasgow Coma Scale eye opening', 'score', 'neuro', 0.95, 3.3, 0.8, 0.4, 1, 4, 0, 220739, 'chartevents'),
+    SyntheticConcept(3009094, 'Glasgow Coma Scale verbal response', 'score', 'neuro', 0.9, 4.0, 1.2, 0.5, 1, 5, 0, 223900, 'chartevents'),
+    SyntheticConcept(3008223, 'Glasgow Coma Scale motor response', 'score', 'neuro', 0.95, 5.5, 1.0, 0.4, 1, 6, 0, 223901, 'chartevents'),
+    SyntheticConcept(3027801, 'Oxygen [Partial pressure] in Arterial blood', 'mmHg', 'blood_gas', 0.95, 95, 25, 20, 30, 500, 0, 50821, 'labevents'),
+    SyntheticConcept(42869590, 'Oxygen/Gas total [Pure volume fraction] Inhaled gas', 'fraction', 'blood_gas', 0.8, 0.4, 0.12, 0.05, 0.21, 1.0, 2, 223835, 'chartevents'),
+    SyntheticConcept(3007461, 'Platelets', '10*3/uL', 'lab', 0.95, 200, 80, 20, 5, 1000, 0, 51265, 'labevents'),
+    SyntheticConcept(3024128, 'Bilirubin.total', 'mg/dL', 'lab', 0.6, 1.2, 1.5, 0.3, 0.1, 40, 1, 50885, 'labevents'),
+    SyntheticConcept(3016723, 'Creatinine', 'mg/dL', 'lab', 0.97, 1.3, 0.9, 0.15, 0.2, 12, 2, 50912, 'labevents'),
+    SyntheticConcept(3019550, 'Sodium', 'mmol/L', 'lab', 0.97, 139, 4, 2, 115, 165, 0, 50983, 'labevents'),
+    SyntheticConcept(3014315, 'Urine output', 'mL', 'output', 1.0, 80, 40, 40, 0, 1000, 0, 226559, 'outputevents'),
+)
+
+# Spalten von silver_schema.standardized_parameters
+COLUMNS = ['id', 'subject_id', 'hadm_id', 'stay_id', 'charttime', 'concept_id', 'concept_name',
+           'value', 'unit', 'is_error', 'is_outlier', 'source_itemid', 'source_table']
+
+
+class SyntheticGenerator:
+    """
+    Deterministischer Generator für Daten im Format von silver_schema.standardized_parameters.
+
+    Jeder Patient erhält einen Aufenthalt mit log-normal verteilter Dauer
+    (Median stay_hours). Messungen entstehen wie in MIMIC-IV bei
+    Dokumentationsereignissen (SamplingGroup): Ob ein Patient solche
+    Ereignisse hat, bestimmt coverage, ihre Anzahl ist Poisson-verteilt mit
+    rate pro Stunde, die Zeitpunkte sind gleichverteilt und minutengenau. Bei
+    jedem Ereignis wird jedes Konzept der Gruppe mit seiner probability
+    erfasst, sodass Konzepte einer Gruppe dieselben Zeitstempel teilen. Die
+    Werte streuen um einen patientenspezifischen Mittelwert und werden auf den
+    Wertebereich begrenzt; ein Anteil missing_rate der Messungen hat keinen
+    Wert (value NULL).
+
+    Alle Schritte sind vektorisiert; gleiche Parameter und gleicher seed
+    erzeugen identische Daten.
+    """
+
+    START = pd.Timestamp('2150-01-01')
+
+    def __init__(self, n_subjects=1000, stay_hours=48, max_stay_hours=720, concepts=None, groups=None,
+                 missing_rate=0.01, seed=0):
+        """
+        Initialisiert den Generator.
+
+        Args:
+            n_subjects (int, optional): Anzahl der Patienten (je ein Aufenthalt).
+            stay_hours (float, optional): Median der Aufenthaltsdauer in Stunden.
+            max_stay_hours (float, optional): Maximale Aufenthaltsdauer in Stunden.
+            concepts (iterable, optional): SyntheticConcept-Einträge. Standard: DEFAULT_CONCEPTS.
+            groups (iterable, optional): SamplingGroup-Einträge. Standard: DEFAULT_GROUPS.
+            missing_rate (float, optional): Anteil der Messungen ohne Wert.
+            seed (int, optional): Startwert des Zufallsgenerators.
+        """
+        self.n_subjects = int(n_subjects)
+        self.stay_hours = stay_hours
+        self.max_stay_hours = max_stay_hours
+        self.concepts = tuple(concepts) if concepts is not None else DEFAULT_CONCEPTS
+        self.groups = {group.name: group for group in (groups if groups is not None else DEFAULT_GROUPS)}
+        self.missing_rate = missing_rate
+        self.seed = seed
+
+        unknown = {concept.group for concept in self.concepts} - set(self.groups)
+        if unknown:
+            raise ValueError(f"Unbekannte Dokumentationsgruppen: {sorted(unknown)}")
+
+    @property
+    def concept_names(self):
+        """
+        concept_id -> Konzeptname der erzeugten Konzepte.
+        """
+        return {concept.concept_id: concept.concept_name for concept in self.concepts}
+
+    def stays(self):
+        """
+        Erzeugt die Aufenthalte.
+
+        Returns:
+            pandas.DataFrame: subject_id, hadm_id, stay_id, intime, outtime.
+        """
+        rng = np.random.default_rng([self.seed, 0])
+        subjects = np.arange(self.n_subjects)
+        hours = rng.lognormal(np.log(self.stay_hours), 0.8, self.n_subjects)
+        hours = np.clip(hours, 4, self.max_stay_hours)
+        intime = self.START + pd.to_timedelta(rng.integers(0, 365 * 24 * 60, self.n_subjects), unit='min')
+
+        return pd.DataFrame({
+            'subject_id': 10000000 + subjects,
+            'hadm_id': 20000000 + subjects,
+            'stay_id': 30000000 + subjects,
+            'intime': intime,
+            'outtime': intime + pd.to_timedelta(np.round(hours * 60), unit='min'),
+        })
+
+    def generate(self, columns=None):
+        """
+        Erzeugt die Messwerte im Long-Format.
+
+        Args:
+            columns (list, optional): Zu erzeugende Spalten (z.B. nur die von der
+                                      Pipeline geladenen). Standard: alle Spalten der Tabelle.
+
+        Returns:
+            pandas.DataFrame: Messwerte, sortiert nach Patient, Zeitpunkt und Konzept.
+        """
+        columns = list(columns) if columns is not None else COLUMNS
+        stays = self.stays()
+        hours = ((stays['outtime'] - stays['intime']) / pd.Timedelta(hours=1)).to_numpy()
+        intime = stays['intime'].to_numpy()
+
+        events = {name: self._events(index, group, hours) for index, (name, group) in enumerate(self.groups.items())}
+
+        parts = []
+        for index, concept in enumerate(self.concepts):
+            # Eigener Zufallsstrom je Konzept, damit Änderungen an einem Konzept die anderen nicht verschieben
+            rng = np.random.default_rng([self.seed, 2, index])
+            patient, offset = events[concept.group]
+
+            recorded = rng.random(len(patient)) < concept.probability
+            patient, offset = patient[recorded], offset[recorded]
+
+            baseline = rng.normal(concept.mean, concept.sd_between, self.n_subjects)
+            values = baseline[patient] + rng.normal(0, concept.sd_within, len(patient))
+            values = np.round(np.clip(values, concept.low, concept.high), concept.decimals)
+            values[rng.random(len(patient)) < self.missing_rate] = np.nan
+
+            parts.append((patient, offset, np.full(len(patient), index, dtype='int16'), values))
+
+        patient, offset, concept_index, values = (np.concatenate(arrays) for arrays in zip(*parts))
+        order = np.lexsort((concept_index, offset, patient))
+        patient, offset, concept_index, values = patient[order], offset[order], concept_index[order], values[order]
+
+        def per_concept(field, dtype=None):
+            return np.array([getattr(concept, field) for concept in self.concepts], dtype=dtype)[concept_index]
+
+        builders = {
+            'id': lambda: np.arange(1, len(patient) + 1),
+            'subject_id': lambda: stays['subject_id'].to_numpy()[patient],
+            'hadm_id': lambda: stays['hadm_id'].to_numpy()[patient],
+            'stay_id': lambda: stays['stay_id'].to_numpy()[patient],
+            'charttime': lambda: intime[patient] + offset.astype('timedelta64[m]'),
+            'concept_id': lambda: per_concept('concept_id', 'int64'),
+            'concept_name': lambda: per_concept('concept_name', object),
+            'value': lambda: values,
+            'unit': lambda: per_concept('unit', object),
+            'is_error': lambda: np.zeros(len(patient), dtype=bool),
+            'is_outlier': lambda: np.zeros(len(patient), dtype=bool),
+            'source_itemid': lambda: per_concept('source_itemid', 'int64'),
+            'source_table': lambda: per_concept('source_table', object),
+        }
+        unknown = [col for col in columns if col not in builders]
+        if unknown:
+            raise ValueError(f"Unbekannte Spalten: {unknown}")
+
+        return pd.DataFrame({col: builders[col]() for col in columns})
+
+    def _events(self, index, group, hours):
+        """
+        Erzeugt die Dokumentationsereignisse einer Gruppe.
+
+        Returns:
+            tuple: (Patientenindex, Minuten seit Aufnahme) je Ereignis.
+        """
+        rng = np.random.default_rng([self.seed, 1, index])
+        covered = rng.random(self.n_subjects) < group.coverage
+        counts = np.where(covered, rng.poisson(group.rate * hours), 0)
+        patient = np.repeat(np.arange(self.n_subjects), counts)
+        offset = np.floor(rng.random(len(patient)) * hours[patient] * 60).astype('int64')
+        return patient, offset
@@ -0,0 +1,398 @@
+import io
+import pandas as pd
+from .instrumentation import measure
+
+
+class BulkWriter:
+    """
+    Schreibt DataFrames per PostgreSQL-COPY in die Datenbank.
+
+    Beim Ersetzen einer Tabelle werden die Daten zunächst in eine Staging-Tabelle
+    mit expliziten Spaltentypen geladen, danach werden die Indizes erstellt und
+    die Staging-Tabelle in einer Transaktion gegen die bestehende Tabelle
+    getauscht. Lesende Zugriffe sehen damit immer eine vollständige Tabelle.
+
+    Optional wird die Tabelle nach einer Spalte (z.B. subject_id) per Hash oder
+    Bereich partitioniert, sodass Abfragen auf einzelne Patienten nur die
+    betroffenen Partitionen lesen (Partition Pruning).
+    """
+
+    def __init__(self, db_connection, chunk_size=100000):
+        """
+        Initialisiert den Writer.
+
+        Args:
+            db_connection (DatabaseConnection): Datenbankverbindungsobjekt.
+            chunk_size (int, optional): Anzahl der Zeilen pro COPY-Block.
+        """
+        self.db = db_connection
+        self.chunk_size = chunk_size
+
+    def write(self, data, table, schema, if_exists='replace', index_columns=None,
+              brin_columns=None, partitioning=None):
+        """
+        Schreibt die Daten in die Zieltabelle.
+
+        Args:
+            data (pandas.DataFrame): Zu speichernde Daten.
+            table (str): Name der Zieltabelle.
+            schema (str): Name des Zielschemas.
+            if_exists (str, optional): Verhalten, wenn die Tabelle bereits existiert ('fail', 'replace', 'append').
+            index_columns (list, optional): Liste von Spaltenlisten, für die nach dem Laden
+                                            je ein B-Tree-Index erstellt wird.
+            brin_columns (list, optional): Liste von Spaltenlisten, für die je ein BRIN-Index
+                                           erstellt wird (z.B. [['time_window']]).
+            partitioning (dict, optional): Partitionierung einer neu angelegten Tabelle mit den
+                                           Schlüsseln 'method' ('hash' oder 'range'), 'column'
+                                           und 'partitions'. Wenn None, wird nicht partitioniert.
+        """
+        if if_exists not in ('fail', 'replace', 'append'):
+            raise ValueError(f"Ungültiger Wert für if_exists: {if_exists}")
+
+        indexes = _indexes(data, index_columns, brin_columns)
+        partitioning = _partitioning(data, partitioning)
+
+        connection = self.db.connect().raw_connection()
+        try:
+            with measure('write', f"{schema}.{table}", data) as measurement:
+                cursor = connection.cursor()
+                exists = self._table_exists(cursor, table, schema)
+
+                if exists and if_exists == 'fail':
+                    raise ValueError(f"Tabelle {schema}.{table} existiert bereits.")
+
+                if exists and if_exists == 'append':
+                    sent = self._copy(cursor, data, schema, table)
+                else:
+                    sent = self._replace(cursor, data, table, schema, exists, indexes, partitioning)
+
+                connection.commit()
+                measurement.output(rows=len(data), bytes_transferred=sent)
+        except Exception:
+            connection.rollback()
+            raise
+        finally:
+            connection.close()
+
+    def upsert(self, data, table, schema, keys, key_column='subject_id', index_columns=None,
+               brin_columns=None, partitioning=None):
+        """
+        Ersetzt alle Zeilen der angegebenen Schlüssel (z.B. Patienten) in einer Transaktion.
+
+        Existiert die Zieltabelle noch nicht, wird sie wie bei write() angelegt.
+        Eine bestehende Tabelle muss dieselben Spalten und Datentypen wie die
+        neuen Zeilen haben (siehe DataPipeline._output_frame für Score-Spalten).
+
+        Args:
+            data (pandas.DataFrame): Neue Zeilen für die Schlüssel.
+            table (str): Name der Zieltabelle.
+            schema (str): Name des Zielschemas.
+            keys (list): Schlüsselwerte, deren bisherige Zeilen gelöscht werden.
+            key_column (str, optional): Schlüsselspalte.
+            index_columns (list, optional): B-Tree-Indizes, falls die Tabelle neu angelegt wird.
+            brin_columns (list, optional): BRIN-Indizes, falls die Tabelle neu angelegt wird.
+            partitioning (dict, optional): Partitionierung, falls die Tabelle neu angelegt wird (siehe write()).
+
+        Raises:
+            ValueError: Wenn Spalten oder Datentypen der bestehenden Tabelle von den neuen Zeilen abweichen.
+        """
+        indexes = _indexes(data, index_columns, brin_columns)
+        partitioning = _partitioning(data, partitioning)
+
+        connection = self.db.connect().raw_connection()
+        try:
+            with measure('write', f"{schema}.{table}", data) as measurement:
+                cursor = connection.cursor()
+                if self._table_exists(cursor, table, schema):
+                    table_types = self._column_types(cursor, table, schema)
+                    data_types = _information_schema_types(data)
+                    if table_types != data_types:
+                        differing = sorted(str(col) for col in set(table_types) | set(data_types)
+                                           if table_types.get(col) != data_types.get(col))
+                        raise ValueError(f"Spalten oder Datentypen von {schema}.{table} weichen "
+                                         f"von den neuen Zeilen ab: {differing}")
+                    cursor.execute(
+                        f"DELETE FROM {_quote(schema)}.{_quote(table)} WHERE {_quote(key_column)} = ANY(%s)",
+                        (list(keys),)
+                    )
+                    sent = self._copy(cursor, data, schema, table)
+                else:
+                    sent = self._replace(cursor, data, table, schema, False, indexes, partitioning)
+
+                connection.commit()
+                measurement.output(rows=len(data), bytes_transferred=sent)
+        except Exception:
+            connection.rollback()
+            raise
+        finally:
+            connection.close()
+
+    def write_chunks(self, chunks, table, schema, index_columns=None, brin_columns=None, partitioning=None,
+                     value_range=None):
+        """
+        Ersetzt die Zieltabelle durch eine Folge von Blöcken (z.B. aus einem Streaming-Lauf).
+
+        Alle Blöcke werden nacheinander in dieselbe Staging-Tabelle geladen und
+        einzeln bestätigt; erst nach dem letzten Block werden die Indizes erstellt
+        und die Tabellen getauscht. Bis dahin sehen lesende Zugriffe die bisherige
+        Tabelle vollständig. Die Spalten der Staging-Tabelle folgen dem ersten Block;
+        alle weiteren Blöcke müssen dieselben Spalten und Datentypen haben (siehe
+        DataPipeline._output_frame für Score-Spalten).
+
+        Args:
+            chunks (iterable): Zu speichernde Daten (pandas.DataFrame je Block).
+            table (str): Name der Zieltabelle.
+            schema (str): Name des Zielschemas.
+            index_columns (list, optional): B-Tree-Indizes (siehe write()).
+            brin_columns (list, optional): BRIN-Indizes (siehe write()).
+            partitioning (dict, optional): Partitionierung (siehe write()).
+            value_range (tuple, optional): Kleinster und größter Wert der Partitionsspalte über
+                                           alle Blöcke für die Bereichspartitionierung. Wenn None,
+                                           bestimmt der erste Block die Bereiche.
+
+        Returns:
+            int: Anzahl der geschriebenen Zeilen.
+
+        Raises:
+            ValueError: Wenn Spalten oder Datentypen eines Blocks vom ersten Block abweichen.
+        """
+        connection = self.db.connect().raw_connection()
+        try:
+            cursor = connection.cursor()
+            staging = indexes = layout = types = None
+            n_rows = 0
+            for data in chunks:
+                with measure('write', f"{schema}.{table}", data) as measurement:
+                    if staging is None:
+                        indexes = _indexes(data, index_columns, brin_columns)
+                        layout = _partitioning(data, partitioning)
+                        staging = self._create_staging(cursor, data, table, schema, layout, value_range)
+                        types = _sql_types(data)
+                    elif _sql_types(data) != types:
+                        chunk_types = _sql_types(data)
+                        differing = sorted(str(col) for col in set(types) | set(chunk_types)
+                                           if types.get(col) != chunk_types.get(col))
+                        raise ValueError(f"Spalten oder Datentypen eines Blocks weichen vom ersten Block "
+                                         f"für {schema}.{table} ab: {differing}")
+                    sent = self._copy(cursor, data, schema, staging)
+                    connection.commit()
+                    measurement.output(rows=len(data), bytes_transferred=sent)
+                n_rows += len(data)
+
+            if staging is not None:
+                self._swap(cursor, table, schema, self._table_exists(cursor, table, schema), indexes, layout)
+                connection.commit()
+            return n_rows
+        except Exception:
+            connection.rollback()
+            raise
+        finally:
+            connection.close()
+
+    def _replace(self, cursor, data, table, schema, exists, indexes, partitioning=None):
+        """
+        Lädt die Daten in eine Staging-Tabelle, erstellt die Indizes und tauscht
+        die Staging-Tabelle gegen die Zieltabelle. Muss innerhalb einer
+        Transaktion aufgerufen werden. Gibt die per COPY übertragenen Bytes zurück.
+        """
+        staging = self._create_staging(cursor, data, table, schema, partitioning)
+        sent = self._copy(cursor, data, schema, staging)
+        self._swap(cursor, table, schema, exists, indexes, partitioning)
+        return sent
+
+    def _create_staging(self, cursor, data, table, schema, partitioning=None, value_range=None):
+        """
+        Legt die (leere) Staging-Tabelle mit den Spalten der Daten an und gibt ihren Namen zurück.
+        """
+        staging = f"{table}__staging"
+        cursor.execute(f"DROP TABLE IF EXISTS {_quote(schema)}.{_quote(staging)}")
+        definition = f"CREATE TABLE {_quote(schema)}.{_quote(staging)} ({self._column_definitions(data)})"
+        if partitioning:
+            definition += f" PARTITION BY {partitioning['method'].upper()} ({_quote(partitioning['column'])})"
+        cursor.execute(definition)
+        if partitioning:
+            self._create_partitions(cursor, data, schema, staging, partitioning, value_range)
+        return staging
+
+    def _swap(self, cursor, table, schema, exists, indexes, partitioning=None):
+        """
+        Erstellt die Indizes der gefüllten Staging-Tabelle und tauscht sie gegen die Zieltabelle.
+        """
+        staging = f"{table}__staging"
+
+        # Indizes erst nach dem Laden erstellen; bei partitionierten Tabellen legt
+        # PostgreSQL die Indizes der einzelnen Partitionen automatisch an.
+        index_names = []
+        for i, (method, cols) in enumerate(indexes):
+            name = f"{staging}_idx{i}"
+            col_list = ', '.join(_quote(col) for col in cols)
+            cursor.execute(
+                f"CREATE INDEX {_quote(name)} ON {_quote(schema)}.{_quote(staging)} USING {method} ({col_list})"
+            )
+            prefix = 'idx' if method == 'btree' else method
+            index_names.append((name, f"{prefix}_{table}_{'_'.join(cols)}"))
+
+        # Tausch der Tabellen
+        if exists:
+            cursor.execute(f"DROP TABLE {_quote(schema)}.{_quote(table)}")
+        cursor.execute(f"ALTER TABLE {_quote(schema)}.{_quote(staging)} RENAME TO {_quote(table)}")
+        for name, final_name in index_names:
+            cursor.execute(f"ALTER INDEX {_quote(schema)}.{_quote(name)} RENAME TO {_quote(final_name)}")
+        if partitioning:
+            self._rename_partitions(cursor, schema, staging, table)
+        cursor.execute(f"ANALYZE {_quote(schema)}.{_quote(table)}")
+
+    def _create_partitions(self, cursor, data, schema, parent, partitioning, value_range=None):
+        """
+        Legt die Partitionen einer partitionierten Staging-Tabelle an.
+
+        Bei Hash-Partitionierung entstehen 'partitions' Partitionen gleicher Größe.
+        Bei Bereichspartitionierung wird der Wertebereich der Daten in gleich breite
+        Bereiche geteilt; eine Default-Partition nimmt später angehängte Werte
+        außerhalb dieser Bereiche auf. value_range ersetzt den Wertebereich der Daten.
+        """
+        n_partitions = max(1, int(partitioning.get('partitions', 8)))
+        target = f"{_quote(schema)}.{_quote(parent)}"
+
+        if partitioning['method'] == 'hash':
+            bounds = [f"FOR VALUES WITH (MODULUS {n_partitions}, REMAINDER {i})" for i in range(n_partitions)]
+        else:
+            if value_range is None:
+                values = data[partitioning['column']].dropna()
+                value_range = (values.min(), values.max()) if len(values) else None
+            ranges = (self.db.range_partitions(value_range[0], value_range[1], n_partitions)
+                      if value_range is not None and not pd.isna(value_range[0]) else [])
+            bounds = [f"FOR VALUES FROM ({int(r['lower'])}) TO ({int(r['upper'])})" for r in ranges]
+            bounds.append('DEFAULT')
+
+        for i, bound in enumerate(bounds):
+            cursor.execute(f"CREATE TABLE {_quote(schema)}.{_quote(f'{parent}_p{i}')} PARTITION OF {target} {bound}")
+
+    def _rename_partitions(self, cursor, schema, staging, table):
+        """
+        Benennt die Partitionen und ihre automatisch erstellten Indizes nach dem
+        Tausch von '<tabelle>__staging_*' in '<tabelle>_*' um.
+        """
+        cursor.execute(
+            """
+            SELECT c.relname, c.relkind FROM pg_class c
+            JOIN pg_namespace n ON n.oid = c.relnamespace
+            WHERE n.nspname = %s AND starts_with(c.relname, %s)
+            ORDER BY c.relkind DESC
+            """,
+            (schema, f"{staging}_")
+        )
+        for name, kind in cursor.fetchall():
+            statement = 'ALTER INDEX' if kind == 'i' else 'ALTER TABLE'
+            final_name = table + name[len(staging):]
+            cursor.execute(f"{statement} {_quote(schema)}.{_quote(name)} RENAME TO {_quote(final_name)}")
+
+    def _copy(self, cursor, data, schema, table):
+        """
+        Streamt die Daten blockweise als CSV über COPY FROM STDIN in die Tabelle
+        und gibt die Anzahl der übertragenen Bytes zurück.
+        """
+        columns = ', '.join(_quote(col) for col in data.columns)
+        statement = f"COPY {_quote(schema)}.{_quote(table)} ({columns}) FROM STDIN WITH (FORMAT csv)"
+
+        sent = 0
+        for start in range(0, len(data), self.chunk_size):
+            buffer = io.StringIO()
+            data.iloc[start:start + self.chunk_size].to_csv(buffer, index=False, header=False)
+            sent += buffer.tell()
+            buffer.seek(0)
+            cursor.copy_expert(statement, buffer)
+        return sent
+
+    def _column_definitions(self, data):
+        """
+        Erstellt die Spaltendefinitionen der Staging-Tabelle aus den Datentypen.
+        """
+        return ', '.join(f"{_quote(col)} {sql_type}" for col, sql_type in _sql_types(data).items())
+
+    def _table_exists(self, cursor, table, schema):
+        """
+        Prüft, ob eine Tabelle im angegebenen Schema existiert.
+        """
+        cursor.execute(
+            "SELECT 1 FROM information_schema.tables WHERE table_schema = %s AND table_name = %s",
+            (schema, table)
+        )
+        return cursor.fetchone() is not None
+
+    def _column_types(self, cursor, table, schema):
+        """
+        Gibt die Spalten einer Tabelle mit ihren Datentypen aus information_schema.columns zurück.
+        """
+        cursor.execute(
+            "SELECT column_name, data_type FROM information_schema.columns "
+            "WHERE table_schema = %s AND table_name = %s",
+            (schema, table)
+        )
+        return dict(cursor.fetchall())
+
+
+def _indexes(data, index_columns, brin_columns):
+    """
+    Fasst B-Tree- und BRIN-Indizes zu (Methode, Spalten)-Paaren zusammen und
+    verwirft Indizes auf Spalten, die in den Daten fehlen.
+    """
+    indexes = [('btree', cols) for cols in (index_columns or [])] + [('brin', cols) for cols in (brin_columns or [])]
+    return [(method, cols) for method, cols in indexes if all(col in data.columns for col in cols)]
+
+
+def _partitioning(data, partitioning):
+    """
+    Prüft die Partitionierungsangaben; ohne Partitionen oder Partitionsspalte
+    in den Daten wird nicht partitioniert (None).
+    """
+    if not partitioning or int(partitioning.get('partitions', 8)) < 1:
+        return None
+    partitioning = {'method': 'hash', 'column': 'subject_id', **partitioning}
+    if partitioning['method'] not in ('hash', 'range'):
+        raise ValueError(f"Ungültige Partitionierungsmethode: {partitioning['method']}")
+    if partitioning['column'] not in data.columns:
+        return None
+    return partitioning
+
+
+def _quote(identifier):
+    """
+    Setzt einen SQL-Bezeichner in Anführungszeichen (z.B. für Spaltennamen mit Leerzeichen).
+    """
+    return '"' + str(identifier).replace('"', '""') + '"'
+
+
+def _sql_types(data):
+    """
+    Gibt die PostgreSQL-Datentypen der Spalten zurück (Spaltenname -> Datentyp).
+    """
+    return {col: _sql_type(dtype) for col, dtype in data.dtypes.items()}
+
+
+def _information_schema_types(data):
+    """
+    Gibt die Datentypen der Spalten in der Schreibweise von information_schema.columns zurück.
+    """
+    names = {'TIMESTAMP': 'timestamp without time zone'}
+    return {col: names.get(sql_type, sql_type.lower()) for col, sql_type in _sql_types(data).items()}
+
+
+def _sql_type(dtype):
+    """
+    Bildet einen pandas-Datentyp auf einen PostgreSQL-Datentyp ab.
+    """
+    if pd.api.types.is_bool_dtype(dtype):
+        return 'BOOLEAN'
+    if pd.api.types.is_integer_dtype(dtype):
+        # Kompakte Datentypen (performance.compact_dtypes) auch in der Tabelle schmal halten
+        if dtype.itemsize <= 2:
+            return 'SMALLINT'
+        if dtype.itemsize == 4:
+            return 'INTEGER'
+        return 'BIGINT'
+    if pd.api.types.is_float_dtype(dtype):
+        return 'REAL' if dtype.itemsize == 4 else 'DOUBLE PRECISION'
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        return 'TIMESTAMP'
+    return 'TEXT'
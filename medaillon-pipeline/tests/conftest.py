@@ -0,0 +1,6 @@
+import os
+import sys
+
+
+# Projektverzeichnis importierbar machen (Paket src)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
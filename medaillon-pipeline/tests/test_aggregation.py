@@ -0,0 +1,51 @@
+import os
+
+import pandas as pd
+import pytest
+
+from src.benchmark import PipelineBenchmark
+from src.pushdown import SqlPushdown
+from src.synthetic import SyntheticGenerator
+
+
+CONFIG_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'config', 'gold')
+
+
+def observations():
+    times = pd.to_datetime(['2150-01-01 10:00', '2150-01-01 10:00', '2150-01-01 10:30', '2150-01-01 10:00',
+                            '2150-01-01 10:00'])
+    return pd.DataFrame({
+        'subject_id': [1] * 5,
+        'charttime': times,
+        'concept_id': [3014315, 3014315, 3014315, 3027018, 3027018],
+        'concept_name': ['Urine output'] * 3 + ['Heart rate'] * 2,
+        'value': [100.0, 50.0, 25.0, 80.0, 90.0],
+    })
+
+
+@pytest.mark.parametrize('long_format', [False, True])
+def test_sum_adds_observations_with_the_same_timestamp(long_format):
+    # sofa_score_config.yaml: Urinausscheidung mit sum, Herzfrequenz mit mean
+    pipeline = PipelineBenchmark(os.path.join(CONFIG_DIR, 'sofa_score_config.yaml'), sizes=(1,),
+                                 repeat=1).create_pipeline(SyntheticGenerator(1, seed=0))
+    data = observations()
+
+    if long_format:
+        result = pipeline.build_wide(pipeline.aggregate_long(data))
+    else:
+        result = pipeline.aggregate_data(pipeline.pivot_data(data))
+
+    assert result['Urine output'].tolist() == [175.0]
+    assert result['Heart rate'].tolist() == [85.0]
+
+
+def test_pushdown_sums_observations_with_the_same_timestamp():
+    config = {'aggregation': {'time_window': '1H', 'method': 'mean',
+                              'aggregate_functions': [{'concept_name': 'Urine output', 'method': 'sum'}]}}
+    query, params = SqlPushdown(config).build_query('silver_schema.standardized_parameters',
+                                                    ['Heart rate', 'Urine output'])
+    query = ' '.join(query.split())
+
+    assert params['concept_1'] == 'Urine output'
+    assert 'CASE WHEN "concept_name" IN (:concept_1) THEN SUM("value"::double precision) ' \
+           'ELSE AVG("value"::double precision) END AS value' in query
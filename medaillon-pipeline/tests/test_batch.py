@@ -0,0 +1,41 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.batch import BatchRunner
+from src.benchmark import LOAD_COLUMNS, PipelineBenchmark
+from src.database import OfflineConnection
+from src.synthetic import SyntheticGenerator
+
+
+CONFIG_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'config', 'gold')
+
+CONFIGS = ['pipeline.yaml', 'sofa_score_config.yaml', 'sofa_24h_forwardfill.yaml', 'sofa_alternative.yaml',
+           'sofa_last_value.yaml']
+
+
+@pytest.mark.parametrize('long_format', [False, True])
+@pytest.mark.parametrize('config', CONFIGS)
+def test_batch_matches_run_stages(config, long_format):
+    generator = SyntheticGenerator(40, seed=3)
+    data = generator.generate(LOAD_COLUMNS)
+    # Score-Komponente ohne Werte: wird als leere Spalte ausgegeben
+    data.loc[data['concept_name'] == 'Platelets', 'value'] = np.nan
+
+    path = os.path.join(CONFIG_DIR, config)
+    # Pipeline ohne Datenbank; die gemeinsame Ladeabfrage liefert die synthetischen Daten
+    runner = BatchRunner([path], db_connection=OfflineConnection())
+    pipeline = PipelineBenchmark(path, sizes=(40,), repeat=1).create_pipeline(generator)
+    pipeline.config.setdefault('performance', {})['long_format'] = long_format
+    pipeline.config.setdefault('load', {})['required_concepts_only'] = False
+    runner.pipelines = [pipeline]
+    runner._load = lambda source: data
+
+    steps = [key[-1] for key, _ in runner._plan(pipeline, runner._plan_loads())]
+    assert any('aggregate_long' in step for step in steps) == long_format
+
+    expected = pipeline._run_stages(pipeline._compact_long(data))
+    result = runner.run(save_to_db=False)[pipeline.get_output_table()]
+    pd.testing.assert_frame_equal(result.reset_index(drop=True), expected.reset_index(drop=True))
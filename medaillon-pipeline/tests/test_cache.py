@@ -0,0 +1,36 @@
+import logging
+import os
+
+import pandas as pd
+import pytest
+
+pytest.importorskip('pyarrow')
+
+from src.cache import QueryCache
+
+
+@pytest.mark.parametrize('file_format', ['arrow', 'parquet'])
+def test_put_and_get_leave_no_temporary_files(tmp_path, file_format):
+    cache = QueryCache(None, str(tmp_path), file_format=file_format)
+    data = pd.DataFrame({'subject_id': [1, 2], 'value': [1.5, 2.5]})
+
+    cache.put('key', data, 'SELECT 1', ['silver_schema.standardized_parameters'])
+    cache.put('key', data, 'SELECT 1', ['silver_schema.standardized_parameters'])
+
+    pd.testing.assert_frame_equal(cache.get('key'), data)
+    assert not [name for name in os.listdir(tmp_path) if name.endswith('.tmp')]
+
+
+def test_read_returns_data_when_put_fails(tmp_path, caplog):
+    cache = QueryCache(None, str(tmp_path))
+    # Quelle ohne Datenbank: fester Fingerabdruck
+    cache.fingerprint = lambda source: [1]
+    # Gemischte Typen lassen sich nicht in eine Arrow-Spalte umwandeln
+    data = pd.DataFrame({'value': [1, 'a']})
+
+    with caplog.at_level(logging.WARNING):
+        result = cache.read('SELECT 1', {}, ['silver_schema.standardized_parameters'], lambda: data)
+
+    assert result is data
+    assert 'nicht im Cache gespeichert' in caplog.text
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,68 @@
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.benchmark import LOAD_COLUMNS, PipelineBenchmark
+from src.scores import ScoreEngine
+from src.synthetic import SyntheticGenerator
+
+
+CONFIG_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'config', 'gold')
+
+# Toleranz des Präzisionsvertrags (siehe CompactDtypes)
+TOLERANCE = 1e-6
+
+
+def run(config, compact):
+    generator = SyntheticGenerator(200, seed=3)
+    pipeline = PipelineBenchmark(os.path.join(CONFIG_DIR, config), sizes=(200,), repeat=1).create_pipeline(generator)
+    pipeline.config.setdefault('performance', {})['compact_dtypes'] = compact
+    return pipeline, pipeline.run_pipeline(data=generator.generate(LOAD_COLUMNS))
+
+
+@pytest.mark.parametrize('config', ['pipeline.yaml', 'sofa_alternative.yaml', 'sofa_last_value.yaml', 'sofa_score_config.yaml'])
+def test_compact_matches_float64_within_contract(config, caplog):
+    caplog.set_level(logging.ERROR)
+    pipeline, expected = run(config, compact=False)
+    _, result = run(config, compact=True)
+
+    assert list(result.columns) == list(expected.columns)
+    assert len(result) == len(expected)
+    pd.testing.assert_series_equal(result['time_window'], expected['time_window'])
+    assert (result['subject_id'].astype('int64') == expected['subject_id']).all()
+
+    # Messwerte, Aggregate und abgeleitete Parameter: Abweichung relativ zum Betrag der Spalte
+    for column in expected.columns:
+        if not pd.api.types.is_float_dtype(expected[column]):
+            continue
+        reference = expected[column].to_numpy(dtype='float64')
+        values = result[column].to_numpy(dtype='float64', na_value=np.nan)
+        assert np.array_equal(np.isnan(reference), np.isnan(values)), column
+        present = ~np.isnan(reference)
+        if present.any():
+            scale = np.abs(reference[present]).max()
+            assert (np.abs(values[present] - reference[present]) <= TOLERANCE * scale).all(), column
+
+    # Score-Komponenten weichen nur an Schwellenwerten und nur um eine Stufe ab
+    flipped = np.zeros(len(expected), dtype=bool)
+    for score in ScoreEngine(pipeline.config.get('clinical_scores', [])).resolve(expected.columns):
+        for component in score['components']:
+            reference = expected[component['output']].to_numpy(dtype='float64')
+            values = result[component['output']].to_numpy(dtype='float64', na_value=np.nan)
+            differs = ~((reference == values) | (np.isnan(reference) & np.isnan(values)))
+            if not differs.any():
+                continue
+            assert (np.abs(reference[differs] - values[differs]) == 1).all(), component['output']
+            parameter = expected[component['column']].to_numpy(dtype='float64')[differs]
+            distance = np.abs(parameter[:, None] - np.asarray(component['thresholds'], dtype='float64')).min(axis=1)
+            assert (distance <= TOLERANCE * np.abs(parameter)).all(), component['output']
+            flipped |= differs
+
+        # Gesamtscore nur in Zeilen mit abweichender Komponente verschieden
+        total_differs = expected[score['name']].to_numpy() != result[score['name']].to_numpy(dtype='int64')
+        assert not (total_differs & ~flipped).any(), score['name']
+
+    assert flipped.mean() < 0.01
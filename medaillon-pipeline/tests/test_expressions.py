@@ -0,0 +1,34 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.expressions import CompiledFormula, DerivedParameterEngine
+
+
+@pytest.mark.parametrize('formula', ['9 ** 9 ** 9', '(10 * 1) ** (99999999 * 1000)', "$['Heart rate'] * 9 ** 9 ** 9"])
+def test_power_without_column_reference_is_rejected(formula):
+    with pytest.raises(ValueError, match=r'\*\*'):
+        CompiledFormula(formula)
+
+
+def test_power_with_column_reference():
+    values = np.array([2.0, 3.0])
+    assert np.array_equal(CompiledFormula("$['Heart rate'] ** 2").evaluate({'Heart rate': values}), [4.0, 9.0])
+    assert np.array_equal(CompiledFormula("2 ** $['Heart rate']").evaluate({'Heart rate': values}), [4.0, 8.0])
+    assert np.array_equal(CompiledFormula("$x ** (1 + 1)").evaluate({'x': values}), [4.0, 9.0])
+
+
+def test_derived_parameter_keeps_measured_values():
+    data = pd.DataFrame({
+        'Mean arterial pressure': [70.0, np.nan, 90.0],
+        'Systolic blood pressure': [120.0, 120.0, np.nan],
+        'Diastolic blood pressure': [60.0, 60.0, 60.0],
+    })
+    engine = DerivedParameterEngine([{
+        'name': 'Mean arterial pressure',
+        'formula': "($['Systolic blood pressure'] + 2 * $['Diastolic blood pressure']) / 3",
+    }])
+
+    result = engine.compute(data)
+    assert result['Mean arterial pressure'].tolist()[:2] == [70.0, 80.0]
+    assert result['Mean arterial pressure'].tolist()[2] == 90.0
@@ -0,0 +1,159 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.imputation import ImputationEngine, MultiLevelImputation
+
+
+METHODS = ['locf', 'nocb', 'last', 'mean', 'median', 'zero', 'constant']
+
+
+def legacy_impute(data, method, group_by, constant_value=0):
+    """
+    Frühere zeilenweise Implementierung von DataPipeline.impute_missing_values (Referenz).
+    """
+    result = data.copy()
+
+    time_cols = [col for col in result.columns if pd.api.types.is_datetime64_any_dtype(result[col])]
+    if time_cols:
+        time_col = time_cols[0]
+        result = result.sort_values(by=group_by + [time_col])
+
+    numeric_cols = result.select_dtypes(include=['number']).columns.tolist()
+    numeric_cols = [col for col in numeric_cols if col not in group_by and col not in time_cols]
+
+    if method == 'locf':
+        if group_by:
+            result[numeric_cols] = result.groupby(group_by)[numeric_cols].ffill()
+        else:
+            result[numeric_cols] = result[numeric_cols].ffill()
+
+    elif method == 'nocb':
+        if group_by:
+            result[numeric_cols] = result.groupby(group_by)[numeric_cols].bfill()
+        else:
+            result[numeric_cols] = result[numeric_cols].bfill()
+
+    elif method in ('mean', 'median'):
+        for col in numeric_cols:
+            if group_by:
+                fill = result.groupby(group_by)[col].transform(method)
+            else:
+                fill = getattr(result[col], method)()
+            result[col] = result[col].fillna(fill)
+
+    elif method == 'zero':
+        result[numeric_cols] = result[numeric_cols].fillna(0)
+
+    elif method == 'constant':
+        result[numeric_cols] = result[numeric_cols].fillna(constant_value)
+
+    elif method == 'last':
+        if group_by:
+            for _, group_df in result.groupby(group_by):
+                last_values = {}
+                for col in numeric_cols:
+                    valid_values = group_df.sort_values(by=time_col, ascending=False)[[time_col, col]].dropna()
+                    if not valid_values.empty:
+                        last_values[col] = valid_values.drop_duplicates(subset=[time_col]).set_index(time_col)[col]
+
+                for idx, row in group_df.iterrows():
+                    for col in numeric_cols:
+                        if pd.isna(result.at[idx, col]) and col in last_values:
+                            last_times = last_values[col].index
+                            valid_times = last_times[last_times <= row[time_col]]
+                            if not valid_times.empty:
+                                result.at[idx, col] = last_values[col][valid_times[0]]
+        else:
+            for col in numeric_cols:
+                last_valid = None
+                for idx in result.index:
+                    if not pd.isna(result.at[idx, col]):
+                        last_valid = result.at[idx, col]
+                    elif last_valid is not None:
+                        result.at[idx, col] = last_valid
+
+    return result
+
+
+def wide_frame(n_subjects=20, hours=24, duplicates=False, seed=0):
+    """
+    Erzeugt Daten im Wide-Format mit Lücken (optional mit doppelten Zeitstempeln je Patient).
+    """
+    rng = np.random.default_rng(seed)
+    subject_id = np.repeat(np.arange(1, n_subjects + 1), hours)
+    offsets = np.tile(np.arange(hours), n_subjects)
+    if duplicates:
+        # Etwa jede vierte Stunde fällt auf die vorherige
+        offsets = np.where(rng.random(len(offsets)) < 0.25, np.maximum(offsets - 1, 0), offsets)
+    # Je Patient um einige Minuten versetzt, damit Zeitstempel auch ohne Gruppierung eindeutig sind
+    data = pd.DataFrame({
+        'subject_id': subject_id,
+        'charttime': (pd.Timestamp('2150-01-01') + pd.to_timedelta(offsets, unit='h')
+                      + pd.to_timedelta(subject_id, unit='min')),
+    })
+    for col, missing in (('heart_rate', 0.3), ('creatinine', 0.8), ('platelets', 0.95)):
+        values = rng.normal(100, 20, len(data)).round(1)
+        values[rng.random(len(data)) < missing] = np.nan
+        data[col] = values
+    # Zufällige Reihenfolge der Eingabe
+    return data.sample(frac=1, random_state=seed).reset_index(drop=True)
+
+
+@pytest.mark.parametrize('group_by', [['subject_id'], []])
+@pytest.mark.parametrize('method', METHODS)
+def test_matches_legacy_implementation(method, group_by):
+    data = wide_frame()
+    expected = legacy_impute(data, method, group_by, constant_value=-1)
+    result = ImputationEngine(method=method, group_by=group_by, constant_value=-1).impute(data)
+
+    pd.testing.assert_frame_equal(result, expected)
+
+
+@pytest.mark.parametrize('method', [method for method in METHODS if method != 'last'])
+def test_matches_legacy_implementation_with_duplicate_timestamps(method):
+    data = wide_frame(duplicates=True)
+    expected = legacy_impute(data, method, ['subject_id'])
+    result = ImputationEngine(method=method, group_by=['subject_id']).impute(data)
+
+    pd.testing.assert_frame_equal(result, expected)
+
+
+def test_last_uses_last_value_in_input_order_for_duplicate_timestamps():
+    data = wide_frame(duplicates=True)
+    assert data.duplicated(['subject_id', 'charttime']).any()
+    result = ImputationEngine(method='last', group_by=['subject_id']).impute(data)
+
+    # Referenz: letzter Zeitstempel mit Wert bis zum Zeitpunkt der Zeile, bei Gleichstand der
+    # in der Eingabe letzte Wert
+    expected = data.sort_values(['subject_id', 'charttime'], kind='stable')
+    for col in ['heart_rate', 'creatinine', 'platelets']:
+        last = (expected.dropna(subset=[col])
+                .drop_duplicates(['subject_id', 'charttime'], keep='last')
+                .sort_values(['subject_id', 'charttime']))
+        lookup = pd.merge_asof(expected[['subject_id', 'charttime']].reset_index().sort_values('charttime'),
+                               last[['subject_id', 'charttime', col]].sort_values('charttime'),
+                               on='charttime', by='subject_id').set_index('index')[col]
+        expected[col] = expected[col].fillna(lookup)
+
+    pd.testing.assert_frame_equal(result, expected)
+
+
+def test_last_does_not_impute_rows_without_timestamp():
+    data = wide_frame(n_subjects=2, hours=6)
+    data.loc[data['heart_rate'].isna().idxmax(), 'charttime'] = pd.NaT
+    result = ImputationEngine(method='last', group_by=['subject_id']).impute(data)
+
+    missing_time = result['charttime'].isna()
+    assert missing_time.sum() == 1
+    assert result.loc[missing_time, 'heart_rate'].isna().all()
+
+
+@pytest.mark.parametrize('group_by', [['subject_id'], []])
+def test_multi_level_keeps_input_order_for_duplicate_timestamps(group_by):
+    data = wide_frame(duplicates=True)
+    imputation = MultiLevelImputation({'third_level': [{'column': 'platelets', 'value': 150}]}, group_by=group_by)
+    result = imputation.impute(data)
+
+    expected = data.sort_values(group_by + ['charttime'], kind='stable')
+    assert result.index.tolist() == expected.index.tolist()
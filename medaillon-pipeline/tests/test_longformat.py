@@ -0,0 +1,55 @@
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.benchmark import LOAD_COLUMNS, PipelineBenchmark
+from src.synthetic import SyntheticGenerator
+
+
+CONFIG_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'config', 'gold')
+
+CONFIGS = ['pipeline.yaml', 'sofa_score_config.yaml', 'sofa_24h_forwardfill.yaml', 'sofa_alternative.yaml',
+           'sofa_last_value.yaml']
+
+# Abweichende Imputation: NOCB mit max_age (ohne Imputationsstufen)
+NOCB = {'method': 'nocb', 'max_age': '5h'}
+
+
+def data(generator):
+    frame = generator.generate(LOAD_COLUMNS)
+    # Doppelte Zeitstempel je Konzept
+    duplicates = frame.sample(200, random_state=1).assign(value=lambda d: d['value'] + 1)
+    return pd.concat([frame, duplicates], ignore_index=True)
+
+
+def run(config, long_format, imputation=None):
+    generator = SyntheticGenerator(100, seed=3)
+    pipeline = PipelineBenchmark(os.path.join(CONFIG_DIR, config), sizes=(100,), repeat=1).create_pipeline(generator)
+    pipeline.config.setdefault('performance', {})['long_format'] = long_format
+    if imputation:
+        section = pipeline.config.setdefault('imputation', {})
+        for level in ('first_level', 'second_level', 'third_level'):
+            section.pop(level, None)
+        section.update(imputation)
+    result = pipeline.run_pipeline(data=data(generator))
+    stages = [stage['name'] for stage in pipeline.last_report.stages]
+    return result, stages
+
+
+@pytest.mark.parametrize('imputation', [None, NOCB], ids=['config', 'nocb'])
+@pytest.mark.parametrize('config', CONFIGS)
+def test_long_format_matches_wide(config, imputation, caplog):
+    caplog.set_level(logging.ERROR)
+    expected, _ = run(config, long_format=False, imputation=imputation)
+    result, stages = run(config, long_format=True, imputation=imputation)
+
+    assert 'aggregate_long' in stages
+    if config in ('pipeline.yaml', 'sofa_24h_forwardfill.yaml'):
+        # LOCF bzw. NOCB mit max_age auf dem SparseGrid
+        assert 'impute_long' in stages
+
+    pd.testing.assert_frame_equal(result, expected, check_names=False)
+    assert np.array_equal(result['time_window'].to_numpy(), expected['time_window'].to_numpy())
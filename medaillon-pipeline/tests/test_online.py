@@ -0,0 +1,72 @@
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.benchmark import LOAD_COLUMNS, PipelineBenchmark
+from src.online import OnlineOperator
+from src.synthetic import SyntheticGenerator
+
+
+CONFIG_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'config', 'gold')
+
+
+def operator(config, generator, pivot_values, mutate=None):
+    pipeline = PipelineBenchmark(os.path.join(CONFIG_DIR, config), sizes=(1,), repeat=1).create_pipeline(generator)
+    if mutate:
+        mutate(pipeline.config)
+    return OnlineOperator(pipeline=pipeline, pivot_values=pivot_values)
+
+
+@pytest.mark.parametrize('config', ['pipeline.yaml', 'sofa_last_value.yaml', 'sofa_24h_forwardfill.yaml'])
+def test_online_matches_run_pipeline(config, caplog):
+    caplog.set_level(logging.ERROR)
+    generator = SyntheticGenerator(20, seed=5)
+    data = generator.generate(LOAD_COLUMNS)
+    pipeline = PipelineBenchmark(os.path.join(CONFIG_DIR, config), sizes=(1,), repeat=1).create_pipeline(generator)
+    pivot_values = pipeline._pivot_values_from_data(data)
+    expected = pipeline._run_stages(data, pivot_values=pivot_values)
+
+    # Beobachtungen in zeitlich geordneten Blöcken, innerhalb eines Blocks in zufälliger Reihenfolge
+    online = operator(config, generator, pivot_values)
+    ordered = data.sort_values('charttime', kind='stable')
+    latest = {}
+    for batch in np.array_split(np.arange(len(ordered)), 6):
+        for row in online.update(ordered.iloc[batch].sample(frac=1, random_state=len(latest))).itertuples(index=False):
+            latest[(row.subject_id, row.time_window)] = row
+
+    result = pd.DataFrame(list(latest.values()), columns=expected.columns)
+    pd.testing.assert_frame_equal(result.sort_values(['subject_id', 'time_window']).reset_index(drop=True),
+                                  expected.sort_values(['subject_id', 'time_window']).reset_index(drop=True),
+                                  check_dtype=False)
+
+
+def test_update_only_touches_affected_subjects(caplog):
+    caplog.set_level(logging.ERROR)
+    generator = SyntheticGenerator(10, seed=5)
+    data = generator.generate(LOAD_COLUMNS)
+    pipeline = PipelineBenchmark(os.path.join(CONFIG_DIR, 'pipeline.yaml'), sizes=(1,), repeat=1).create_pipeline(generator)
+    online = operator('pipeline.yaml', generator, pipeline._pivot_values_from_data(data))
+
+    start = data.groupby('subject_id')['charttime'].transform('min')
+    early = (data['charttime'] - start) < pd.Timedelta('6h')
+    online.update(data[early])
+    states = {name: dict(getattr(online, name)) for name in ('observations', 'rows', 'carry')}
+
+    subject_id = data['subject_id'].iloc[0]
+    online.update(data[~early & (data['subject_id'] == subject_id)])
+
+    for name, before in states.items():
+        after = getattr(online, name)
+        for other, state in before.items():
+            if other != subject_id:
+                assert after[other] is state, name
+    assert online.rows[subject_id] is not states['rows'][subject_id]
+
+
+def test_methods_using_later_values_are_rejected():
+    generator = SyntheticGenerator(2, seed=5)
+    with pytest.raises(ValueError, match='nocb'):
+        operator('pipeline.yaml', generator, [], lambda config: config['imputation'].update(method='nocb'))
@@ -0,0 +1,29 @@
+import os
+
+import pandas as pd
+import pytest
+
+from src.benchmark import LOAD_COLUMNS, PipelineBenchmark
+from src.synthetic import SyntheticGenerator
+
+
+CONFIG_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'config', 'gold')
+
+
+@pytest.mark.parametrize('config', ['sofa_score_config.yaml', 'pipeline.yaml', 'sofa_24h_forwardfill.yaml'])
+def test_parallel_without_database_matches_serial(config):
+    generator = SyntheticGenerator(60, seed=1)
+    data = generator.generate(LOAD_COLUMNS)
+    # Pipeline ohne Datenbank (OfflineConnection bricht bei jeder Abfrage ab)
+    pipeline = PipelineBenchmark(os.path.join(CONFIG_DIR, config), sizes=(60,), repeat=1).create_pipeline(generator)
+    if 'outlier_handling' in pipeline.config:
+        # Grenztabelle wie nach dem Laden aus der Datenbank
+        pipeline.config['outlier_handling']['use_limits_table'] = True
+        pipeline._limits_table = pd.DataFrame({'concept_id': [3027018], 'min_value': [40], 'max_value': [100]})
+
+    serial = pipeline.run_pipeline(data=data)
+    parallel = pipeline.run_pipeline_parallel(data=data, n_workers=2)
+
+    pd.testing.assert_frame_equal(parallel, serial.reset_index(drop=True))
+    if 'outlier_handling' in pipeline.config:
+        assert parallel['Heart rate'].max() <= 100
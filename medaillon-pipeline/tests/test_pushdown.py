@@ -0,0 +1,26 @@
+import re
+
+from src.pushdown import SqlPushdown
+
+
+def build(index_cols):
+    config = {'pivot': {'index_cols': index_cols}, 'aggregation': {'time_window': '1H', 'method': 'mean'}}
+    query, params = SqlPushdown(config).build_query('silver_schema.standardized_parameters', ['Heart rate'])
+    return ' '.join(query.split()), params
+
+
+def test_index_with_only_time_column():
+    query, _ = build(['charttime'])
+
+    assert not re.search(r'(SELECT|BY)\s*,', query)
+    assert 'GROUP BY time_window ORDER BY time_window' in query
+    assert 'SELECT date_bin(:stride, "charttime", :origin) AS time_window' in query
+
+
+def test_time_column_from_config():
+    query, _ = build(['stay_id', 'event_time'])
+
+    assert 'charttime' not in query
+    assert 'date_bin(:stride, "event_time", :origin)' in query
+    assert 'GROUP BY "stay_id", time_window' in query
+    assert 'GROUP BY "stay_id", "event_time", "concept_name"' in query
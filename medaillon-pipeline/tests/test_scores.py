@@ -0,0 +1,61 @@
+import os
+
+import numpy as np
+import pandas as pd
+import yaml
+
+from src.scores import ScoreEngine
+
+
+CONFIG_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'config', 'gold')
+
+
+def clinical_scores(config):
+    with open(os.path.join(CONFIG_DIR, config)) as f:
+        return yaml.safe_load(f)['clinical_scores']
+
+
+def test_empty_component_does_not_change_total():
+    # Respiratorische Komponente mit scores [4, 3, 2, 1, 0], Parameterspalte ohne Werte
+    data = pd.DataFrame({
+        'PaO2_FiO2_ratio': [np.nan, np.nan, np.nan],
+        'Platelets': [10.0, 200.0, 10.0],
+    })
+    engine = ScoreEngine(clinical_scores('sofa_last_value.yaml'))
+    skipped = engine.compute(data, skip_empty_components=True)
+    kept = engine.compute(data, skip_empty_components=False)
+
+    assert 'SOFA_score_respiratory' not in skipped.columns
+    assert kept['SOFA_score_respiratory'].isna().all()
+    assert kept['SOFA_score'].tolist() == skipped['SOFA_score'].tolist() == [0, 4, 0]
+
+
+def test_empty_component_in_compact_frames():
+    data = pd.DataFrame({'PaO2_FiO2_ratio': [np.nan, np.nan], 'Platelets': [10.0, 200.0]})
+    result = ScoreEngine(clinical_scores('sofa_last_value.yaml')).compute(
+        data, skip_empty_components=False, score_dtype='Int8')
+
+    assert result['SOFA_score_respiratory'].dtype == 'Int8'
+    assert result['SOFA_score_respiratory'].isna().all()
+    assert result['SOFA_score'].tolist() == [0, 4]
+
+
+def test_available_component_is_scored_in_empty_chunk():
+    # Im gesamten Lauf vorhandener Parameter: fehlende Werte erhalten wie im Gesamtlauf den ersten Score
+    data = pd.DataFrame({'PaO2_FiO2_ratio': [np.nan, np.nan], 'Platelets': [10.0, 200.0]})
+    result = ScoreEngine(clinical_scores('sofa_last_value.yaml')).compute(
+        data, skip_empty_components=False, available={'PaO2_FiO2_ratio', 'Platelets'})
+
+    assert result['SOFA_score_respiratory'].tolist() == [4, 4]
+    assert result['SOFA_score'].tolist() == [4, 8]
+
+
+def test_invalid_gcs_in_chunk_is_summed_like_full_run():
+    data = pd.DataFrame({'Glasgow Coma Scale total': [2.0, 2.0], 'Platelets': [10.0, 200.0]})
+    engine = ScoreEngine(clinical_scores('sofa_last_value.yaml'))
+    chunk = engine.compute(data, skip_empty_components=False, available={'Glasgow Coma Scale total', 'Platelets'})
+    alone = engine.compute(data, skip_empty_components=False)
+
+    assert chunk['SOFA_score_cns'].isna().all()
+    assert chunk['SOFA_score'].isna().all()
+    assert alone['SOFA_score'].tolist() == [0, 4]
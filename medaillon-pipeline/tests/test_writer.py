@@ -0,0 +1,44 @@
+import logging
+import os
+
+from src.benchmark import LOAD_COLUMNS, PipelineBenchmark
+from src.synthetic import SyntheticGenerator
+from src.writer import _information_schema_types, _sql_types
+
+
+CONFIG_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'config', 'gold')
+
+GCS = 'Glasgow Coma Scale total'
+
+
+def test_score_columns_have_fixed_types_across_chunks(caplog):
+    caplog.set_level(logging.ERROR)
+    generator = SyntheticGenerator(20, seed=2)
+    data = generator.generate(LOAD_COLUMNS)
+    pipeline = PipelineBenchmark(os.path.join(CONFIG_DIR, 'sofa_last_value.yaml'), sizes=(20,), repeat=1).create_pipeline(generator)
+    pivot_values = pipeline._pivot_values_from_data(data)
+
+    subjects = data['subject_id'].unique()
+    first = data[data['subject_id'].isin(subjects[:10])]
+    second = data[data['subject_id'].isin(subjects[10:])].copy()
+    # Ungültige GCS-Werte nur im zweiten Block: Komponente und Gesamtscore werden dort float64
+    second.loc[second['concept_name'] == GCS, 'value'] = 2
+
+    chunks = [pipeline._run_stages(chunk, pivot_values=pivot_values) for chunk in (first, second)]
+    assert chunks[0]['SOFA_score_cns'].dtype != chunks[1]['SOFA_score_cns'].dtype
+
+    written = [pipeline._output_frame(chunk) for chunk in chunks]
+    assert _sql_types(written[0]) == _sql_types(written[1])
+    assert str(written[1]['SOFA_score_cns'].dtype) == 'Int64'
+    assert written[1]['SOFA_score_cns'].isna().any()
+
+
+def test_information_schema_types_match_postgres_names():
+    pipeline = PipelineBenchmark(os.path.join(CONFIG_DIR, 'pipeline.yaml'), sizes=(5,), repeat=1).create_pipeline(
+        SyntheticGenerator(5, seed=1))
+    data = pipeline._output_frame(pipeline._run_stages(SyntheticGenerator(5, seed=1).generate(LOAD_COLUMNS)))
+
+    types = _information_schema_types(data)
+    assert types['SOFA_score'] == 'bigint'
+    assert types['time_window'] == 'timestamp without time zone'
+    assert set(types.values()) <= {'bigint', 'double precision', 'timestamp without time zone'}